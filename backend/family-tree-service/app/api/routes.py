@@ -320,20 +320,22 @@ async def websocket_family_tree(websocket: WebSocket):
 #             break
 
 from fastapi import APIRouter, WebSocket
+from fastapi.responses import PlainTextResponse
 from typing import List
 import json
-import asyncio
 from app.services.wikipedia_service import fetch_relationships, fetch_relationships_by_qid, getPersonalDetails
 from app.models.genealogy import Relationship, personalInfo
 from app.services.template_tree_extractor import extract_relationships_from_page, extract_relationships_from_page_streaming
 from app.core.websocket_manager import WebSocketManager
-from app.services.relationship_classifier import classify_relationships
+from app.core import metrics, rate_limiter
+from app.core.llm_executor import llm
+from app.services.relationship_classifier import classify_relationships, model_router
 
 router = APIRouter()
 
 @router.get("/family-tree/{title}")
 async def get_family_tree(title: str):
-    relationships = extract_relationships_from_page(title)
+    relationships = await extract_relationships_from_page(title)
     return {"title": title, "relationships": relationships}
 
 @router.get("/relationships/{page_title}/{depth}", response_model=List[Relationship])
@@ -342,6 +344,21 @@ async def get_relationships(page_title: str, depth: int):
     relationships = await fetch_relationships(page_title, depth)
     return relationships
 
+@router.get("/rate-limits")
+async def get_rate_limits():
+    """Upstream limiter state per host, with each session's queue depth and wait times."""
+    return rate_limiter.snapshot()
+
+@router.get("/llm-health")
+async def get_llm_health():
+    """LLM executor load and each Gemini model's success rate, latency and circuit state."""
+    return {"executor": llm.snapshot(), "models": model_router.snapshot()}
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Upstream call counts, bytes, cache hits and latency histograms in Prometheus text format."""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 @router.get('/info/{page_title}', response_model=personalInfo)
 async def get_personal_details(page_title: str):
     personal_info = await getPersonalDetails(page_title=page_title)
@@ -406,8 +423,8 @@ async def classify_relationships_endpoint(request: dict):
         
         print(f"Classification request received: {len(relationships)} relationships")
         
-        # Run classification in thread pool (CPU-bound operation)
-        classified = await asyncio.to_thread(classify_relationships, relationships)
+        # Gemini calls inside run on the LLM executor, so this doesn't block the loop
+        classified = await classify_relationships(relationships)
         
         return {
             "success": True,
@@ -463,21 +480,25 @@ async def websocket_expand_by_qid(websocket: WebSocket):
                 })
                 continue
             
-            # UPDATE THIS LINE - add use_llm_enrichment parameter:
-            relationships = await fetch_relationships_by_qid(
-                qid=qid,
-                depth=depth,
-                websocket_manager=websocket_manager,
-                entity_name=entity_name,
-                use_llm_enrichment=True  # ✅ Enable LLM for expand
-            )
-            
+            request = metrics.start_request("expand_by_qid")
+            try:
+                # UPDATE THIS LINE - add use_llm_enrichment parameter:
+                relationships = await fetch_relationships_by_qid(
+                    qid=qid,
+                    depth=depth,
+                    websocket_manager=websocket_manager,
+                    entity_name=entity_name,
+                    use_llm_enrichment=True  # ✅ Enable LLM for expand
+                )
+            finally:
+                metrics.finish_request(request)
             await websocket.send_json({
                 "type": "complete",
                 "data": {
                     "qid": qid,
                     "entity_name": entity_name,
-                    "total_relationships": len(relationships)
+                    "total_relationships": len(relationships),
+                    "metrics": request.summary()
                 }
             })
             
@@ -504,14 +525,17 @@ async def websocket_family_tree(websocket: WebSocket):
         try:
             title = await websocket.receive_text()
             print(f"Received family tree request for: {title}")
-            
-            relationships = await extract_relationships_from_page_streaming(title, websocket_manager)
-            
+            request = metrics.start_request("family_tree")
+            try:
+                relationships = await extract_relationships_from_page_streaming(title, websocket_manager)
+            finally:
+                metrics.finish_request(request)
             await websocket.send_json({
                 "type": "complete",
                 "data": {
                     "title": title,
-                    "total_relationships": len(relationships)
+                    "total_relationships": len(relationships),
+                    "metrics": request.summary()
                 }
             })
             
@@ -551,8 +575,7 @@ async def websocket_classify(websocket: WebSocket):
                 "data": {"message": "Starting classification...", "progress": 0}
             })
             
-            # Run classification in thread pool
-            classified = await asyncio.to_thread(classify_relationships, relationships)
+            classified = await classify_relationships(relationships)
             
             await websocket.send_json({
                 "type": "classified_relationships",
@@ -298,176 +298,242 @@ async def websocket_endpoint(websocket: WebSocket):
         await manager.send_status("A client has disconnected.") """
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+import asyncio
 import json
+from app.core import metrics, rate_limiter
 from app.core.websocket_manager import WebSocketManager
-from app.services.wikipedia_service import fetch_relationships, fetch_relationships_by_qid
+from app.services.wikipedia_service import continue_family_relationships, fetch_relationships, fetch_relationships_by_qid
 from app.services.template_tree_extractor import extract_relationships_from_page, extract_relationships_from_page_streaming
 from app.services.relationship_classifier import classify_relationships
 
 router = APIRouter()
-manager = WebSocketManager()
 
-@router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
-    try:
-        while True:
-            data = await websocket.receive_text()
+# Actions that build the connection's tree: a new one supersedes the one still running.
+# Anything else (classification, errors) runs alongside them.
+TRAVERSAL_ACTIONS = {
+    "fetch_relationships",
+    "expand_by_qid",
+    "continue_traversal",
+    "fetch_relationships_with_tree",
+    "fetch_existing_tree",
+}
+
+def _paused(relationships) -> bool:
+    """Whether a traversal stopped on its budget (it has already sent a partial-tree status)."""
+    return bool(getattr(relationships, "paused", None))
+
+async def handle_action(message: dict, manager: WebSocketManager):
+    """Run one client request, streaming its results to the connection's manager."""
+    action = message.get("action")
+
+    # 1️⃣ Basic SPARQL relationship fetch (streams one by one)
+    if action == "fetch_relationships":
+        page_title = message.get("page_title")
+        depth = message.get("depth", 2)
+
+        if page_title:
+            await manager.send_status("Starting to fetch relationships...", 0)
+            # This already streams individual relationships
+            relationships = await fetch_relationships(page_title, depth, manager)
+            if not _paused(relationships):
+                await manager.send_status("All relationships fetched!", 100)
+        else:
+            await manager.send_message(json.dumps({
+                "type": "error",
+                "data": {"message": "page_title is required"}
+            }))
+
+    # 🆕 NEW: QID-based expansion (streams one by one)
+    # FIND THIS SECTION:
+    # FIND THIS (around line 40-70):
+    elif action == "expand_by_qid":
+        qid = message.get("qid")
+        depth = message.get("depth", 3)
+        entity_name = message.get("entity_name")
+
+        if qid:
+            await manager.send_status(f"Starting QID-based expansion for {entity_name or qid}...", 0)
+
+            # REMOVE THIS:
+            # from app.services.wikipedia_service import fetch_relationships_hybrid
+            # relationships = await fetch_relationships_hybrid(...)
+
+            # REPLACE WITH THIS:
+            relationships = await fetch_relationships_by_qid(
+                qid=qid,
+                depth=depth,
+                websocket_manager=manager,
+                entity_name=entity_name,
+                use_llm_enrichment=True  # ✅ Enable LLM for expand
+            )
+
+            if not _paused(relationships):
+                await manager.send_status("QID-based expansion complete!", 100)
+        else:
+            await manager.send_message(json.dumps({
+                "type": "error",
+                "data": {"message": "qid is required"}
+            }))
+
+    # Pick up a traversal that stopped at its node/time budget (token from frontier_remaining)
+    elif action == "continue_traversal":
+        token = message.get("token")
+
+        if token:
+            await continue_family_relationships(token, manager)
+        else:
+            await manager.send_message(json.dumps({
+                "type": "error",
+                "data": {"message": "token is required"}
+            }))
+
+    # 2️⃣ Try existing family tree first, then SPARQL if needed (both streaming)
+    elif action == "fetch_relationships_with_tree":
+        page_title = message.get("page_title")
+        depth = message.get("depth", 2)
+
+        if page_title:
+            await manager.send_status("Checking for existing family tree...", 0)
+
+            # Step 1: Try extracting from Wikipedia's existing ahnentafel tree (STREAMING)
+            tree_relationships = await extract_relationships_from_page_streaming(page_title, manager)
+
+            if tree_relationships:
+                await manager.send_status(
+                    f"Found {len(tree_relationships)} relationships from existing tree",
+                    50
+                )
+
+            # Step 2: If depth requirement not met, fetch more via SPARQL (also streaming)
+            if not tree_relationships or len(tree_relationships) < depth:
+                await manager.send_status("Fetching more relationships via SPARQL...", 60)
+                sparql_relationships = await fetch_relationships(page_title, depth, manager)
+
+                if not _paused(sparql_relationships):
+                    await manager.send_status("All relationships fetched!", 100)
+            else:
+                await manager.send_status("Depth requirement satisfied with existing tree", 100)
+        else:
+            await manager.send_message(json.dumps({
+                "type": "error",
+                "data": {"message": "page_title is required"}
+            }))
+
+    elif action == "classify_relationships":
+        relationships = message.get("relationships", [])
+
+        if not relationships:
+            await manager.send_message(json.dumps({
+                "type": "error",
+                "data": {"message": "No relationships provided"}
+            }))
+        else:
+            await manager.send_status("Starting relationship classification...", 0)
 
             try:
-                message = json.loads(data)
-                action = message.get("action")
-
-                # 1️⃣ Basic SPARQL relationship fetch (streams one by one)
-                if action == "fetch_relationships":
-                    page_title = message.get("page_title")
-                    depth = message.get("depth", 2)
-
-                    if page_title:
-                        await manager.send_status("Starting to fetch relationships...", 0)
-                        # This already streams individual relationships
-                        relationships = await fetch_relationships(page_title, depth, manager)
-                        await manager.send_status("All relationships fetched!", 100)
-                    else:
-                        await manager.send_message(json.dumps({
-                            "type": "error",
-                            "data": {"message": "page_title is required"}
-                        }))
-
-                # 🆕 NEW: QID-based expansion (streams one by one)
-                # FIND THIS SECTION:
-                # FIND THIS (around line 40-70):
-                elif action == "expand_by_qid":
-                    qid = message.get("qid")
-                    depth = message.get("depth", 3)
-                    entity_name = message.get("entity_name")
-
-                    if qid:
-                        await manager.send_status(f"Starting QID-based expansion for {entity_name or qid}...", 0)
-
-                        # REMOVE THIS:
-                        # from app.services.wikipedia_service import fetch_relationships_hybrid
-                        # relationships = await fetch_relationships_hybrid(...)
-
-                        # REPLACE WITH THIS:
-                        relationships = await fetch_relationships_by_qid(
-                            qid=qid,
-                            depth=depth,
-                            websocket_manager=manager,
-                            entity_name=entity_name,
-                            use_llm_enrichment=True  # ✅ Enable LLM for expand
-                        )
-
-                        await manager.send_status("QID-based expansion complete!", 100)
-                    else:
-                        await manager.send_message(json.dumps({
-                            "type": "error",
-                            "data": {"message": "qid is required"}
-                        }))
-
-                # 2️⃣ Try existing family tree first, then SPARQL if needed (both streaming)
-                elif action == "fetch_relationships_with_tree":
-                    page_title = message.get("page_title")
-                    depth = message.get("depth", 2)
-
-                    if page_title:
-                        await manager.send_status("Checking for existing family tree...", 0)
-
-                        # Step 1: Try extracting from Wikipedia's existing ahnentafel tree (STREAMING)
-                        tree_relationships = await extract_relationships_from_page_streaming(page_title, manager)
-
-                        if tree_relationships:
-                            await manager.send_status(
-                                f"Found {len(tree_relationships)} relationships from existing tree",
-                                50
-                            )
-
-                        # Step 2: If depth requirement not met, fetch more via SPARQL (also streaming)
-                        if not tree_relationships or len(tree_relationships) < depth:
-                            await manager.send_status("Fetching more relationships via SPARQL...", 60)
-                            sparql_relationships = await fetch_relationships(page_title, depth, manager)
-
-                            await manager.send_status("All relationships fetched!", 100)
-                        else:
-                            await manager.send_status("Depth requirement satisfied with existing tree", 100)
-                    else:
-                        await manager.send_message(json.dumps({
-                            "type": "error",
-                            "data": {"message": "page_title is required"}
-                        }))
+                # Your classify_relationships is already async, so just await it
+                classified_relationships = await classify_relationships(relationships)
 
-                elif action == "classify_relationships":
-                    relationships = message.get("relationships", [])
+                # Send back classified relationships
+                await manager.send_message(json.dumps({
+                    "type": "classified_relationships",
+                    "data": {
+                        "relationships": classified_relationships,
+                        "total": len(classified_relationships)
+                    }
+                }))
 
-                    if not relationships:
-                        await manager.send_message(json.dumps({
-                            "type": "error",
-                            "data": {"message": "No relationships provided"}
-                        }))
-                    else:
-                        await manager.send_status("Starting relationship classification...", 0)
-        
-                        try:
-                            # Your classify_relationships is already async, so just await it
-                            classified_relationships = await classify_relationships(relationships)
+                await manager.send_status("Classification complete!", 100)
 
-                            # Send back classified relationships
-                            await manager.send_message(json.dumps({
-                                "type": "classified_relationships",
-                                "data": {
-                                    "relationships": classified_relationships,
-                                    "total": len(classified_relationships)
-                                }
-                            }))
-
-                            await manager.send_status("Classification complete!", 100)
+            except Exception as e:
+                import traceback
+                print(f"Classification error: {e}")
+                traceback.print_exc()
+                await manager.send_message(json.dumps({
+                    "type": "error",
+                    "data": {"message": f"Classification failed: {str(e)}"}
+                }))
+    # 3️⃣ Only fetch the existing family tree (STREAMING - one relationship at a time)
+    elif action == "fetch_existing_tree":
+        page_title = message.get("page_title")
+        if page_title:
+            await manager.send_status("Extracting existing family tree...", 0)
             
-                        except Exception as e:
-                            import traceback
-                            print(f"Classification error: {e}")
-                            traceback.print_exc()
-                            await manager.send_message(json.dumps({
-                                "type": "error",
-                                "data": {"message": f"Classification failed: {str(e)}"}
-                            }))
-                # 3️⃣ Only fetch the existing family tree (STREAMING - one relationship at a time)
-                elif action == "fetch_existing_tree":
-                    page_title = message.get("page_title")
-                    if page_title:
-                        await manager.send_status("Extracting existing family tree...", 0)
-                        
-                        # Use the STREAMING version instead of the batch version
-                        relationships = await extract_relationships_from_page_streaming(page_title, manager)
-                        
-                        # Send completion message
-                        await manager.send_message(json.dumps({
-                            "type": "extraction_complete",
-                            "data": {
-                                "title": page_title,
-                                "total_relationships": len(relationships),
-                                "message": "Family tree extraction complete!"
-                            }
-                        }))
-                        await manager.send_status("Family tree extraction complete!", 100)
-                    else:
-                        await manager.send_message(json.dumps({
-                            "type": "error",
-                            "data": {"message": "page_title is required"}
-                        }))
+            # Use the STREAMING version instead of the batch version
+            relationships = await extract_relationships_from_page_streaming(page_title, manager)
+            
+            # Send completion message
+            await manager.send_message(json.dumps({
+                "type": "extraction_complete",
+                "data": {
+                    "title": page_title,
+                    "total_relationships": len(relationships),
+                    "message": "Family tree extraction complete!"
+                }
+            }))
+            await manager.send_status("Family tree extraction complete!", 100)
+        else:
+            await manager.send_message(json.dumps({
+                "type": "error",
+                "data": {"message": "page_title is required"}
+            }))
+
+    # ❌ Unknown action
+    else:
+        await manager.send_message(json.dumps({
+            "type": "error",
+            "data": {"message": f"Unknown action: {action}"}
+        }))
 
-                # ❌ Unknown action
-                else:
-                    await manager.send_message(json.dumps({
-                        "type": "error",
-                        "data": {"message": f"Unknown action: {action}"}
-                    }))
+@router.websocket("/ws")
+async def websocket_endpoint(websocket: WebSocket):
+    # One manager per connection, so streamed results only reach the client that asked for them
+    manager = WebSocketManager()
+    connection_id = await manager.connect(websocket)
+
+    async def run_action(message: dict):
+        # Upstream calls made for this request queue fairly under this connection and are accounted to it
+        rate_limiter.current_session.set(connection_id)
+        request = metrics.start_request(str(message.get("action")))
+        try:
+            await handle_action(message, manager)
+            await manager.send_message(json.dumps({
+                "type": "complete",
+                "data": {"action": message.get("action"), "metrics": request.summary()}
+            }))
+        except asyncio.CancelledError:
+            print(f"Request cancelled for connection {connection_id}")
+            raise
+        except Exception as e:
+            print(f"Error handling request for connection {connection_id}: {e}")
+            if manager.is_connection_active(connection_id):
+                await manager.send_message(json.dumps({
+                    "type": "error",
+                    "data": {"message": f"Error processing request: {str(e)}"}
+                }))
+        finally:
+            metrics.finish_request(request)
 
+    try:
+        while True:
+            data = await websocket.receive_text()
+
+            try:
+                message = json.loads(data)
             except json.JSONDecodeError:
                 await manager.send_message(json.dumps({
                     "type": "error",
                     "data": {"message": "Invalid JSON format"}
                 }))
+                continue
+
+            # Keep reading while the request runs: a new traversal or a disconnect cancels it
+            task = asyncio.create_task(run_action(message))
+            kind = "traversal" if message.get("action") in TRAVERSAL_ACTIONS else None
+            manager.set_active_task(connection_id, task, kind)
 
     except WebSocketDisconnect:
+        print(f"WebSocket disconnected: {connection_id}")
+    finally:
         manager.disconnect(websocket)
-        await manager.send_status("A client has disconnected.")
\ No newline at end of file
+        rate_limiter.forget_session(connection_id)
@@ -4,9 +4,81 @@ from pydantic_settings import BaseSettings  # ← CHANGED FROM pydantic
 class Settings(BaseSettings):
     WIKIPEDIA_API: str = "https://en.wikipedia.org/w/api.php"
     WIKIDATA_API: str = "https://www.wikidata.org/wiki/Special:EntityData/{}.json"
+    WIKIDATA_QUERY_API: str = "https://www.wikidata.org/w/api.php"
+    SPARQL_API: str = "https://query.wikidata.org/sparql"
     WEBSOCKET_URL: str = "ws://localhost:8000/ws"
-    GEMINI_API_KEY: str 
+    GEMINI_API_KEY: str
+
+    # Shared upstream HTTP client
+    USER_AGENT: str = "MyWikipediaTool/1.0 (https://example.com/contact)"
+    HTTP_TIMEOUT: float = 30.0  # seconds for a whole request
+    HTTP_CONNECT_TIMEOUT: float = 10.0
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_CONNECTIONS_PER_HOST: int = 10
+    HTTP_MAX_RETRIES: int = 3
+    HTTP_BACKOFF_BASE: float = 0.5  # seconds, doubled on every retry
+
+    # Process-wide upstream rate limits, shared fairly between sessions
+    UPSTREAM_RATE_LIMIT: float = 10.0  # requests per second per host
+    UPSTREAM_BURST: int = 20
+    SPARQL_RATE_LIMIT: float = 5.0
+    UPSTREAM_MAXLAG: int = 5  # seconds of replica lag before MediaWiki APIs ask us to back off (0 disables)
+
+    # Persistent Wikidata entity cache
+    ENTITY_CACHE_ENABLED: bool = True
+    ENTITY_CACHE_PATH: str = ".cache/wikidata_entities.sqlite3"
+    ENTITY_CACHE_TTL: int = 86400  # seconds before an entry is revalidated against lastrevid
+
+    # Family traversal: "auto" picks per request, "entity" or "sparql" forces a mode
+    TRAVERSAL_MODE: str = "auto"
+    SPARQL_TRAVERSAL_MIN_DEPTH: int = 3
+    SPARQL_TRAVERSAL_MAX_EDGES: int = 5000
+
+    # Offline kinship index built with `python -m app.services.kinship_index`; empty disables it
+    KINSHIP_INDEX_PATH: str = ""
+
+    # Budgets for one streamed stretch of a family traversal (0 disables a limit).
+    # Off by default: only clients that handle frontier_remaining / continue_traversal should enable them.
+    TRAVERSAL_MAX_NODES: int = 0
+    TRAVERSAL_DEADLINE: float = 0.0  # seconds
+    TRAVERSAL_CONTINUATION_TTL: int = 900  # seconds a paused traversal can be continued
+    TRAVERSAL_CONTINUATION_MAX: int = 100
+
+    # Depth-incremental cache of finished family traversals
+    TREE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    TREE_CACHE_TTL: int = 3600  # seconds
+
+    # Wikipedia article text by revision, shared by the template and LLM extractors and the classifier
+    PAGE_CACHE_ENABLED: bool = True
+    PAGE_CACHE_PATH: str = ".cache/wikipedia_pages.sqlite3"
+    PAGE_CACHE_MAX_ENTRIES: int = 64  # kept in memory
+    PAGE_CACHE_REVALIDATE: float = 600.0  # seconds before a title's latest revision is checked again
+
+    # Embeddings used to pick the relevant parts of an article for LLM extraction
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PATH: str = ".cache/embeddings.sqlite3"
+    EMBEDDING_BATCH_SIZE: int = 100  # texts per batch request (the API maximum)
+    EMBEDDING_BATCH_INTERVAL: float = 0.5  # seconds between consecutive batch requests
+    LEXICAL_RANK_MARGIN: float = 0.15  # BM25 lead (fraction of the top score) that makes embeddings unnecessary
+
+    # Gemini calls run in a bounded thread pool, off the event loop
+    LLM_MAX_CONCURRENCY: int = 4  # calls in flight at once across the process
+    LLM_CALL_TIMEOUT: float = 30.0  # seconds a call may take, queueing included (0 disables)
+
+    # Health-based ordering of the Gemini fallback chain
+    MODEL_FAILURE_THRESHOLD: int = 3  # consecutive failures that open a model's circuit
+    MODEL_OPEN_SECONDS: float = 60.0  # before the first half-open probe; doubles after each failed probe
+    MODEL_OPEN_MAX_SECONDS: float = 900.0
+    MODEL_PROBE_TIMEOUT: float = 5.0  # a probe call's deadline
+
+    # Ahnentafel templates kept per page revision
+    TEMPLATE_CACHE_SIZE: int = 512
+
+    # WebSocket event batching
+    WS_BATCH_INTERVAL: float = 0.05  # seconds events may wait before a relationships_batch frame goes out
+    WS_BATCH_MAX_EVENTS: int = 100
+
     class Config:
         env_file = ".env"
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
@@ -0,0 +1,130 @@
+import asyncio
+import json
+import random
+import time
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+from app.core import metrics, rate_limiter
+from app.core.config import settings
+
+# Statuses worth retrying: rate limiting and transient upstream failures
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_session: Optional[aiohttp.ClientSession] = None
+_session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+class UpstreamError(RuntimeError):
+    """Raised when an upstream API call fails after all retries."""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """Return the shared, keep-alive pooled session (created lazily per event loop)."""
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        connector = aiohttp.TCPConnector(
+            limit=settings.HTTP_MAX_CONNECTIONS,
+            limit_per_host=settings.HTTP_MAX_CONNECTIONS_PER_HOST,
+            ttl_dns_cache=300,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=settings.HTTP_TIMEOUT,
+            connect=settings.HTTP_CONNECT_TIMEOUT,
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            headers={"User-Agent": settings.USER_AGENT},
+        )
+        _session_loop = loop
+    return _session
+
+
+async def close_session():
+    """Close the shared session (called on application shutdown)."""
+    global _session, _session_loop
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+    _session_loop = None
+
+
+def _backoff_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Seconds to wait before the next attempt, honouring Retry-After when given."""
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+    base = settings.HTTP_BACKOFF_BASE * (2 ** attempt)
+    return base + random.uniform(0, base / 2)
+
+
+async def get_json(
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    max_retries: Optional[int] = None,
+) -> Any:
+    """
+    GET a JSON document through the shared session.
+
+    Every attempt first waits for a slot from the host's shared rate limiter
+    and is accounted in app.core.metrics (latency, bytes, errors).
+    MediaWiki action API calls carry maxlag. Retries connection errors,
+    timeouts, maxlag errors and RETRY_STATUSES with exponential backoff; a
+    Retry-After pauses the whole host, not just this call. Raises
+    UpstreamError once the retries are exhausted or on any other non-200
+    status.
+    """
+    retries = settings.HTTP_MAX_RETRIES if max_retries is None else max_retries
+    if settings.UPSTREAM_MAXLAG and url.endswith("api.php"):
+        params = {**(params or {}), "maxlag": settings.UPSTREAM_MAXLAG}
+    limiter = rate_limiter.limiter_for(url)
+    kind = metrics.classify(url, params)
+    session = await get_session()
+    last_error: Optional[UpstreamError] = None
+
+    for attempt in range(retries + 1):
+        await rate_limiter.acquire(url)
+        started = time.monotonic()
+        try:
+            async with session.get(url, params=params, headers=headers) as resp:
+                if resp.status == 200:
+                    # Wikimedia APIs do not always send application/json
+                    body = await resp.read()
+                    data = json.loads(body)
+                    lagged = isinstance(data, dict) and data.get("error", {}).get("code") == "maxlag"
+                    metrics.record_call(kind, time.monotonic() - started, len(body), error=lagged)
+                    if not lagged:
+                        return data
+                    # Replicas are lagging: back off for everybody, as the API asks
+                    last_error = UpstreamError(f"{url} failed: {data['error'].get('info', 'maxlag')}", resp.status)
+                    delay = _backoff_delay(attempt, resp.headers.get("Retry-After") or "5")
+                    limiter.pause(delay)
+                else:
+                    text = await resp.text()
+                    metrics.record_call(kind, time.monotonic() - started, len(text), error=True)
+                    last_error = UpstreamError(f"{url} failed ({resp.status}): {text[:200]}", resp.status)
+                    if resp.status not in RETRY_STATUSES:
+                        raise last_error
+                    delay = _backoff_delay(attempt, resp.headers.get("Retry-After"))
+                    if resp.headers.get("Retry-After"):
+                        limiter.pause(delay)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            metrics.record_call(kind, time.monotonic() - started, error=True)
+            last_error = UpstreamError(f"{url} request error: {e!r}")
+            delay = _backoff_delay(attempt)
+
+        if attempt < retries:
+            print(f"Upstream call to {url} failed (attempt {attempt + 1}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    raise last_error
@@ -0,0 +1,129 @@
+import asyncio
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from app.core import metrics
+from app.core.config import settings
+
+
+class LLMTimeoutError(TimeoutError):
+    """Raised when an LLM call (queueing included) runs past its deadline."""
+
+
+class LLMQueueTimeoutError(LLMTimeoutError):
+    """Raised when the deadline passes before a slot frees up: the call was never made."""
+
+
+class LLMExecutor:
+    """
+    Runs blocking LLM SDK calls (Gemini) in a bounded thread pool.
+
+    At most `max_concurrency` calls run at once across the process; the rest
+    wait their turn without blocking the event loop, and how long they waited
+    goes to the queue-wait histogram. A call that runs past its deadline is
+    abandoned (the SDK call can't be interrupted), but it keeps its slot until
+    its thread actually finishes, so the cap holds for real threads.
+    """
+
+    def __init__(self, max_concurrency: int, timeout: float):
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self.running = 0
+        self.waiting = 0
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _bind_loop(self) -> asyncio.Semaphore:
+        # Semaphores belong to one event loop; start over if the loop changed (tests, reloads)
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self.running = self.waiting = 0
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="llm")
+        return self._semaphore
+
+    async def run(
+        self,
+        kind: str,
+        func: Callable[..., Any],
+        *args,
+        timeout: Optional[float] = None,
+        size: Optional[Callable[[Any], int]] = None,
+        **kwargs,
+    ) -> Any:
+        """
+        func(*args, **kwargs) in the pool, accounted as an upstream call of `kind`.
+
+        `timeout` (default: the executor's) bounds queueing plus the call;
+        `size` maps the result to the byte count recorded for it.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        semaphore = self._bind_loop()
+        deadline = loop.time() + timeout if timeout > 0 else None
+
+        queued = time.monotonic()
+        self.waiting += 1
+        try:
+            if deadline is None:
+                await semaphore.acquire()
+            else:
+                await asyncio.wait_for(semaphore.acquire(), max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            raise LLMQueueTimeoutError(f"{kind} call waited {timeout}s for a free slot") from None
+        finally:
+            self.waiting -= 1
+            metrics.record_queue_wait(kind, time.monotonic() - queued)
+
+        self.running += 1
+
+        def release(_: Future):
+            # Runs in the worker thread (or here, if the call never started)
+            def _release():
+                self.running -= 1
+                semaphore.release()
+            if not loop.is_closed():
+                try:
+                    loop.call_soon_threadsafe(_release)
+                except RuntimeError:  # loop closed meanwhile
+                    pass
+
+        try:
+            future = self._pool.submit(func, *args, **kwargs)
+        except BaseException:
+            self.running -= 1
+            semaphore.release()
+            raise
+        future.add_done_callback(release)
+
+        with metrics.track(kind) as call:
+            try:
+                if deadline is None:
+                    result = await asyncio.wrap_future(future)
+                else:
+                    result = await asyncio.wait_for(asyncio.wrap_future(future), max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError:
+                raise LLMTimeoutError(f"{kind} call exceeded {timeout}s") from None
+            if size is not None:
+                call.nbytes = size(result)
+        return result
+
+    def snapshot(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": self.running,
+            "waiting": self.waiting,
+        }
+
+    def shutdown(self):
+        """Stop the worker threads once running calls finish; the pool is recreated on next use."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+llm = LLMExecutor(settings.LLM_MAX_CONCURRENCY, settings.LLM_CALL_TIMEOUT)
@@ -0,0 +1,224 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import urlparse
+
+from app.core.config import settings
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class CallStats:
+    """Calls made to one upstream (or lookups in one cache) and what they cost."""
+
+    __slots__ = ("calls", "errors", "bytes", "seconds", "cache_hits", "cache_misses")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "bytes": self.bytes,
+            "seconds": round(self.seconds, 4),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+        }
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class RequestMetrics:
+    """Upstream accounting for one client request (one WebSocket action)."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.monotonic()
+        self.upstreams: Dict[str, CallStats] = {}
+
+    def stats(self, kind: str) -> CallStats:
+        if kind not in self.upstreams:
+            self.upstreams[kind] = CallStats()
+        return self.upstreams[kind]
+
+    def merge(self, other: "RequestMetrics"):
+        """Add the upstream calls accounted to `other` (work done on this request's behalf)."""
+        for kind, theirs in other.upstreams.items():
+            ours = self.stats(kind)
+            for field in CallStats.__slots__:
+                setattr(ours, field, getattr(ours, field) + getattr(theirs, field))
+
+    def summary(self) -> dict:
+        return {
+            "request": self.name,
+            "duration": round(time.monotonic() - self.started, 4),
+            "upstream": {kind: stats.as_dict() for kind, stats in sorted(self.upstreams.items())},
+        }
+
+
+class MetricsRegistry:
+    """Process-wide totals and latency histograms, rendered in Prometheus text format."""
+
+    def __init__(self):
+        self.totals: Dict[str, CallStats] = {}
+        self.latency: Dict[str, Histogram] = {}
+        self.requests: Dict[str, Histogram] = {}
+        self.queue_wait: Dict[str, Histogram] = {}
+
+    def _totals(self, kind: str) -> CallStats:
+        if kind not in self.totals:
+            self.totals[kind] = CallStats()
+        return self.totals[kind]
+
+    def record_call(self, kind: str, seconds: float, nbytes: int = 0, error: bool = False):
+        stats = self._totals(kind)
+        stats.calls += 1
+        stats.errors += error
+        stats.bytes += nbytes
+        stats.seconds += seconds
+        self.latency.setdefault(kind, Histogram()).observe(seconds)
+
+    def record_cache(self, kind: str, hits: int, misses: int):
+        stats = self._totals(kind)
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+    def record_queue_wait(self, kind: str, seconds: float):
+        self.queue_wait.setdefault(kind, Histogram()).observe(seconds)
+
+    def record_request(self, request: RequestMetrics):
+        self.requests.setdefault(request.name, Histogram()).observe(time.monotonic() - request.started)
+
+    def render(self) -> str:
+        lines: List[str] = []
+
+        def counter(name: str, help_text: str, field: str):
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} counter"])
+            for kind, stats in sorted(self.totals.items()):
+                lines.append(f'{name}{{upstream="{kind}"}} {getattr(stats, field)}')
+
+        def histogram(name: str, help_text: str, label: str, series: Dict[str, Histogram]):
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} histogram"])
+            for key, hist in sorted(series.items()):
+                for bound, count in zip(LATENCY_BUCKETS, hist.counts):
+                    lines.append(f'{name}_bucket{{{label}="{key}",le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{{label}="{key}",le="+Inf"}} {hist.count}')
+                lines.append(f'{name}_sum{{{label}="{key}"}} {hist.sum:.6f}')
+                lines.append(f'{name}_count{{{label}="{key}"}} {hist.count}')
+
+        counter("family_upstream_calls_total", "Upstream API calls, retries included.", "calls")
+        counter("family_upstream_errors_total", "Upstream API calls that failed.", "errors")
+        counter("family_upstream_response_bytes_total", "Response bytes received from upstream APIs.", "bytes")
+        counter("family_cache_hits_total", "Lookups answered from a local cache instead of upstream.", "cache_hits")
+        counter("family_cache_misses_total", "Lookups that had to go upstream.", "cache_misses")
+        histogram("family_upstream_latency_seconds", "Upstream API call latency.", "upstream", self.latency)
+        histogram("family_request_duration_seconds", "Duration of client requests.", "request", self.requests)
+        histogram("family_llm_queue_wait_seconds", "Time LLM calls waited for a free executor slot.", "upstream", self.queue_wait)
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# The client request upstream calls are made for; set per WebSocket action
+current_request: ContextVar[Optional[RequestMetrics]] = ContextVar("current_request", default=None)
+
+
+def start_request(name: str) -> RequestMetrics:
+    """Start accounting for a client request in the current context."""
+    request = RequestMetrics(name)
+    current_request.set(request)
+    return request
+
+
+def finish_request(request: RequestMetrics):
+    registry.record_request(request)
+
+
+def record_call(kind: str, seconds: float, nbytes: int = 0, error: bool = False):
+    """Account one upstream call to the process totals and the current request."""
+    registry.record_call(kind, seconds, nbytes, error)
+    request = current_request.get()
+    if request is not None:
+        stats = request.stats(kind)
+        stats.calls += 1
+        stats.errors += error
+        stats.bytes += nbytes
+        stats.seconds += seconds
+
+
+def record_cache(kind: str, hits: int, misses: int = 0):
+    """Account lookups served locally (hits) or sent upstream (misses)."""
+    if not hits and not misses:
+        return
+    registry.record_cache(kind, hits, misses)
+    request = current_request.get()
+    if request is not None:
+        stats = request.stats(kind)
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+def record_queue_wait(kind: str, seconds: float):
+    """Account the time an upstream call waited for a concurrency slot before it started."""
+    registry.record_queue_wait(kind, seconds)
+
+
+class _Call:
+    __slots__ = ("nbytes",)
+
+    def __init__(self):
+        self.nbytes = 0
+
+
+@contextmanager
+def track(kind: str) -> Iterator[_Call]:
+    """Time an upstream call made by a client library; set `.nbytes` on the yielded handle if known."""
+    call = _Call()
+    started = time.monotonic()
+    try:
+        yield call
+    except BaseException:
+        record_call(kind, time.monotonic() - started, call.nbytes, error=True)
+        raise
+    record_call(kind, time.monotonic() - started, call.nbytes)
+
+
+def classify(url: str, params: Optional[dict] = None) -> str:
+    """Which upstream a get_json call goes to, for accounting."""
+    params = params or {}
+    if url == settings.SPARQL_API:
+        return "sparql"
+    host = urlparse(url).netloc
+    if host.endswith("wikidata.org"):
+        if params.get("action") == "wbgetentities":
+            return "wikidata_labels" if params.get("props") == "labels" else "wikidata_entities"
+        return "wikidata"
+    if host.endswith("wikipedia.org"):
+        return "wikipedia"
+    return host or "other"
+
+
+def render_prometheus() -> str:
+    return registry.render()
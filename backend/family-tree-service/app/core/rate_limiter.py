@@ -0,0 +1,177 @@
+import asyncio
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Deque, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from app.core.config import settings
+
+# Which client session an upstream call is made for; set per WebSocket request
+current_session: ContextVar[str] = ContextVar("upstream_session", default="http")
+
+
+class SessionStats:
+    __slots__ = ("queued", "granted", "total_wait", "max_wait")
+
+    def __init__(self):
+        self.queued = 0
+        self.granted = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, waited: float):
+        self.granted += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+    def as_dict(self) -> dict:
+        return {
+            "queued": self.queued,
+            "granted": self.granted,
+            "avg_wait": round(self.total_wait / self.granted, 4) if self.granted else 0.0,
+            "max_wait": round(self.max_wait, 4),
+        }
+
+
+class FairRateLimiter:
+    """
+    Token bucket for one upstream host, shared by every session in the process.
+
+    When no tokens are left, callers queue per session and tokens are handed
+    out round-robin across sessions, so a session with a few requests is not
+    stuck behind another session's crawl. pause() stops all grants for a
+    while (Retry-After, maxlag).
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.queues: Dict[str, Deque[Tuple[asyncio.Future, float]]] = {}
+        self.order: Deque[str] = deque()  # sessions with waiters, in round-robin order
+        self.stats: Dict[str, SessionStats] = {}
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _bind_loop(self):
+        # Futures belong to one event loop; start over if the loop changed (tests, reloads)
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self.queues.clear()
+            self.order.clear()
+            self._dispatcher = None
+            for stats in self.stats.values():
+                stats.queued = 0
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for `seconds` (e.g. after a 429 with Retry-After)."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self, session: str):
+        self._bind_loop()
+        stats = self.stats.setdefault(session, SessionStats())
+        now = time.monotonic()
+        self._refill(now)
+        if not self.order and self.tokens >= 1 and now >= self.paused_until:
+            self.tokens -= 1
+            stats.record(0.0)
+            return
+
+        future = self._loop.create_future()
+        if session not in self.queues or not self.queues[session]:
+            self.queues[session] = deque()
+            self.order.append(session)
+        self.queues[session].append((future, now))
+        stats.queued += 1
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if not future.done():
+                future.cancel()  # the dispatcher skips it
+            raise
+
+    async def _dispatch(self):
+        while self.order:
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self._refill(now)
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+
+            session = self.order.popleft()
+            queue = self.queues[session]
+            while queue:
+                future, enqueued = queue.popleft()
+                self.stats[session].queued -= 1
+                if future.done():
+                    continue  # caller was cancelled
+                self.tokens -= 1
+                self.stats[session].record(now - enqueued)
+                future.set_result(None)
+                break
+            if queue:
+                self.order.append(session)  # back of the line
+            else:
+                del self.queues[session]
+
+    def forget_session(self, session: str):
+        if not self.queues.get(session):
+            self.stats.pop(session, None)
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        self._refill(now)
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "tokens": round(self.tokens, 2),
+            "paused_for": round(max(0.0, self.paused_until - now), 2),
+            "sessions": {session: stats.as_dict() for session, stats in self.stats.items()},
+        }
+
+
+_limiters: Dict[str, FairRateLimiter] = {}
+
+
+def _host_rate(host: str) -> float:
+    if host == urlparse(settings.SPARQL_API).netloc:
+        return settings.SPARQL_RATE_LIMIT
+    return settings.UPSTREAM_RATE_LIMIT
+
+
+def limiter_for(url: str) -> FairRateLimiter:
+    """The process-wide limiter for the host of `url`."""
+    host = urlparse(url).netloc
+    if host not in _limiters:
+        _limiters[host] = FairRateLimiter(_host_rate(host), settings.UPSTREAM_BURST)
+    return _limiters[host]
+
+
+async def acquire(url: str):
+    """Wait for a request slot on the host of `url`, fairly shared with other sessions."""
+    await limiter_for(url).acquire(current_session.get())
+
+
+def forget_session(session: str):
+    """Drop a finished session's statistics."""
+    for limiter in _limiters.values():
+        limiter.forget_session(session)
+
+
+def snapshot() -> dict:
+    """Per-host limiter state and per-session queue depth and wait times."""
+    return {host: limiter.snapshot() for host, limiter in _limiters.items()}
@@ -1,29 +1,154 @@
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import List
+from typing import Dict, List, Optional
+import asyncio
 import json
+import uuid
+
+from app.core.config import settings
+
+try:
+    import orjson
+
+    def dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+except ImportError:  # orjson is optional; the stdlib encoder is just slower
+    def dumps(obj) -> str:
+        return json.dumps(obj)
+
 
 class WebSocketManager:
     def __init__(self):
         self.active_connections: List[WebSocket] = []
+        self.connection_ids: Dict[int, str] = {}  # id(websocket) -> connection id
+        self.active_tasks: Dict[str, Dict[object, asyncio.Task]] = {}  # connection id -> running tasks by kind
+        self.cancellation_tokens: Dict[str, asyncio.Event] = {}  # Cancellation tokens per connection
+        # Ordered event channel: events queue here and go out as relationships_batch frames
+        self._pending: List[dict] = []
+        self._send_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
 
-    async def connect(self, websocket: WebSocket):
+    async def connect(self, websocket: WebSocket, connection_id: Optional[str] = None) -> str:
         await websocket.accept()
+        connection_id = connection_id or str(uuid.uuid4())
         self.active_connections.append(websocket)
+        self.connection_ids[id(websocket)] = connection_id
+        self.cancellation_tokens[connection_id] = asyncio.Event()
+        return connection_id
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        """Remove a WebSocket connection and cancel any work it owns"""
+        if websocket in self.active_connections:
+            self.active_connections.remove(websocket)
+        connection_id = self.connection_ids.pop(id(websocket), None)
+        if connection_id is None:
+            return
 
-    async def send_message(self, message: str):
-        """Send a message to all connected clients"""
+        for task in self.active_tasks.pop(connection_id, {}).values():
+            if not task.done():
+                task.cancel()
+        token = self.cancellation_tokens.pop(connection_id, None)
+        if token:
+            token.set()
+        if not self.active_connections and self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+
+    def set_active_task(self, connection_id: str, task: asyncio.Task, kind: Optional[str] = "traversal"):
+        """
+        Track a task running for a connection, cancelling the one of the same kind it replaces.
+
+        Tasks with kind None run independently: nothing replaces them, only a
+        disconnect cancels them.
+        """
+        tasks = self.active_tasks.setdefault(connection_id, {})
+        key = kind if kind is not None else task
+        old_task = tasks.get(key)
+        if old_task and old_task is not task and not old_task.done():
+            old_task.cancel()
+        tasks[key] = task
+
+        def forget(done: asyncio.Task):
+            if tasks.get(key) is done:
+                del tasks[key]
+
+        task.add_done_callback(forget)
+
+    def is_connection_cancelled(self, connection_id: str) -> bool:
+        """Check if a connection has been cancelled"""
+        if connection_id not in self.cancellation_tokens:
+            return True  # Connection no longer exists
+        return self.cancellation_tokens[connection_id].is_set()
+
+    def is_connection_active(self, connection_id: str) -> bool:
+        """Check if a connection is still active"""
+        return any(
+            self.connection_ids.get(id(ws)) == connection_id for ws in self.active_connections
+        ) and not self.is_connection_cancelled(connection_id)
+
+    def check_cancelled(self):
+        """
+        Cancellation checkpoint for long-running work streaming to this manager.
+
+        Raises asyncio.CancelledError once nobody is left to receive the
+        results: every connection has gone away or been cancelled.
+        """
         for connection in self.active_connections:
+            connection_id = self.connection_ids.get(id(connection))
+            # Connections attached without connect() have no token and count as live
+            if connection_id is None or not self.is_connection_cancelled(connection_id):
+                return
+        raise asyncio.CancelledError("No active WebSocket connection left")
+
+    async def _send_text(self, message: str):
+        for connection in list(self.active_connections):
             try:
                 await connection.send_text(message)
             except:
                 # Remove disconnected clients
-                self.active_connections.remove(connection)
+                if connection in self.active_connections:
+                    self.active_connections.remove(connection)
+
+    async def send_message(self, message: str):
+        """Send a message to all connected clients, after any events queued before it"""
+        async with self._send_lock:
+            await self._flush_pending()
+            await self._send_text(message)
+
+    async def send_event(self, event_type: str, data: dict):
+        """
+        Queue an event ({"type", "data"}) on the ordered channel.
+
+        Events are coalesced into one relationships_batch frame per flush
+        interval (or as soon as WS_BATCH_MAX_EVENTS are waiting). Anything sent
+        later through send_message is delivered after them.
+        """
+        self._pending.append({"type": event_type, "data": data})
+        if len(self._pending) >= settings.WS_BATCH_MAX_EVENTS:
+            await self.flush()
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(settings.WS_BATCH_INTERVAL)
+        await self.flush()
+
+    async def flush(self):
+        """Send every queued event now."""
+        async with self._send_lock:
+            await self._flush_pending()
+
+    async def _flush_pending(self):
+        # Caller holds _send_lock, so frames leave in the order they were queued
+        if not self._pending:
+            return
+        events, self._pending = self._pending, []
+        if len(events) == 1:
+            await self._send_text(dumps(events[0]))
+        else:
+            await self._send_text(dumps({"type": "relationships_batch", "data": {"events": events}}))
 
     async def broadcast_relationships(self, relationships: List[str]):
         """Send a list of relationships to all connected clients"""
+        await self.flush()
         for connection in self.active_connections:
             try:
                 await connection.send_json(relationships)
@@ -33,16 +158,12 @@ class WebSocketManager:
 
     async def send_relationship(self, relationship: dict):
         """Send a single relationship to all connected clients"""
-        message = json.dumps({
-            "type": "relationship",
-            "data": relationship
-        })
-        await self.send_message(message)
+        await self.send_event("relationship", relationship)
 
     async def send_status(self, status: str, progress: int = 0):
         """Send status update to all connected clients"""
-        message = json.dumps({
+        message = dumps({
             "type": "status",
             "data": {"message": status, "progress": progress}
         })
-        await self.send_message(message)
\ No newline at end of file
+        await self.send_message(message)
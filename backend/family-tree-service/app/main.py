@@ -3,6 +3,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.api.routes import router as api_router
 from app.api.websocket import router as websocket_router
 from app.core.websocket_manager import WebSocketManager
+from app.core import http_client
+from app.core.llm_executor import llm
 
 app = FastAPI(title='Genealogy Tree Creator')
 
@@ -18,11 +20,13 @@ websocket_manager = WebSocketManager()
 
 @app.on_event("startup")
 async def startup_event():
-    pass
+    # Open the shared upstream HTTP session up front so the first request doesn't pay for it
+    await http_client.get_session()
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    pass
+    await http_client.close_session()
+    llm.shutdown()
 
 app.include_router(api_router)
 app.include_router(websocket_router)
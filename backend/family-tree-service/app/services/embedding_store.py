@@ -0,0 +1,79 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from app.core.config import settings
+
+# SQLite caps the number of bound parameters per statement
+_SQL_BATCH_SIZE = 500
+
+
+def embedding_key(model: str, text: str) -> str:
+    """Store key of one text embedded by one model."""
+    return hashlib.sha1(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Persistent cache of text embeddings (float32 vectors) keyed by embedding_key.
+
+    Article text only changes with a new revision, so its chunks embed to the
+    same vectors every time; entries never expire.
+    """
+
+    def __init__(self, path: str, enabled: bool = True):
+        self.path = path
+        self.enabled = enabled
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._conn.commit()
+        return self._conn
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        vectors = {}
+        if not self.enabled:
+            return vectors
+
+        keys = list(keys)
+        with self._lock:
+            conn = self._connect()
+            for i in range(0, len(keys), _SQL_BATCH_SIZE):
+                batch = keys[i:i + _SQL_BATCH_SIZE]
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                for key, vector in rows:
+                    vectors[key] = np.frombuffer(vector, dtype=np.float32)
+        return vectors
+
+    def put_many(self, vectors: Dict[str, np.ndarray]):
+        if not self.enabled or not vectors:
+            return
+        rows: List[tuple] = [(key, np.asarray(v, dtype=np.float32).tobytes()) for key, v in vectors.items()]
+        with self._lock:
+            conn = self._connect()
+            conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+            conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+embedding_store = EmbeddingStore(settings.EMBEDDING_CACHE_PATH, enabled=settings.EMBEDDING_CACHE_ENABLED)
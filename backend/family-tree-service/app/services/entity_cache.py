@@ -0,0 +1,234 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+
+# Kinship claims kept per person: father, mother, spouse, child, relative
+KINSHIP_PROPERTIES = ("P22", "P25", "P26", "P40", "P1038")
+_PROPERTY_SLOTS = dict(zip(KINSHIP_PROPERTIES, ("fathers", "mothers", "spouses", "children", "relatives")))
+
+# SQLite caps the number of bound parameters per statement
+_SQL_BATCH_SIZE = 500
+
+
+def _first_value(claims: dict, prop: str):
+    """Value of the first claim of a property that has one."""
+    for claim in claims.get(prop, ()):
+        mainsnak = claim.get("mainsnak", {})
+        if mainsnak.get("snaktype") == "value":
+            return mainsnak.get("datavalue", {}).get("value")
+    return None
+
+
+def _targets(claims: dict, prop: str) -> Tuple[str, ...]:
+    """Target QIDs of one property, skipping novalue/somevalue snaks."""
+    targets = []
+    for claim in claims.get(prop, ()):
+        mainsnak = claim.get("mainsnak", {})
+        if mainsnak.get("snaktype") != "value":
+            continue
+        value = mainsnak.get("datavalue", {}).get("value")
+        if isinstance(value, dict) and value.get("id"):
+            targets.append(value["id"])
+    return tuple(targets)
+
+
+def year_of(time_value) -> Optional[str]:
+    """Year of a Wikidata time value ("+1900-01-01T00:00:00Z" -> "1900"), as the SPARQL lookup returns it."""
+    if not isinstance(time_value, dict) or not time_value.get("time"):
+        return None
+    return time_value["time"].lstrip("+")[:4]
+
+
+class EntityRecord:
+    """
+    What a traversal knows about one person: English label, kinship links and personal details.
+
+    Parsed straight from a wbgetentities document (claims|labels, English
+    only); the document itself is never kept, in memory or in the cache.
+    """
+
+    __slots__ = (
+        "qid", "lastrevid", "label",
+        "fathers", "mothers", "spouses", "children", "relatives",
+        "birth_year", "death_year", "image",
+    )
+
+    def __init__(self, qid: str, lastrevid: Optional[int] = None, label: Optional[str] = None):
+        self.qid = qid
+        self.lastrevid = lastrevid
+        self.label = label
+        self.fathers = self.mothers = self.spouses = self.children = self.relatives = ()
+        self.birth_year: Optional[str] = None
+        self.death_year: Optional[str] = None
+        self.image: Optional[str] = None  # Commons file name
+
+    @classmethod
+    def from_entity(cls, entity: dict) -> "EntityRecord":
+        claims = entity.get("claims", {})
+        label = entity.get("labels", {}).get("en", {}).get("value")
+        record = cls(entity.get("id"), entity.get("lastrevid"), label)
+        for prop, slot in _PROPERTY_SLOTS.items():
+            if prop in claims:
+                setattr(record, slot, _targets(claims, prop))
+        record.birth_year = year_of(_first_value(claims, "P569"))
+        record.death_year = year_of(_first_value(claims, "P570"))
+        image = _first_value(claims, "P18")
+        record.image = image if isinstance(image, str) else None
+        return record
+
+    def targets(self, prop: str) -> Tuple[str, ...]:
+        """QIDs linked through one of KINSHIP_PROPERTIES."""
+        return getattr(self, _PROPERTY_SLOTS[prop])
+
+    def set_targets(self, prop: str, qids: Iterable[str]):
+        setattr(self, _PROPERTY_SLOTS[prop], tuple(qids))
+
+    def to_json(self) -> str:
+        return json.dumps([getattr(self, slot) for slot in self.__slots__])
+
+    @classmethod
+    def from_json(cls, data: str) -> "EntityRecord":
+        values = json.loads(data)
+        record = cls.__new__(cls)
+        for slot, value in zip(cls.__slots__, values):
+            setattr(record, slot, tuple(value) if isinstance(value, list) else value)
+        return record
+
+
+class EntityCache:
+    """
+    Persistent on-disk cache of EntityRecords, keyed by QID.
+
+    Entries younger than `ttl` seconds are served as-is. Older entries are
+    returned as stale so the caller can revalidate them in bulk against their
+    recorded lastrevid and either touch them or refetch them.
+    """
+
+    def __init__(self, path: str, ttl: int, enabled: bool = True):
+        self.path = path
+        self.ttl = ttl
+        self.enabled = enabled
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entities ("
+                " qid TEXT PRIMARY KEY,"
+                " lastrevid INTEGER,"
+                " fetched_at REAL NOT NULL,"
+                " data TEXT NOT NULL)"
+            )
+            # People who are only ever displayed (spouses) need nothing but a label
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS labels ("
+                " qid TEXT PRIMARY KEY,"
+                " label TEXT NOT NULL,"
+                " fetched_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get_many(self, qids: Iterable[str]) -> Tuple[Dict[str, EntityRecord], Dict[str, EntityRecord]]:
+        """Return (fresh, stale) records for the QIDs that are cached."""
+        fresh, stale = {}, {}
+        if not self.enabled:
+            return fresh, stale
+
+        qids = list(qids)
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            conn = self._connect()
+            for i in range(0, len(qids), _SQL_BATCH_SIZE):
+                batch = qids[i:i + _SQL_BATCH_SIZE]
+                rows = conn.execute(
+                    f"SELECT qid, fetched_at, data FROM entities WHERE qid IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                for qid, fetched_at, data in rows:
+                    (fresh if fetched_at >= cutoff else stale)[qid] = EntityRecord.from_json(data)
+        return fresh, stale
+
+    def put_many(self, records: Iterable[EntityRecord]):
+        """Store records, replacing older copies."""
+        if not self.enabled:
+            return
+        now = time.time()
+        rows = [
+            (record.qid, record.lastrevid, now, record.to_json())
+            for record in records if record.qid
+        ]
+        if not rows:
+            return
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO entities (qid, lastrevid, fetched_at, data) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            conn.commit()
+
+    def touch_many(self, qids: List[str]):
+        """Mark entries as freshly validated without rewriting them."""
+        if not self.enabled or not qids:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.executemany("UPDATE entities SET fetched_at = ? WHERE qid = ?", [(now, qid) for qid in qids])
+            conn.commit()
+
+    def get_labels(self, qids: Iterable[str]) -> Dict[str, str]:
+        """Unexpired labels for the QIDs that have one cached."""
+        labels = {}
+        if not self.enabled:
+            return labels
+
+        qids = list(qids)
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            conn = self._connect()
+            for i in range(0, len(qids), _SQL_BATCH_SIZE):
+                batch = qids[i:i + _SQL_BATCH_SIZE]
+                rows = conn.execute(
+                    f"SELECT qid, label FROM labels WHERE fetched_at >= ? AND qid IN ({','.join('?' * len(batch))})",
+                    [cutoff] + batch,
+                ).fetchall()
+                labels.update(rows)
+        return labels
+
+    def put_labels(self, labels: Dict[str, str]):
+        if not self.enabled or not labels:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO labels (qid, label, fetched_at) VALUES (?, ?, ?)",
+                [(qid, label, now) for qid, label in labels.items()],
+            )
+            conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+entity_cache = EntityCache(
+    settings.ENTITY_CACHE_PATH,
+    settings.ENTITY_CACHE_TTL,
+    enabled=settings.ENTITY_CACHE_ENABLED,
+)
@@ -0,0 +1,123 @@
+from array import array
+from enum import IntEnum
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+class Relation(IntEnum):
+    CHILD_OF = 0
+    SPOUSE_OF = 1
+
+    @property
+    def label(self) -> str:
+        """Wire name of the relation, as sent to clients."""
+        return _RELATION_LABELS[self]
+
+    @classmethod
+    def from_label(cls, label: str) -> "Relation":
+        return _RELATIONS_BY_LABEL[label]
+
+
+_RELATION_LABELS = {Relation.CHILD_OF: "child of", Relation.SPOUSE_OF: "spouse of"}
+_RELATIONS_BY_LABEL = {label: relation for relation, label in _RELATION_LABELS.items()}
+
+# Traversal directions; a frontier entry (person, direction) packs into person id << 1 | direction code
+DIRECTIONS = ("up", "down")
+DIRECTION_CODES = {name: code for code, name in enumerate(DIRECTIONS)}
+
+
+class Person:
+    """One interned person; details stay None until known."""
+
+    __slots__ = ("qid", "label", "birth_year", "death_year", "image_url", "details_sent")
+
+    def __init__(self, qid: str):
+        self.qid = qid
+        self.label: Optional[str] = None
+        self.birth_year: Optional[str] = None
+        self.death_year: Optional[str] = None
+        self.image_url: Optional[str] = None
+        self.details_sent = False
+
+    @property
+    def name(self) -> str:
+        return self.label or self.qid
+
+
+class KinshipGraph:
+    """
+    People and relationships found by one traversal.
+
+    QIDs are interned to ints once; edges are parallel arrays of person ids
+    and Relation codes, deduplicated on (entity1, relation, entity2) with
+    marriages counted once whichever spouse they are seen from. Dicts are
+    only built at the wire boundary (to_dicts).
+    """
+
+    __slots__ = ("people", "ids", "src", "dst", "rel", "_edge_keys")
+
+    def __init__(self):
+        self.people: List[Person] = []
+        self.ids: Dict[str, int] = {}
+        self.src = array("l")
+        self.dst = array("l")
+        self.rel = array("b")
+        self._edge_keys: set = set()
+
+    def intern(self, qid: str) -> int:
+        person_id = self.ids.get(qid)
+        if person_id is None:
+            person_id = len(self.people)
+            self.people.append(Person(qid))
+            self.ids[qid] = person_id
+        return person_id
+
+    def person(self, qid: str) -> Person:
+        return self.people[self.intern(qid)]
+
+    def frontier_key(self, qid: str, direction: str) -> int:
+        return self.intern(qid) << 1 | DIRECTION_CODES[direction]
+
+    def add_edge(self, entity1_qid: str, relation: Relation, entity2_qid: str) -> bool:
+        """Add an edge; False if it is already there."""
+        entity1, entity2 = self.intern(entity1_qid), self.intern(entity2_qid)
+        low, high = (entity2, entity1) if relation == Relation.SPOUSE_OF and entity2 < entity1 else (entity1, entity2)
+        key = (low << 32 | high) << 1 | relation
+        if key in self._edge_keys:
+            return False
+        self._edge_keys.add(key)
+        self.src.append(entity1)
+        self.dst.append(entity2)
+        self.rel.append(relation)
+        return True
+
+    def __len__(self) -> int:
+        return len(self.src)
+
+    def qids(self) -> List[str]:
+        return [person.qid for person in self.people]
+
+    def edges(self, start: int = 0) -> Iterator[Tuple[str, Relation, str]]:
+        for i in range(start, len(self.src)):
+            yield self.people[self.src[i]].qid, Relation(self.rel[i]), self.people[self.dst[i]].qid
+
+    def set_label(self, qid: str, label: Optional[str]):
+        if label and label != qid:
+            self.person(qid).label = label
+
+    def set_details(self, qid: str, entry: dict):
+        person = self.person(qid)
+        person.birth_year = entry.get("birth_year")
+        person.death_year = entry.get("death_year")
+        person.image_url = entry.get("image_url")
+
+    def to_dicts(self, start: int = 0) -> List[Dict[str, str]]:
+        """Edges from `start` on as {"entity1", "relationship", "entity2"} with names substituted."""
+        people = self.people
+        return [
+            {
+                "entity1": people[self.src[i]].name,
+                "relationship": _RELATION_LABELS[self.rel[i]],
+                "entity2": people[self.dst[i]].name,
+            }
+            for i in range(start, len(self.src))
+        ]
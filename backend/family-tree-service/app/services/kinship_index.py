@@ -0,0 +1,278 @@
+"""
+Offline kinship index built from a Wikidata JSON dump.
+
+Build it with:
+
+    python -m app.services.kinship_index latest-all.json.bz2 .cache/kinship_index
+
+Only humans (P31 = Q5) with an English label are kept, together with their
+father (P22), mother (P25), spouse (P26) and child (P40) links, birth and death
+years (P569/P570) and image (P18). The result is a directory of .npy arrays
+that are memory-mapped at load time:
+
+    qids.npy                     sorted numeric QIDs (int64), one row per person
+    edge_offsets.npy             CSR row offsets into the edge arrays (int64)
+    edge_targets.npy             numeric QID of the linked person (int64)
+    edge_relations.npy           index into RELATION_PROPERTIES (int8)
+    label_offsets/label_data     English labels as one UTF-8 string table
+    image_offsets/image_data     P18 file names as one UTF-8 string table
+    birth_years/death_years      int32, NO_YEAR when unknown
+    meta.json                    counts and source
+"""
+import argparse
+import bz2
+import gzip
+import json
+import os
+import time
+from array import array
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.entity_cache import EntityRecord, _first_value, _targets, year_of
+
+# Edge relation codes, in the order claims are emitted
+RELATION_PROPERTIES = ("P22", "P25", "P26", "P40")
+NO_YEAR = np.iinfo(np.int32).min
+
+_ARRAYS = (
+    "qids", "edge_offsets", "edge_targets", "edge_relations",
+    "label_offsets", "label_data", "image_offsets", "image_data",
+    "birth_years", "death_years",
+)
+
+
+def _open_dump(path: str):
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rt", encoding="utf-8")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def iter_dump_entities(path: str) -> Iterator[dict]:
+    """
+    Stream entities from a Wikidata JSON dump without loading it.
+
+    Handles the official array layout (one entity per line, trailing commas,
+    surrounding brackets) as well as plain JSON-lines extracts.
+    """
+    with _open_dump(path) as f:
+        for line in f:
+            line = line.strip().rstrip(",")
+            if not line or line in ("[", "]"):
+                continue
+            yield json.loads(line)
+
+
+def _qid_number(qid: str) -> int:
+    return int(qid[1:])
+
+
+def _year(time_value) -> int:
+    """Signed year of a Wikidata time value, or NO_YEAR."""
+    if not isinstance(time_value, dict) or not time_value.get("time"):
+        return NO_YEAR
+    text = time_value["time"]
+    sign = -1 if text.startswith("-") else 1
+    try:
+        return sign * int(text.lstrip("+-").split("-", 1)[0])
+    except ValueError:
+        return NO_YEAR
+
+
+def _string_table(strings: List[str]):
+    """Pack strings into (offsets, utf-8 bytes); string i is data[offsets[i]:offsets[i + 1]]."""
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return offsets, data
+
+
+def build_index(dump_path: str, out_dir: str, progress_every: int = 1_000_000) -> dict:
+    """Stream a dump into a kinship index directory and return its metadata."""
+    node_qids = array("q")
+    labels: List[str] = []
+    images: List[str] = []
+    births = array("i")
+    deaths = array("i")
+    edge_sources = array("q")  # node ordinal in dump order
+    edge_targets = array("q")
+    edge_relations = array("b")
+
+    started = time.time()
+    seen = 0
+    for entity in iter_dump_entities(dump_path):
+        seen += 1
+        if progress_every and seen % progress_every == 0:
+            print(f"kinship index: {seen} entities read, {len(node_qids)} people kept ({time.time() - started:.0f}s)")
+
+        qid = entity.get("id", "")
+        if not qid.startswith("Q"):
+            continue
+        claims = entity.get("claims", {})
+        if "Q5" not in _targets(claims, "P31"):
+            continue
+        label = entity.get("labels", {}).get("en", {}).get("value")
+        if not label:
+            continue
+
+        ordinal = len(node_qids)
+        node_qids.append(_qid_number(qid))
+        labels.append(label)
+        image = _first_value(claims, "P18")
+        images.append(image if isinstance(image, str) else "")
+        births.append(_year(_first_value(claims, "P569")))
+        deaths.append(_year(_first_value(claims, "P570")))
+        for code, prop in enumerate(RELATION_PROPERTIES):
+            for target in _targets(claims, prop):
+                edge_sources.append(ordinal)
+                edge_targets.append(_qid_number(target))
+                edge_relations.append(code)
+
+    # Sort people by QID so lookups are a binary search, and group edges by person (CSR)
+    qids = np.frombuffer(node_qids, dtype=np.int64)
+    order = np.argsort(qids, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+
+    sources = rank[np.frombuffer(edge_sources, dtype=np.int64)] if len(edge_sources) else np.zeros(0, dtype=np.int64)
+    edge_order = np.argsort(sources, kind="stable")  # keeps claim order within a person
+    edge_offsets = np.zeros(len(qids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=len(qids)), out=edge_offsets[1:])
+
+    label_offsets, label_data = _string_table([labels[i] for i in order])
+    image_offsets, image_data = _string_table([images[i] for i in order])
+
+    arrays = {
+        "qids": qids[order],
+        "edge_offsets": edge_offsets,
+        "edge_targets": np.frombuffer(edge_targets, dtype=np.int64)[edge_order],
+        "edge_relations": np.frombuffer(edge_relations, dtype=np.int8)[edge_order],
+        "label_offsets": label_offsets,
+        "label_data": label_data,
+        "image_offsets": image_offsets,
+        "image_data": image_data,
+        "birth_years": np.frombuffer(births, dtype=np.int32)[order],
+        "death_years": np.frombuffer(deaths, dtype=np.int32)[order],
+    }
+
+    os.makedirs(out_dir, exist_ok=True)
+    for name, values in arrays.items():
+        np.save(os.path.join(out_dir, f"{name}.npy"), values)
+
+    meta = {
+        "source": os.path.basename(dump_path),
+        "entities_read": seen,
+        "people": int(len(qids)),
+        "edges": int(len(edge_order)),
+        "built_at": int(time.time()),
+    }
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def _time_value(year: int) -> dict:
+    sign = "-" if year < 0 else "+"
+    return {"time": f"{sign}{abs(year):04d}-00-00T00:00:00Z"}
+
+
+class KinshipIndex:
+    """
+    Read-only view over a kinship index directory.
+
+    Arrays are memory-mapped, so loading is instant and lookups (a binary
+    search over the sorted QIDs plus a CSR slice) cost microseconds.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        for name in _ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+
+    def __len__(self) -> int:
+        return len(self.qids)
+
+    def _position(self, qid: str) -> Optional[int]:
+        if not qid or not qid.startswith("Q") or not qid[1:].isdigit():
+            return None
+        number = int(qid[1:])
+        pos = int(np.searchsorted(self.qids, number))
+        if pos < len(self.qids) and self.qids[pos] == number:
+            return pos
+        return None
+
+    def __contains__(self, qid: str) -> bool:
+        return self._position(qid) is not None
+
+    def _string(self, offsets, data, pos: int) -> str:
+        return bytes(data[offsets[pos]:offsets[pos + 1]]).decode("utf-8")
+
+    def label(self, qid: str) -> Optional[str]:
+        pos = self._position(qid)
+        if pos is None:
+            return None
+        return self._string(self.label_offsets, self.label_data, pos)
+
+    def get(self, qid: str) -> Optional[EntityRecord]:
+        """Entity record for a person, like the ones fetch_entities keeps, or None."""
+        pos = self._position(qid)
+        if pos is None:
+            return None
+
+        record = EntityRecord(qid, label=self._string(self.label_offsets, self.label_data, pos))
+        targets: Dict[str, List[str]] = {}
+        start, end = int(self.edge_offsets[pos]), int(self.edge_offsets[pos + 1])
+        for target, code in zip(self.edge_targets[start:end], self.edge_relations[start:end]):
+            targets.setdefault(RELATION_PROPERTIES[code], []).append(f"Q{int(target)}")
+        for prop, qids in targets.items():
+            record.set_targets(prop, qids)
+
+        birth, death = int(self.birth_years[pos]), int(self.death_years[pos])
+        if birth != NO_YEAR:
+            record.birth_year = year_of(_time_value(birth))
+        if death != NO_YEAR:
+            record.death_year = year_of(_time_value(death))
+        record.image = self._string(self.image_offsets, self.image_data, pos) or None
+        return record
+
+
+_index: Optional[KinshipIndex] = None
+_index_path: Optional[str] = None
+
+
+def get_kinship_index() -> Optional[KinshipIndex]:
+    """The index at settings.KINSHIP_INDEX_PATH, or None if none is configured or built."""
+    global _index, _index_path
+    path = settings.KINSHIP_INDEX_PATH
+    if not path:
+        return None
+    if _index is None or _index_path != path:
+        if not os.path.exists(os.path.join(path, "qids.npy")):
+            return None
+        _index = KinshipIndex(path)
+        _index_path = path
+        print(f"Loaded kinship index from {path} ({len(_index)} people)")
+    return _index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the offline kinship index from a Wikidata JSON dump.")
+    parser.add_argument("dump", help="latest-all.json(.bz2/.gz) or a JSON-lines extract of it")
+    parser.add_argument("out", nargs="?", default=settings.KINSHIP_INDEX_PATH or ".cache/kinship_index",
+                        help="output directory (default: KINSHIP_INDEX_PATH)")
+    parser.add_argument("--progress-every", type=int, default=1_000_000,
+                        help="print progress every N entities (0 to disable)")
+    args = parser.parse_args()
+
+    meta = build_index(args.dump, args.out, args.progress_every)
+    print(f"kinship index written to {args.out}: {meta['people']} people, {meta['edges']} edges")
+
+
+if __name__ == "__main__":
+    main()
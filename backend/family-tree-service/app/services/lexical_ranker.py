@@ -0,0 +1,66 @@
+import math
+import re
+from collections import Counter
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+# What a chunk about someone's family mentions
+FAMILY_TERMS = (
+    "married", "marriage", "marry", "wife", "husband", "spouse", "widow", "widower",
+    "son", "sons", "daughter", "daughters", "child", "children", "parents",
+    "father", "mother", "brother", "sister", "adopted", "adoption", "heir", "family",
+)
+
+_WORD = re.compile(r"[a-z]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+def bm25_scores(documents: Sequence[str], query_terms: Sequence[str], k1: float = 1.5, b: float = 0.75) -> np.ndarray:
+    """Okapi BM25 score of every document for the query terms."""
+    tokenized = [tokenize(document) for document in documents]
+    lengths = np.array([len(tokens) for tokens in tokenized], dtype=np.float64)
+    average = lengths.mean() if len(lengths) and lengths.mean() > 0 else 1.0
+    counts = [Counter(tokens) for tokens in tokenized]
+
+    scores = np.zeros(len(documents))
+    for term in set(query_terms):
+        tf = np.array([c[term] for c in counts], dtype=np.float64)
+        containing = int(np.count_nonzero(tf))
+        if not containing:
+            continue
+        idf = math.log(1 + (len(documents) - containing + 0.5) / (containing + 0.5))
+        scores += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * lengths / average))
+    return scores
+
+
+def rank(documents: Sequence[str], top_k: int, query_terms: Sequence[str] = FAMILY_TERMS) -> List[int]:
+    """Indexes of the top_k documents by BM25, best first (ties keep document order)."""
+    scores = bm25_scores(documents, query_terms)
+    return [int(i) for i in np.argsort(-scores, kind="stable")[:top_k]]
+
+
+def confident_top_k(
+    documents: Sequence[str],
+    top_k: int,
+    margin: float,
+    query_terms: Sequence[str] = FAMILY_TERMS,
+) -> Optional[List[int]]:
+    """
+    The top_k documents by BM25, or None if the lexical ranking is too close to call.
+
+    Confident means every selected document mentions the query and the
+    weakest of them beats the best one left out by at least `margin` of the
+    top score. With no more than top_k documents there is nothing to decide.
+    """
+    if len(documents) <= top_k:
+        return rank(documents, top_k, query_terms)
+    scores = bm25_scores(documents, query_terms)
+    order = np.argsort(-scores, kind="stable")
+    best, weakest, left_out = scores[order[0]], scores[order[top_k - 1]], scores[order[top_k]]
+    if weakest <= 0 or (weakest - left_out) < margin * best:
+        return None
+    return [int(i) for i in order[:top_k]]
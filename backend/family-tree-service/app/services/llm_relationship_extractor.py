@@ -758,15 +758,19 @@
 #             print(f"Gemini error: {e}")
 #             return {"child_of": [], "spouse_of": [], "adopted_by": []}
 
-from typing import List, Dict, Optional, Tuple, Set
+from typing import List, Dict, Optional, Tuple, Set, Union
+import asyncio
 import os
 from dotenv import load_dotenv
 import google.generativeai as genai
-import wikipediaapi
 import numpy as np
-import time
 from difflib import SequenceMatcher
+from app.core import metrics
 from app.core.config import settings
+from app.core.llm_executor import llm
+from app.services import lexical_ranker, page_cache
+from app.services.embedding_store import embedding_key, embedding_store
+from app.services.name_index import NameIndex
 
 
 
@@ -776,12 +780,61 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 # Configure Gemini
 genai.configure(api_key=GEMINI_API_KEY)
 
-class LLMRelationshipExtractor:
-    def __init__(self):
-        self.wiki = wikipediaapi.Wikipedia(
-            language="en",
-            user_agent="GenealogyApp/1.0"
+EMBEDDING_MODEL = "models/text-embedding-004"
+
+# What a relevant chunk talks about; embedded once and reused
+RELEVANCE_QUERY = """family relationships marriage spouse children parents 
+                      father mother married wife husband son daughter adopted adoption"""
+
+async def embed_texts(texts: List[str]) -> np.ndarray:
+    """
+    Embeddings of many texts as one (len(texts), dim) float32 matrix.
+
+    Texts embedded before come from the embedding store; the rest go out in
+    batches of EMBEDDING_BATCH_SIZE (SDK calls go through the LLM executor,
+    with a non-blocking pause between batches) and are stored.
+    """
+    keys = [embedding_key(EMBEDDING_MODEL, text) for text in texts]
+    vectors = await asyncio.to_thread(embedding_store.get_many, set(keys))
+    metrics.record_cache("gemini_embeddings", len(vectors), len(set(keys)) - len(vectors))
+
+    missing = list({key: text for key, text in zip(keys, texts) if key not in vectors}.items())
+    batch_size = settings.EMBEDDING_BATCH_SIZE
+    fresh = {}
+    for start in range(0, len(missing), batch_size):
+        if start:
+            await asyncio.sleep(settings.EMBEDDING_BATCH_INTERVAL)  # rate limiting, without blocking other connections
+        batch = missing[start:start + batch_size]
+        result = await llm.run(
+            "gemini", genai.embed_content, model=EMBEDDING_MODEL, content=[text for _, text in batch]
         )
+        for (key, _), vector in zip(batch, result["embedding"]):
+            fresh[key] = np.asarray(vector, dtype=np.float32)
+    if fresh:
+        vectors.update(fresh)
+        await asyncio.to_thread(embedding_store.put_many, fresh)
+
+    return np.vstack([vectors[key] for key in keys])
+
+_query_vector: Optional[np.ndarray] = None
+
+async def relevance_query_vector() -> np.ndarray:
+    """Unit vector of RELEVANCE_QUERY."""
+    global _query_vector
+    if _query_vector is None:
+        vector = (await embed_texts([RELEVANCE_QUERY]))[0]
+        _query_vector = vector / np.linalg.norm(vector)
+    return _query_vector
+
+class LLMRelationshipExtractor:
+    def __init__(self, websocket_manager=None):
+        # Results stream to this manager; once its client is gone the extraction stops
+        self.websocket_manager = websocket_manager
+
+    def _check_cancelled(self):
+        """Cancellation checkpoint between expensive Wikipedia/Gemini calls."""
+        if self.websocket_manager:
+            self.websocket_manager.check_cancelled()
     
     def _calculate_name_similarity(self, name1: str, name2: str) -> float:
         """Calculate similarity between two names (0-1 scale)."""
@@ -795,44 +848,32 @@ class LLMRelationshipExtractor:
     def _is_duplicate_entity(
         self, 
         name: str, 
-        existing_entities: Set[str], 
+        existing_entities: NameIndex, 
         threshold: float = 0.85  # INCREASED from 0.80
     ) -> bool:
         """
         Check if a name is too similar to existing entities.
         Uses stricter matching to avoid false positives.
         """
-        name_normalized = " ".join(name.lower().split())
-        
-        for existing in existing_entities:
-            existing_normalized = " ".join(existing.lower().split())
-            
-            # Exact match (case-insensitive)
-            if name_normalized == existing_normalized:
-                print(f"🔴 Exact duplicate: '{name}' == '{existing}'")
-                return True
-            
-            # Check if one name is a substring of the other (likely same person)
+        duplicate = existing_entities.find_duplicate(name, threshold)
+        if duplicate is None:
+            return False
+
+        existing, kind, similarity = duplicate
+        if kind == "exact":
+            print(f"🔴 Exact duplicate: '{name}' == '{existing}'")
+        elif kind == "substring":
             # Example: "Doris Schweitzer" vs "Doris Aude Ascher Schweitzer"
-            if name_normalized in existing_normalized or existing_normalized in name_normalized:
-                similarity = self._calculate_name_similarity(name, existing)
-                if similarity >= 0.70:  # If substring and >70% similar
-                    print(f"🟡 Substring duplicate: '{name}' overlaps '{existing}' ({similarity:.2%})")
-                    return True
-            
-            # Fuzzy match with STRICTER threshold
-            similarity = self._calculate_name_similarity(name, existing)
-            if similarity >= threshold:
-                print(f"🟠 Fuzzy duplicate: '{name}' is {similarity:.2%} similar to '{existing}'")
-                return True
-        
-        return False
+            print(f"🟡 Substring duplicate: '{name}' overlaps '{existing}' ({similarity:.2%})")
+        else:
+            print(f"🟠 Fuzzy duplicate: '{name}' is {similarity:.2%} similar to '{existing}'")
+        return True
     
     async def extract_relationships_for_person(
         self, 
         person_name: str,
         qid: Optional[str] = None,
-        existing_entities: Optional[Set[str]] = None
+        existing_entities: Optional[Union[Set[str], NameIndex]] = None
     ) -> Dict[str, List[Tuple[str, str]]]:
         """
         Extract relationships using LLM when Wikidata is incomplete.
@@ -840,7 +881,7 @@ class LLMRelationshipExtractor:
         Args:
             person_name: Name of the person to extract relationships for
             qid: Optional Wikidata QID
-            existing_entities: Set of entity names already in the tree
+            existing_entities: Names already in the tree (a NameIndex is used as is)
         
         Returns: {
             "child_of": [(person, parent), ...],
@@ -848,8 +889,8 @@ class LLMRelationshipExtractor:
             "adopted_by": [(person, adopter), ...]
         }
         """
-        if existing_entities is None:
-            existing_entities = set()
+        if not isinstance(existing_entities, NameIndex):
+            existing_entities = NameIndex(existing_entities or ())
         
         print(f"\n🔍 LLM extraction for: {person_name}")
         print(f"📋 Existing entities count: {len(existing_entities)}")
@@ -860,10 +901,13 @@ class LLMRelationshipExtractor:
             print(f"⚠️  No Wikipedia text found for {person_name}")
             return {"child_of": [], "spouse_of": [], "adopted_by": []}
         
+        self._check_cancelled()
+
         # Step 2: Chunk and find relevant sections
         chunks = self._chunk_text(wiki_text, max_size=2000)
         relevant_chunks = await self._find_relevant_chunks(chunks, top_k=3)
         combined_text = "\n\n".join(relevant_chunks)
+        self._check_cancelled()
         
         # Step 3: Extract with Gemini (pass existing entities)
         relationships = await self._extract_with_gemini(
@@ -888,7 +932,7 @@ class LLMRelationshipExtractor:
     def _filter_duplicate_relationships(
         self,
         relationships: Dict[str, List[Tuple[str, str]]],
-        existing_entities: Set[str],
+        existing_entities: NameIndex,
         subject_name: str
     ) -> Dict[str, List[Tuple[str, str]]]:
         """
@@ -944,8 +988,8 @@ class LLMRelationshipExtractor:
     async def _get_wikipedia_text(self, name: str) -> str:
         """Fetch Wikipedia page focusing on family sections"""
         try:
-            page = self.wiki.page(name)
-            if not page.exists():
+            page = await page_cache.pages.get(name)
+            if page is None:
                 return ""
             
             family_keywords = [
@@ -954,17 +998,9 @@ class LLMRelationshipExtractor:
             ]
             
             relevant_text = page.summary + "\n\n"
-            
-            def collect_sections(sections):
-                text = ""
-                for section in sections:
-                    title_lower = (section.title or "").lower()
-                    if any(kw in title_lower for kw in family_keywords):
-                        text += f"\n{section.title}:\n{section.text}\n"
-                    text += collect_sections(section.sections)
-                return text
-            
-            relevant_text += collect_sections(page.sections)
+            for section in page.sections:
+                if any(kw in section.title.lower() for kw in family_keywords):
+                    relevant_text += f"\n{section.title}:\n{section.text}\n"
             
             # Fallback to full text if no specific sections found
             if len(relevant_text) < 500:
@@ -999,59 +1035,35 @@ class LLMRelationshipExtractor:
         chunks: List[str], 
         top_k: int = 3
     ) -> List[str]:
-        """Find most relevant chunks using embeddings"""
+        """Find most relevant chunks: BM25 when it is clear-cut, embeddings otherwise"""
         if not chunks:
             return []
+
+        ranked = lexical_ranker.confident_top_k(chunks, top_k, settings.LEXICAL_RANK_MARGIN)
+        if ranked is not None:
+            return [chunks[i] for i in ranked]
         
         try:
-            query = """family relationships marriage spouse children parents 
-                      father mother married wife husband son daughter adopted adoption"""
-            
-            # Get query embedding
-            query_emb = np.array(genai.embed_content(
-                model="models/text-embedding-004",
-                content=query
-            )["embedding"])
-            
-            chunk_scores = []
-            for i, chunk in enumerate(chunks):
-                try:
-                    chunk_emb = np.array(genai.embed_content(
-                        model="models/text-embedding-004",
-                        content=chunk
-                    )["embedding"])
-                    
-                    # Cosine similarity
-                    similarity = np.dot(query_emb, chunk_emb) / (
-                        np.linalg.norm(query_emb) * np.linalg.norm(chunk_emb)
-                    )
-                    chunk_scores.append((chunk, similarity, i))
-                    time.sleep(0.5)  # Rate limiting
-                    
-                except Exception as e:
-                    print(f"Embedding error for chunk {i}: {e}")
-                    chunk_scores.append((chunk, 0, i))
-            
-            chunk_scores.sort(key=lambda x: x[1], reverse=True)
-            return [chunk for chunk, _, _ in chunk_scores[:top_k]]
+            query = await relevance_query_vector()
+            self._check_cancelled()
+            matrix = await embed_texts(chunks)
+
+            # Cosine similarity of every chunk at once
+            norms = np.linalg.norm(matrix, axis=1)
+            norms[norms == 0] = 1.0
+            scores = (matrix @ query) / norms
+            order = np.argsort(-scores, kind="stable")[:top_k]
+            return [chunks[i] for i in order]
             
         except Exception as e:
-            print(f"Embedding search failed: {e}, falling back to keyword matching")
-            # Fallback: keyword matching
-            scored = []
-            keywords = ["married", "wife", "husband", "spouse", "son", "daughter",
-                       "children", "parents", "father", "mother"]
-            for i, chunk in enumerate(chunks):
-                score = sum(1 for kw in keywords if kw.lower() in chunk.lower())
-                scored.append((chunk, score, i))
-            scored.sort(key=lambda x: x[1], reverse=True)
-            return [chunk for chunk, _, _ in scored[:top_k]]
+            print(f"Embedding search failed: {e}, falling back to lexical ranking")
+            return [chunks[i] for i in lexical_ranker.rank(chunks, top_k)]
     
     async def _extract_with_gemini(
         self, 
         subject: str, 
         text: str,
-        existing_entities: Set[str]
+        existing_entities: NameIndex
     ) -> Dict[str, List[Tuple[str, str]]]:
         """Extract relationships using Gemini"""
         
@@ -1101,7 +1113,9 @@ Alice Smith child of {subject}
                     temperature=0.0,  # Deterministic output
                 )
             )
-            response = model.generate_content(prompt)
+            response = await llm.run(
+                "gemini", model.generate_content, prompt, size=lambda r: len(r.text.encode())
+            )
             raw_text = response.text.strip()
             
             print(f"\n🤖 LLM Raw Response:\n{raw_text}\n")
@@ -0,0 +1,129 @@
+import math
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class ModelHealth:
+    """Recent behaviour of one model: EWMA success rate and latency, and its circuit."""
+
+    __slots__ = ("name", "success", "latency", "failures", "state", "opened_at", "open_for", "probe_started")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.success = 1.0
+        self.latency: Optional[float] = None  # seconds, None until a call succeeds
+        self.failures = 0  # consecutive
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.open_for = 0.0
+        self.probe_started: Optional[float] = None
+
+    def as_dict(self) -> dict:
+        return {
+            "state": self.state,
+            "success_rate": round(self.success, 4),
+            "latency": round(self.latency, 4) if self.latency is not None else None,
+            "consecutive_failures": self.failures,
+        }
+
+
+class ModelRouter:
+    """
+    Orders a fallback chain of models by recent health.
+
+    Closed models go cheapest expected cost first (EWMA latency over EWMA
+    success rate; models never measured keep their preference order after
+    the measured ones). `failure_threshold` consecutive failures, or one
+    fatal failure (unknown model), open a model's circuit: it is
+    skipped until `open_seconds` pass, then one request probes it first. A
+    successful probe closes the circuit; a failed one reopens it for twice as
+    long, up to `max_open_seconds`.
+    """
+
+    def __init__(
+        self,
+        models: Sequence[str],
+        failure_threshold: int = 3,
+        open_seconds: float = 60.0,
+        max_open_seconds: float = 900.0,
+        probe_timeout: float = 5.0,
+        alpha: float = 0.3,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.models = list(models)
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.probe_timeout = probe_timeout
+        self.alpha = alpha
+        self.clock = clock
+        self.health: Dict[str, ModelHealth] = {name: ModelHealth(name) for name in self.models}
+
+    def _cost(self, health: ModelHealth) -> float:
+        if health.latency is None:
+            return math.inf
+        return health.latency / max(health.success, 0.05)
+
+    def order(self) -> List[str]:
+        """
+        Models to try for one request, best first.
+
+        At most one half-open model is handed out (first) per probe; a probe
+        nobody reported back on within twice probe_timeout is given out again.
+        When every circuit is open, the model due for a probe soonest is
+        probed early rather than failing the request without a call.
+        """
+        now = self.clock()
+        probe = None
+        for name in self.models:
+            health = self.health[name]
+            if health.state == OPEN and now - health.opened_at >= health.open_for:
+                health.state = HALF_OPEN
+            if health.state != HALF_OPEN or probe is not None:
+                continue
+            if health.probe_started is None or now - health.probe_started > 2 * self.probe_timeout:
+                health.probe_started = now
+                probe = name
+
+        closed = [name for name in self.models if self.health[name].state == CLOSED]
+        closed.sort(key=lambda name: self._cost(self.health[name]))  # stable: unmeasured keep preference order
+        if probe or closed or not self.models:
+            return [probe, *closed] if probe else closed
+
+        soonest = min(self.health.values(), key=lambda health: health.opened_at + health.open_for)
+        soonest.state = HALF_OPEN
+        soonest.probe_started = now
+        return [soonest.name]
+
+    def is_probe(self, name: str) -> bool:
+        return self.health[name].state == HALF_OPEN
+
+    def record_success(self, name: str, seconds: float):
+        health = self.health[name]
+        health.success += self.alpha * (1.0 - health.success)
+        health.latency = seconds if health.latency is None else health.latency + self.alpha * (seconds - health.latency)
+        health.failures = 0
+        health.state = CLOSED
+        health.open_for = 0.0
+        health.probe_started = None
+
+    def record_failure(self, name: str, fatal: bool = False):
+        health = self.health[name]
+        health.success -= self.alpha * health.success
+        health.failures += 1
+        if health.state == HALF_OPEN:
+            self._open(health, min(max(health.open_for, self.open_seconds) * 2, self.max_open_seconds))
+        elif fatal or health.failures >= self.failure_threshold:
+            self._open(health, self.open_seconds)
+
+    def _open(self, health: ModelHealth, seconds: float):
+        health.state = OPEN
+        health.opened_at = self.clock()
+        health.open_for = seconds
+        health.probe_started = None
+        print(f"Model {health.name} circuit open for {seconds:.0f}s after {health.failures} failures")
+
+    def snapshot(self) -> dict:
+        return {name: self.health[name].as_dict() for name in self.models}
@@ -0,0 +1,101 @@
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase with single spaces, the form names are compared in."""
+    return " ".join(name.lower().split())
+
+
+def _grams(normalized: str, n: int) -> Set[str]:
+    padded = f" {normalized} "  # short names still get grams, and word boundaries count
+    return {padded[i:i + n] for i in range(max(len(padded) - n + 1, 1))}
+
+
+class NameIndex:
+    """
+    Names already in a tree, indexed for fuzzy duplicate checks.
+
+    Names are blocked by character n-grams: a lookup only scores names
+    sharing an informative n-gram with it (and long enough to reach the
+    threshold at all), most shared n-grams first. N-grams posted for more
+    than `max_postings` names are not informative and are skipped, so a
+    lookup reads a bounded number of postings however big the tree gets.
+    Candidates are scored with SequenceMatcher, cheap upper bounds first.
+    """
+
+    def __init__(self, names: Iterable[str] = (), n: int = 3, max_postings: int = 512, min_grams: int = 3):
+        self.n = n
+        self.max_postings = max_postings
+        self.min_grams = min_grams
+        self._names: Dict[str, str] = {}  # normalized -> name as first added
+        self._postings: Dict[str, List[str]] = {}
+        for name in names:
+            self.add(name)
+
+    def add(self, name: str):
+        normalized = normalize_name(name)
+        if not normalized or normalized in self._names:
+            return
+        self._names[normalized] = name
+        for gram in _grams(normalized, self.n):
+            self._postings.setdefault(gram, []).append(normalized)
+
+    def __contains__(self, name: str) -> bool:
+        return normalize_name(name) in self._names
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._names.values())
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def _candidates(self, normalized: str, min_ratio: float) -> List[str]:
+        postings = sorted(
+            (self._postings[gram] for gram in _grams(normalized, self.n) if gram in self._postings), key=len
+        )
+        informative = [posting for posting in postings if len(posting) <= self.max_postings]
+        if len(informative) < self.min_grams:
+            informative = postings[:self.min_grams]  # only common n-grams: fall back to the rarest of them
+
+        shared: Counter = Counter()
+        for posting in informative:
+            shared.update(posting)
+        length = len(normalized)
+        # ratio = 2 * matches / (len1 + len2) can't reach min_ratio when the lengths are too far apart
+        return [
+            candidate for candidate, _ in shared.most_common()
+            if 2 * min(length, len(candidate)) / (length + len(candidate)) >= min_ratio
+        ]
+
+    def find_duplicate(
+        self,
+        name: str,
+        threshold: float = 0.85,
+        substring_threshold: float = 0.70,
+    ) -> Optional[Tuple[str, str, float]]:
+        """
+        The existing name `name` duplicates, as (existing name, kind, similarity), or None.
+
+        kind is "exact" (same normalized name), "substring" (one contains the
+        other and similarity >= substring_threshold) or "fuzzy" (similarity >=
+        threshold).
+        """
+        normalized = normalize_name(name)
+        if normalized in self._names:
+            return self._names[normalized], "exact", 1.0
+
+        matcher = SequenceMatcher(None, "", normalized)  # the query side is analysed once
+        for candidate in self._candidates(normalized, min(threshold, substring_threshold)):
+            matcher.set_seq1(candidate)
+            overlaps = normalized in candidate or candidate in normalized
+            needed = min(threshold, substring_threshold) if overlaps else threshold
+            if matcher.real_quick_ratio() < needed or matcher.quick_ratio() < needed:
+                continue
+            similarity = matcher.ratio()
+            if overlaps and similarity >= substring_threshold:
+                return self._names[candidate], "substring", similarity
+            if similarity >= threshold:
+                return self._names[candidate], "fuzzy", similarity
+        return None
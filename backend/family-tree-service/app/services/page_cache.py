@@ -0,0 +1,244 @@
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.http_client import get_json
+
+WIKIPEDIA_API_URL = settings.WIKIPEDIA_API
+
+# Section headings in a TextExtracts plain-text extract with exsectionformat=wiki
+_HEADING = re.compile(r"^(={2,6})\s*(.+?)\s*\1\s*$", re.MULTILINE)
+
+
+class Section:
+    __slots__ = ("level", "title", "text")
+
+    def __init__(self, level: int, title: str, text: str):
+        self.level = level
+        self.title = title
+        self.text = text
+
+
+class Page:
+    """
+    One revision of a Wikipedia article: wikitext, plain text and its sections.
+
+    Sections are (level, title, start, end) offsets into the plain text, so
+    the text is held once.
+    """
+
+    __slots__ = ("title", "revid", "wikitext", "text", "outline")
+
+    def __init__(self, title: str, revid: int, wikitext: str, text: str, outline: Optional[List[tuple]] = None):
+        self.title = title
+        self.revid = revid
+        self.wikitext = wikitext
+        self.text = text
+        self.outline = outline if outline is not None else _outline(text)
+
+    @property
+    def summary(self) -> str:
+        """Lead text, before the first heading."""
+        heading = _HEADING.search(self.text)
+        return self.text[:heading.start() if heading else len(self.text)].strip()
+
+    @property
+    def sections(self) -> List[Section]:
+        """Every section in page order (subsections included, each with only its own text)."""
+        return [Section(level, title, self.text[start:end].strip()) for level, title, start, end in self.outline]
+
+
+def _outline(text: str) -> List[tuple]:
+    headings = list(_HEADING.finditer(text))
+    outline = []
+    for i, match in enumerate(headings):
+        end = headings[i + 1].start() if i + 1 < len(headings) else len(text)
+        outline.append((len(match.group(1)), match.group(2), match.end(), end))
+    return outline
+
+
+async def _page_info(title: str) -> Optional[Tuple[str, int]]:
+    """(normalized title, latest revision id) of an article, following redirects; None if it does not exist."""
+    params = {"action": "query", "titles": title, "prop": "info", "redirects": 1, "format": "json", "formatversion": 2}
+    data = await get_json(WIKIPEDIA_API_URL, params=params)
+    pages = data.get("query", {}).get("pages", [])
+    if not pages or pages[0].get("missing") or pages[0].get("invalid"):
+        return None
+    return pages[0]["title"], pages[0].get("lastrevid", 0)
+
+
+async def _download(title: str) -> Optional[Page]:
+    """Wikitext and plain-text extract of the current revision, in one request."""
+    params = {
+        "action": "query",
+        "titles": title,
+        "prop": "revisions|extracts",
+        "rvprop": "ids|content",
+        "rvslots": "main",
+        "explaintext": 1,
+        "exsectionformat": "wiki",
+        "redirects": 1,
+        "format": "json",
+        "formatversion": 2,
+    }
+    data = await get_json(WIKIPEDIA_API_URL, params=params)
+    pages = data.get("query", {}).get("pages", [])
+    if not pages or pages[0].get("missing") or not pages[0].get("revisions"):
+        return None
+    page = pages[0]
+    revision = page["revisions"][0]
+    wikitext = revision.get("slots", {}).get("main", {}).get("content", "")
+    return Page(page["title"], revision.get("revid", 0), wikitext, page.get("extract", ""))
+
+
+class PageCache:
+    """
+    Wikipedia article text by (title, revision): a memory LRU over an SQLite file.
+
+    get() checks the article's latest revision with a small info query (at
+    most every `revalidate_after` seconds per title) and downloads wikitext
+    and plain text only for revisions that are in neither tier.
+    """
+
+    def __init__(self, path: str, max_entries: int, revalidate_after: float, enabled: bool = True):
+        self.path = path
+        self.max_entries = max_entries
+        self.revalidate_after = revalidate_after
+        self.enabled = enabled  # the on-disk tier
+        self._pages: "OrderedDict[Tuple[str, int], Page]" = OrderedDict()
+        # requested title -> (title, revid, checked_at), an LRU as long as the page one
+        self._latest: "OrderedDict[str, Tuple[str, int, float]]" = OrderedDict()
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                " title TEXT NOT NULL,"
+                " revid INTEGER NOT NULL,"
+                " fetched_at REAL NOT NULL,"
+                " wikitext BLOB NOT NULL,"
+                " text BLOB NOT NULL,"
+                " outline TEXT NOT NULL,"
+                " PRIMARY KEY (title, revid))"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _load(self, title: str, revid: int) -> Optional[Page]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT wikitext, text, outline FROM pages WHERE title = ? AND revid = ?", (title, revid)
+            ).fetchone()
+        if row is None:
+            return None
+        wikitext, text, outline = row
+        return Page(
+            title, revid,
+            zlib.decompress(wikitext).decode("utf-8"),
+            zlib.decompress(text).decode("utf-8"),
+            [tuple(section) for section in json.loads(outline)],
+        )
+
+    def _store(self, page: Page):
+        if not self.enabled:
+            return
+        with self._lock:
+            conn = self._connect()
+            # Older revisions of the page are never asked for again
+            conn.execute("DELETE FROM pages WHERE title = ?", (page.title,))
+            conn.execute(
+                "INSERT INTO pages (title, revid, fetched_at, wikitext, text, outline) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    page.title, page.revid, time.time(),
+                    zlib.compress(page.wikitext.encode("utf-8")),
+                    zlib.compress(page.text.encode("utf-8")),
+                    json.dumps(page.outline),
+                ),
+            )
+            conn.commit()
+
+    def _remember(self, page: Page):
+        if self.max_entries <= 0:
+            return
+        self._pages[(page.title, page.revid)] = page
+        self._pages.move_to_end((page.title, page.revid))
+        while len(self._pages) > self.max_entries:
+            self._pages.popitem(last=False)
+
+    def _check(self, title: str, page: Page):
+        if self.max_entries <= 0:
+            return
+        self._latest[title] = (page.title, page.revid, time.time())
+        self._latest.move_to_end(title)
+        while len(self._latest) > self.max_entries:
+            self._latest.popitem(last=False)
+
+    async def cached(self, title: str, revid: int) -> Optional[Page]:
+        """A revision already in memory or on disk; never goes to Wikipedia."""
+        page = self._pages.get((title, revid))
+        if page is not None:
+            self._pages.move_to_end((title, revid))
+            return page
+        page = await asyncio.to_thread(self._load, title, revid)
+        if page is not None:
+            self._remember(page)
+        return page
+
+    async def get(self, title: str) -> Optional[Page]:
+        """The current revision of an article, or None if there is no such article."""
+        latest = self._latest.get(title)
+        if latest is not None and time.time() - latest[2] < self.revalidate_after:
+            page = await self.cached(latest[0], latest[1])
+            if page is not None:
+                metrics.record_cache("wikipedia_page", 1)
+                return page
+
+        info = await _page_info(title)
+        if info is None:
+            return None
+        page = await self.cached(*info)
+        metrics.record_cache("wikipedia_page", int(page is not None), int(page is None))
+        if page is None:
+            page = await _download(info[0])
+            if page is None:
+                return None
+            self._remember(page)
+            await asyncio.to_thread(self._store, page)
+        self._check(title, page)
+        return page
+
+    def clear(self):
+        self._pages.clear()
+        self._latest.clear()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+pages = PageCache(
+    settings.PAGE_CACHE_PATH,
+    settings.PAGE_CACHE_MAX_ENTRIES,
+    settings.PAGE_CACHE_REVALIDATE,
+    enabled=settings.PAGE_CACHE_ENABLED,
+)
@@ -407,15 +407,19 @@
 
 # code
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 import os
 from dotenv import load_dotenv
 import json
 from typing import List, Dict, Optional
-from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError
-import wikipediaapi
+from concurrent.futures import TimeoutError
 import asyncio
 from functools import wraps
 import time
+from app.core.config import settings
+from app.core.llm_executor import llm, LLMQueueTimeoutError
+from app.services.model_router import ModelRouter
+from app.services import page_cache
 
 # Configure Gemini
 load_dotenv()
@@ -434,6 +438,15 @@ FALLBACK_MODELS = [
     "models/gemini-2.5-flash-preview-09-2025"
 ]
 
+# Recent health of each model; decides the order they are tried in
+model_router = ModelRouter(
+    FALLBACK_MODELS,
+    failure_threshold=settings.MODEL_FAILURE_THRESHOLD,
+    open_seconds=settings.MODEL_OPEN_SECONDS,
+    max_open_seconds=settings.MODEL_OPEN_MAX_SECONDS,
+    probe_timeout=settings.MODEL_PROBE_TIMEOUT,
+)
+
 # Configuration
 MAX_TOTAL_TIME = 60  # Maximum 60 seconds for entire classification
 MAX_MODEL_TIMEOUT = 15  # Maximum 15 seconds per model attempt
@@ -464,43 +477,32 @@ def normalize_name(name: str) -> str:
         name = name.split('(')[0].strip()
     return ' '.join(name.split())
 
-def fetch_article(name: str) -> tuple:
-    """Fetch single Wikipedia article with timeout"""
+async def fetch_article(name: str) -> tuple:
+    """Fetch single Wikipedia article through the shared page cache"""
     try:
-        wiki = wikipediaapi.Wikipedia(language='en', user_agent='GenealogyTree/1.0')
-        page = wiki.page(name)
-        if page.exists():
+        page = await page_cache.pages.get(name)
+        if page is not None:
             return (name, page.text[:8000])
     except Exception as e:
         print(f"Error fetching article for {name}: {e}")
     return (name, None)
 
-def fetch_articles_parallel(people_list: List[str], max_time: int = MAX_WIKIPEDIA_TIME) -> Dict[str, str]:
-    """Fetch Wikipedia articles in parallel with timeout"""
+async def fetch_articles_parallel(people_list: List[str], max_time: int = MAX_WIKIPEDIA_TIME) -> Dict[str, str]:
+    """Fetch Wikipedia articles concurrently; whatever has arrived after max_time is used"""
     articles = {}
-    start_time = time.time()
-    
-    try:
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            futures = {executor.submit(fetch_article, person): person for person in people_list}
-            
-            for future in as_completed(futures, timeout=max_time):
-                # Check if we've exceeded time limit
-                if time.time() - start_time > max_time:
-                    print(f"Wikipedia fetching exceeded {max_time}s, stopping...")
-                    break
-                    
-                try:
-                    name, text = future.result(timeout=5)  # 5s per article
-                    if text:
-                        articles[name] = text
-                except Exception as e:
-                    print(f"Error processing article: {e}")
-                    continue
-    except TimeoutError:
-        print(f"Wikipedia fetching timed out after {max_time}s")
-    except Exception as e:
-        print(f"Error in parallel fetch: {e}")
+    tasks = [asyncio.create_task(fetch_article(person)) for person in people_list]
+    if not tasks:
+        return articles
+
+    done, pending = await asyncio.wait(tasks, timeout=max_time)
+    if pending:
+        print(f"Wikipedia fetching exceeded {max_time}s, using {len(done)} of {len(tasks)} articles")
+        for task in pending:
+            task.cancel()
+    for task in done:
+        name, text = task.result()
+        if text:
+            articles[name] = text
     
     return articles
 
@@ -537,16 +539,23 @@ def build_compact_context(relationships: List[Dict], all_articles: Dict[str, str
     
     return "\n".join(contexts)
 
-def generate_with_fallback(prompt: str, max_time: int = MAX_MODEL_TIMEOUT) -> str:
-    """Try to generate content with model fallback and timeout"""
+def is_fatal_model_error(error: Exception) -> bool:
+    """Errors that won't go away on the next request: the model doesn't exist for this API (404)"""
+    return isinstance(error, google_exceptions.NotFound) or str(error).startswith("404 ")
+
+async def generate_with_fallback(prompt: str, max_time: int = MAX_MODEL_TIMEOUT) -> str:
+    """Try to generate content with model fallback, healthiest model first; all attempts together get max_time"""
     last_error = None
     start_time = time.time()
     
-    for model_name in FALLBACK_MODELS:
+    for model_name in model_router.order():
         # Check if we've exceeded total time
-        if time.time() - start_time > max_time:
+        remaining = max_time - (time.time() - start_time)
+        if remaining <= 0:
             print(f"Model attempts exceeded {max_time}s timeout")
             break
+        if model_router.is_probe(model_name):
+            remaining = min(remaining, model_router.probe_timeout)
             
         try:
             print(f"Attempting to use model: {model_name}")
@@ -559,24 +568,39 @@ def generate_with_fallback(prompt: str, max_time: int = MAX_MODEL_TIMEOUT) -> st
                 )
             )
             
-            response = model.generate_content(prompt)
+            call_started = time.monotonic()
+            response = await llm.run(
+                "gemini", model.generate_content, prompt,
+                timeout=remaining, size=lambda r: len(r.text or ""),
+            )
             
             # Check if response has text
             if not response.text or len(response.text.strip()) == 0:
                 print(f"Model {model_name} returned empty response, trying next model")
+                model_router.record_failure(model_name)
                 continue
                 
+            model_router.record_success(model_name, time.monotonic() - call_started)
             print(f"Successfully used model: {model_name}")
             return response.text.strip()
             
+        except LLMQueueTimeoutError as e:
+            # Every slot was busy: the model was never called, so it keeps its health.
+            # The executor is shared by all models, so the next one would queue just the same.
+            print(f"Model {model_name} not tried: {e}")
+            last_error = e
+            break
         except Exception as e:
             error_msg = str(e)
             print(f"Model {model_name} failed: {error_msg[:200]}")
             last_error = e
+            fatal = is_fatal_model_error(e)
+            # Rate limits count as ordinary failures: a burst of 429s shouldn't take every model out at once
+            model_router.record_failure(model_name, fatal=fatal)
             
-            # Skip waiting for quota errors
-            if "429" not in error_msg and "quota" not in error_msg.lower():
-                time.sleep(1)  # Brief pause between attempts
+            # Skip waiting for quota errors and unknown models
+            if not fatal and "429" not in error_msg and "quota" not in error_msg.lower():
+                await asyncio.sleep(1)  # Brief pause between attempts
             continue
     
     # If all models fail, raise the last error
@@ -614,7 +638,7 @@ async def classify_relationships(relationships: List[Dict]) -> List[Dict]:
         print(f"Fetching Wikipedia articles for {len(all_people)} people...")
         
         # Fetch Wikipedia articles with timeout
-        all_articles = fetch_articles_parallel(list(all_people))
+        all_articles = await fetch_articles_parallel(list(all_people))
         
         print(f"Fetched {len(all_articles)} articles")
         
@@ -653,7 +677,7 @@ Respond with JSON array ONLY (no other text):
 
         try:
             print("Calling Gemini API with fallback...")
-            result_text = generate_with_fallback(prompt)
+            result_text = await generate_with_fallback(prompt)
             
             print(f"Gemini response: {result_text[:200]}...")
             
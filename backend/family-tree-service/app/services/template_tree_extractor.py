@@ -178,55 +178,137 @@
 # if __name__ == "__main__":
 #     build_tree_from_template("Charles III")
 
-import requests
 import re
 import json
 import asyncio
-from typing import List, Optional
+from collections import OrderedDict
+from typing import List, Optional, Set, Tuple
+from app.core import metrics
+from app.core.config import settings
+from app.core.http_client import get_json, UpstreamError
 from app.core.websocket_manager import WebSocketManager
+from app.services import page_cache
 
-WIKIPEDIA_API_URL = "https://en.wikipedia.org/w/api.php"
+WIKIPEDIA_API_URL = settings.WIKIPEDIA_API
 
-def get_family_tree_template(page_title: str) -> Optional[str]:
-    """Fetch wikitext and extract the first ahnentafel template."""
+AHNENTAFEL_TEMPLATES = ("Template:Ahnentafel", "Template:Ahnentafel top")
+# Any of these transcluded means the page draws a family tree
+TREE_TEMPLATES = AHNENTAFEL_TEMPLATES + ("Template:Family tree", "Template:Tree chart", "Template:Chart top")
+
+# Headings of the sections an ahnentafel usually sits in, most specific first
+TREE_SECTION_KEYWORDS = ("ancestry", "ancestors", "family tree", "genealogy", "family")
+
+AHNENTAFEL_PATTERN = re.compile(r"\{\{ahnentafel[\s\S]+?\n\}\}", re.IGNORECASE)
+
+# (title, revision) -> first ahnentafel template ("" if the page has none)
+_templates_by_revision: "OrderedDict[Tuple[str, int], str]" = OrderedDict()
+
+
+async def find_tree_templates(page_title: str) -> Optional[Tuple[str, int, Set[str]]]:
+    """
+    Which family-tree templates a page transcludes, without downloading its text.
+
+    Returns (normalized title, latest revision id, template titles), or None
+    if the page does not exist.
+    """
     params = {
-        "action": "parse",
-        "page": page_title,
-        "prop": "wikitext",
+        "action": "query",
+        "titles": page_title,
+        "prop": "info|templates",
+        "tltemplates": "|".join(TREE_TEMPLATES),
+        "tllimit": "max",
+        "redirects": 1,
         "format": "json",
+        "formatversion": 2,
     }
-    
-    headers = {
-        "User-Agent": "MyWikipediaTool/1.0 (https://example.com/contact)"
-    }
-    
+    data = await get_json(WIKIPEDIA_API_URL, params=params)
+    pages = data.get("query", {}).get("pages", [])
+    if not pages or pages[0].get("missing") or pages[0].get("invalid"):
+        return None
+    page = pages[0]
+    templates = {template["title"] for template in page.get("templates", [])}
+    return page["title"], page.get("lastrevid", 0), templates
+
+
+async def _parse(revision: int, prop: str, section: Optional[int] = None) -> dict:
+    params = {"action": "parse", "oldid": revision, "prop": prop, "format": "json", "formatversion": 2}
+    if section is not None:
+        params["section"] = section
+    data = await get_json(WIKIPEDIA_API_URL, params=params)
+    if "error" in data:
+        raise UpstreamError(f"Wikipedia API error: {data['error']}")
+    return data.get("parse", {})
+
+
+def _tree_sections(sections: List[dict]) -> List[int]:
+    """Indexes of the sections worth searching for an ahnentafel, most likely first."""
+    ranked = []
+    for section in sections:
+        heading = clean_name(section.get("line", "")).lower()
+        for rank, keyword in enumerate(TREE_SECTION_KEYWORDS):
+            if keyword in heading and str(section.get("index", "")).isdigit():
+                ranked.append((rank, int(section["index"])))
+                break
+    return [index for _, index in sorted(ranked)]
+
+
+async def _fetch_ahnentafel(revision: int) -> str:
+    """
+    The first ahnentafel in a revision, reading only the sections it is likely in before the whole page.
+
+    A tree section that transcludes the ahnentafel only through another
+    template has no literal one to read, and neither has the rest of the
+    page's text, so that ends the search without downloading the page.
+    """
+    sections = (await _parse(revision, "sections")).get("sections", [])
+    for index in _tree_sections(sections):
+        parsed = await _parse(revision, "wikitext|templates", index)
+        match = AHNENTAFEL_PATTERN.search(parsed.get("wikitext", ""))
+        if match:
+            return match.group(0)
+        if any(template.get("title") in AHNENTAFEL_TEMPLATES for template in parsed.get("templates", [])):
+            return ""
+    match = AHNENTAFEL_PATTERN.search((await _parse(revision, "wikitext")).get("wikitext", ""))
+    return match.group(0) if match else ""
+
+
+async def get_family_tree_template(page_title: str) -> Optional[str]:
+    """
+    Extract the first ahnentafel template of a page.
+
+    Template detection costs one small query. Only pages that transclude an
+    ahnentafel have text read, from the shared page cache or else section by
+    section, and the result is cached per revision, so an unchanged page is
+    never downloaded again.
+    """
     try:
-        response = requests.get(WIKIPEDIA_API_URL, params=params, headers=headers)
-        if response.status_code != 200:
-            print(f"Failed to fetch wikitext: {response.status_code}")
-            print(f"Response text: {response.text}")
-            return None
-
-        try:
-            data = response.json()
-        except ValueError as e:
-            print(f"Failed to parse JSON response: {e}")
-            print(f"Response text: {response.text}")
-            return None
-
-        if "error" in data:
-            print(f"Wikipedia API error: {data['error']}")
-            return None
-
-        if "parse" not in data or "wikitext" not in data["parse"]:
+        found = await find_tree_templates(page_title)
+        if found is None:
             print(f"No parse data found for page: {page_title}")
             return None
+        title, revision, templates = found
+        if not templates.intersection(AHNENTAFEL_TEMPLATES):
+            return None
 
-        wikitext = data["parse"]["wikitext"]["*"]
-        matches = re.findall(r"\{\{ahnentafel[\s\S]+?\n\}\}", wikitext, re.IGNORECASE)
-        return matches[0] if matches else None
-        
-    except requests.RequestException as e:
+        key = (title, revision)
+        template = _templates_by_revision.get(key)
+        metrics.record_cache("wikipedia_template", int(template is not None), int(template is None))
+        if template is None:
+            # Text another consumer already loaded for this revision saves the fetch
+            page = await page_cache.pages.cached(title, revision)
+            if page is not None:
+                match = AHNENTAFEL_PATTERN.search(page.wikitext)
+                template = match.group(0) if match else ""
+            else:
+                template = await _fetch_ahnentafel(revision)
+            _templates_by_revision[key] = template
+            while len(_templates_by_revision) > settings.TEMPLATE_CACHE_SIZE:
+                _templates_by_revision.popitem(last=False)
+        else:
+            _templates_by_revision.move_to_end(key)
+        return template or None
+
+    except UpstreamError as e:
         print(f"Request failed: {e}")
         return None
     except Exception as e:
@@ -267,36 +349,26 @@ async def extract_ahnentafel_relationships_streaming(template_text: str, websock
                     relationship = [child_name, "child of", parent_name]
                     relationships.append(relationship)
                     
-                    # Send relationship immediately via WebSocket
+                    # Queue the relationship on the ordered WebSocket channel
                     if websocket_manager:
-                        await websocket_manager.send_message(json.dumps({
-                            "type": "relationship",
-                            "data": {
-                                "entity1": child_name,
-                                "relationship": "child of",
-                                "entity2": parent_name
-                            }
-                        }))
-                        # Small delay to ensure ordered delivery
-                        await asyncio.sleep(0.1)
+                        await websocket_manager.send_event("relationship", {
+                            "entity1": child_name,
+                            "relationship": "child of",
+                            "entity2": parent_name
+                        })
 
                 if str(mother_num) in entries:
                     parent_name = entries[str(mother_num)]
                     relationship = [child_name, "child of", parent_name]
                     relationships.append(relationship)
                     
-                    # Send relationship immediately via WebSocket
+                    # Queue the relationship on the ordered WebSocket channel
                     if websocket_manager:
-                        await websocket_manager.send_message(json.dumps({
-                            "type": "relationship",
-                            "data": {
-                                "entity1": child_name,
-                                "relationship": "child of",
-                                "entity2": parent_name
-                            }
-                        }))
-                        # Small delay to ensure ordered delivery
-                        await asyncio.sleep(0.1)
+                        await websocket_manager.send_event("relationship", {
+                            "entity1": child_name,
+                            "relationship": "child of",
+                            "entity2": parent_name
+                        })
 
             except (ValueError, KeyError) as e:
                 print(f"Error processing entry {num_str}: {e}")
@@ -321,18 +393,13 @@ async def extract_spouse_relationships_streaming(template_text: str, websocket_m
                 relationship = [main_person, "spouse of", spouse_name]
                 relationships.append(relationship)
                 
-                # Send relationship immediately via WebSocket
+                # Queue the relationship on the ordered WebSocket channel
                 if websocket_manager:
-                    await websocket_manager.send_message(json.dumps({
-                        "type": "relationship",
-                        "data": {
-                            "entity1": main_person,
-                            "relationship": "spouse of",
-                            "entity2": spouse_name
-                        }
-                    }))
-                    # Small delay to ensure ordered delivery
-                    await asyncio.sleep(0.1)
+                    await websocket_manager.send_event("relationship", {
+                        "entity1": main_person,
+                        "relationship": "spouse of",
+                        "entity2": spouse_name
+                    })
                     
         return relationships
     except Exception as e:
@@ -349,7 +416,7 @@ async def extract_relationships_from_page_streaming(title: str, websocket_manage
                 "data": {"message": "Searching for family tree templates...", "progress": 10}
             }))
 
-        raw_template = get_family_tree_template(title)
+        raw_template = await get_family_tree_template(title)
         if not raw_template:
             if websocket_manager:
                 await websocket_manager.send_message(json.dumps({
@@ -443,10 +510,10 @@ def extract_spouse_relationships(template_text: str) -> List[List[str]]:
         print(f"Error extracting spouse relationships: {e}")
         return []
 
-def extract_relationships_from_page(title: str) -> List[List[str]]:
+async def extract_relationships_from_page(title: str) -> List[List[str]]:
     """Main API function: given a title, return genealogical relationships."""
     try:
-        raw_template = get_family_tree_template(title)
+        raw_template = await get_family_tree_template(title)
         if not raw_template:
             print(f"No family tree template found for: {title}")
             return []
@@ -462,39 +529,14 @@ def extract_relationships_from_page(title: str) -> List[List[str]]:
         print(f"Error extracting relationships from page {title}: {e}")
         return []
 
-def check_wikipedia_tree(page_title: str) -> bool:
+async def check_wikipedia_tree(page_title: str) -> bool:
     """Check if Wikipedia page contains family tree templates."""
     try:
-        params = {
-            "action": "parse",
-            "page": page_title,
-            "prop": "wikitext",
-            "format": "json",
-        }
-        
-        headers = {
-            "User-Agent": "MyWikipediaTool/1.0 (https://example.com/contact)"
-        }
-        
-        response = requests.get(WIKIPEDIA_API_URL, params=params, headers=headers)
-        if response.status_code != 200:
-            return False
-            
-        try:
-            data = response.json()
-        except ValueError:
-            return False
-            
-        if "error" in data:
-            return False
-            
-        if "parse" in data and "wikitext" in data["parse"]:
-            text = data["parse"]["wikitext"]["*"]
-            needles = ["{{Family tree", "{{Tree chart", "{{Ahnentafel", "{{Chart top"]
-            return any(n.lower() in text.lower() for n in needles)
+        found = await find_tree_templates(page_title)
+        return found is not None and bool(found[2])
     except Exception as e:
         print(f"Error checking Wikipedia tree for {page_title}: {e}")
-        
+
     return False
 
 # Debug function
@@ -0,0 +1,128 @@
+import asyncio
+import contextvars
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from app.core import metrics, rate_limiter
+from app.core.websocket_manager import WebSocketManager
+
+
+class SharedTraversal:
+    """
+    One in-flight traversal and everybody watching it.
+
+    It stands in for a WebSocketManager on the producer side: every frame the
+    producer sends is recorded, and each subscriber replays the recording
+    from the start, then follows the live tail at its own pace. The producer
+    is cancelled as soon as the last subscriber leaves.
+
+    The producer runs under its own upstream session and request metrics, not
+    the first subscriber's; each subscriber that sees it finish has the
+    producer's upstream totals added to its own request.
+    """
+
+    def __init__(self, key: Hashable):
+        self.key = key
+        self.events: List[Tuple[str, Any]] = []  # ("event", (type, data)) or ("message", text)
+        self.subscribers = 0
+        self.done = False
+        self.task: Optional[asyncio.Task] = None
+        self.session = f"shared:{key}"
+        self.request = metrics.RequestMetrics("shared_traversal")
+        self._new_event = asyncio.Event()
+
+    def _record(self, kind: str, payload: Any):
+        self.events.append((kind, payload))
+        self._wake()
+
+    def _wake(self):
+        # Swap the event so followers that wake up wait on a fresh one
+        woken, self._new_event = self._new_event, asyncio.Event()
+        woken.set()
+
+    # WebSocketManager interface used by the producer
+    async def send_message(self, message: str):
+        self._record("message", message)
+
+    async def send_event(self, event_type: str, data: dict):
+        self._record("event", (event_type, data))
+
+    async def send_status(self, status: str, progress: int = 0):
+        await self.send_event("status", {"message": status, "progress": progress})
+
+    async def flush(self):
+        pass
+
+    def check_cancelled(self):
+        if self.subscribers == 0:
+            raise asyncio.CancelledError("No subscribers left")
+
+    def finish(self):
+        self.done = True
+        self._wake()
+
+    async def follow(self, manager: WebSocketManager):
+        """Replay everything recorded so far to `manager`, then stream the rest as it arrives."""
+        position = 0
+        while True:
+            waiter = self._new_event
+            while position < len(self.events):
+                kind, payload = self.events[position]
+                position += 1
+                if kind == "event":
+                    await manager.send_event(*payload)
+                else:
+                    await manager.send_message(payload)
+            if self.done:
+                return
+            manager.check_cancelled()
+            await waiter.wait()
+
+
+_in_flight: Dict[Hashable, SharedTraversal] = {}
+
+
+async def run_shared(
+    key: Hashable,
+    produce: Callable[[SharedTraversal], Awaitable[Any]],
+    manager: WebSocketManager,
+) -> Any:
+    """
+    Run `produce(channel)` once per key, no matter how many clients ask at the same time.
+
+    The first caller starts the producer; callers that arrive while it runs
+    subscribe to it instead of starting their own. Everyone gets the full
+    frame stream on their own manager and the producer's return value.
+    """
+    shared = _in_flight.get(key)
+    if shared is None or shared.done or shared.task.cancelling():
+        shared = SharedTraversal(key)
+        _in_flight[key] = shared
+
+        async def producer():
+            rate_limiter.current_session.set(shared.session)
+            metrics.current_request.set(shared.request)
+            try:
+                return await produce(shared)
+            finally:
+                shared.finish()
+                rate_limiter.forget_session(shared.session)
+                if _in_flight.get(key) is shared:
+                    del _in_flight[key]
+
+        # A fresh context, so the producer's upstream calls aren't queued or accounted as the first caller's
+        shared.task = asyncio.create_task(producer(), context=contextvars.Context())
+    else:
+        print(f"Joining in-flight traversal {key} ({shared.subscribers} already watching)")
+
+    shared.subscribers += 1
+    try:
+        await shared.follow(manager)
+        result = await asyncio.shield(shared.task)
+        request = metrics.current_request.get()
+        if request is not None:
+            request.merge(shared.request)
+        return result
+    finally:
+        shared.subscribers -= 1
+        if shared.subscribers == 0 and not shared.task.done():
+            shared.task.cancel()
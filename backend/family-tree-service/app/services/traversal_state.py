@@ -0,0 +1,129 @@
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.kinship_graph import KinshipGraph
+from app.services.tree_cache import CachedTree
+
+
+class TraversalBudget:
+    """Node and wall-clock limits for one stretch of a traversal; 0 means unlimited."""
+
+    __slots__ = ("max_nodes", "deadline", "expanded")
+
+    def __init__(self, max_nodes: int = 0, seconds: float = 0):
+        self.max_nodes = max_nodes
+        self.deadline = time.monotonic() + seconds if seconds > 0 else None
+        self.expanded = 0
+
+    @classmethod
+    def from_settings(cls) -> "TraversalBudget":
+        return cls(settings.TRAVERSAL_MAX_NODES, settings.TRAVERSAL_DEADLINE)
+
+    def remaining_nodes(self) -> Optional[int]:
+        if not self.max_nodes:
+            return None
+        return max(0, self.max_nodes - self.expanded)
+
+    def exhausted(self) -> Optional[str]:
+        """Why no more nodes may be expanded ("max_nodes" or "deadline"), or None."""
+        if self.max_nodes and self.expanded >= self.max_nodes:
+            return "max_nodes"
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return "deadline"
+        return None
+
+
+class TraversalState:
+    """
+    Everything a family traversal has done so far, so it can stop and carry on later.
+
+    The generation being expanded is `generation`; entries before `position`
+    are done, the rest still pending. `next_frontier` collects what the
+    expanded entries point at, `visited` holds packed frontier keys
+    (KinshipGraph.frontier_key) and `graph` everything found so far.
+    Nothing here is ever recomputed on resume.
+    """
+
+    __slots__ = (
+        "qid", "depth", "expand", "level", "generation", "position", "next_frontier",
+        "visited", "graph", "label_cache", "tree", "extending", "recorded", "pending_details",
+    )
+
+    def __init__(
+        self,
+        qid: str,
+        depth: int,
+        expand: Callable[[List[Tuple[str, str]]], Awaitable[tuple]],
+        label_cache: Any,
+        tree: Optional[CachedTree] = None,
+        extending: bool = False,
+    ):
+        self.qid = qid
+        self.depth = depth
+        self.expand = expand
+        self.level = 0
+        self.generation: Optional[List[Tuple[str, str]]] = None
+        self.position = 0
+        self.next_frontier: List[Tuple[str, str]] = [(qid, "up"), (qid, "down")]
+        self.visited: set = set()
+        self.graph = KinshipGraph()
+        self.graph.intern(qid)
+        self.label_cache = label_cache
+        self.tree = tree
+        self.extending = extending  # whether expanded generations are recorded into `tree`
+        self.recorded: Optional[List[tuple]] = None
+        self.pending_details: List[str] = []
+
+    def remaining(self) -> int:
+        """Frontier entries not expanded yet: the rest of this generation plus the next one."""
+        pending = len(self.generation) - self.position if self.generation is not None else 0
+        return pending + len(self.next_frontier)
+
+
+class TraversalResult(list):
+    """
+    Relationships found by one stretch of a traversal, and whether it stopped on its budget.
+
+    `paused` is the reason ("max_nodes" or "deadline") or None if the
+    traversal finished; `remaining` and `progress` describe a paused one.
+    """
+
+    def __init__(self, relationships=(), paused: Optional[str] = None, remaining: int = 0, progress: int = 100):
+        super().__init__(relationships)
+        self.paused = paused
+        self.remaining = remaining
+        self.progress = progress
+
+    def copy(self) -> "TraversalResult":
+        return TraversalResult(self, self.paused, self.remaining, self.progress)
+
+
+class PausedTraversals:
+    """Traversals stopped by their budget, by continuation token, bounded in count and age."""
+
+    def __init__(self, ttl: int, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._states: "OrderedDict[str, Tuple[TraversalState, float]]" = OrderedDict()
+
+    def put(self, state: TraversalState) -> str:
+        token = uuid.uuid4().hex
+        self._states[token] = (state, time.time())
+        while len(self._states) > self.max_entries:
+            self._states.popitem(last=False)
+        return token
+
+    def pop(self, token: str) -> Optional[TraversalState]:
+        entry = self._states.pop(token, None)
+        if entry is None or time.time() - entry[1] > self.ttl:
+            return None
+        return entry[0]
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+
+paused_traversals = PausedTraversals(settings.TRAVERSAL_CONTINUATION_TTL, settings.TRAVERSAL_CONTINUATION_MAX)
@@ -0,0 +1,202 @@
+import sys
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.kinship_graph import DIRECTION_CODES, DIRECTIONS, Relation
+
+# Which side of an edge was newly discovered (gets personal details streamed)
+NEW_NONE, NEW_ENTITY1, NEW_ENTITY2 = 0, 1, 2
+
+# personal_details fields, stored per person as a tuple in this order
+DETAIL_FIELDS = ("birth_year", "death_year", "image_url")
+
+
+class CachedSweep:
+    """
+    A finished traversal, generation by generation.
+
+    Edges are parallel int arrays over the tree's interned QIDs; level_ends[k]
+    is the number of edges emitted by the end of generation k, frontiers[k]
+    the (person, direction) pairs expanded in generation k, and next_frontier
+    the pairs the last recorded generation pointed at (where a deeper request
+    resumes).
+    """
+
+    __slots__ = ("src", "dst", "rel", "new", "level_ends", "frontiers", "next_frontier")
+
+    def __init__(self):
+        self.src = array("l")
+        self.dst = array("l")
+        self.rel = array("b")
+        self.new = array("b")
+        self.level_ends = array("l")
+        self.frontiers: List[array] = []
+        self.next_frontier = array("l")
+
+    @property
+    def levels(self) -> int:
+        return len(self.level_ends)
+
+    def copy(self) -> "CachedSweep":
+        clone = CachedSweep()
+        clone.src, clone.dst = array("l", self.src), array("l", self.dst)
+        clone.rel, clone.new = array("b", self.rel), array("b", self.new)
+        clone.level_ends = array("l", self.level_ends)
+        clone.frontiers = list(self.frontiers)  # recorded levels are never modified
+        clone.next_frontier = array("l", self.next_frontier)
+        return clone
+
+    def nbytes(self) -> int:
+        arrays = [self.src, self.dst, self.rel, self.new, self.level_ends, self.next_frontier, *self.frontiers]
+        return sum(a.itemsize * len(a) + 64 for a in arrays)
+
+
+class CachedTree:
+    """Traversal results for one root QID: interned people, their labels and details, and the sweep."""
+
+    __slots__ = ("root", "qids", "index", "labels", "details", "sweep", "created_at")
+
+    def __init__(self, root: str):
+        self.root = root
+        self.qids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.labels: Dict[int, str] = {}
+        self.details: Dict[int, tuple] = {}
+        self.sweep = CachedSweep()
+        self.created_at = time.time()
+        self.intern(root)
+
+    def intern(self, qid: str) -> int:
+        position = self.index.get(qid)
+        if position is None:
+            position = len(self.qids)
+            self.qids.append(qid)
+            self.index[qid] = position
+        return position
+
+    def copy(self) -> "CachedTree":
+        """Copy to extend without disturbing readers of this one."""
+        clone = CachedTree.__new__(CachedTree)
+        clone.root = self.root
+        clone.qids = list(self.qids)
+        clone.index = dict(self.index)
+        clone.labels = dict(self.labels)
+        clone.details = dict(self.details)
+        clone.sweep = self.sweep.copy()
+        clone.created_at = self.created_at
+        return clone
+
+    def needs_extension(self, depth: int) -> bool:
+        """Whether `depth` goes past what is recorded while the tree can still grow."""
+        sweep = self.sweep
+        return depth > sweep.levels and (sweep.levels == 0 or len(sweep.next_frontier) > 0)
+
+    def _encode(self, frontier: List[Tuple[str, str]]) -> array:
+        return array("l", (self.intern(q) << 1 | DIRECTION_CODES[d] for q, d in frontier))
+
+    def _decode(self, frontier: array) -> List[Tuple[str, str]]:
+        return [(self.qids[code >> 1], DIRECTIONS[code & 1]) for code in frontier]
+
+    # Recording
+    def record_level(self, frontier: List[Tuple[str, str]], edges: List[tuple], next_frontier: List[Tuple[str, str]]):
+        """Append one expanded generation: (entity1, relation, entity2, new_qid) edges in emit order."""
+        sweep = self.sweep
+        for entity1, relation, entity2, new_qid in edges:
+            sweep.src.append(self.intern(entity1))
+            sweep.dst.append(self.intern(entity2))
+            sweep.rel.append(relation)
+            sweep.new.append(NEW_ENTITY1 if new_qid == entity1 else NEW_ENTITY2 if new_qid == entity2 else NEW_NONE)
+        sweep.level_ends.append(len(sweep.src))
+        sweep.frontiers.append(self._encode(frontier))
+        sweep.next_frontier = self._encode(next_frontier)
+
+    def set_label(self, qid: str, label: str):
+        if label and label != qid:
+            self.labels[self.intern(qid)] = label
+
+    def set_details(self, qid: str, entry: dict):
+        self.details[self.intern(qid)] = tuple(entry.get(field) for field in DETAIL_FIELDS)
+
+    # Reading
+    def frontier(self, level: int) -> List[Tuple[str, str]]:
+        return self._decode(self.sweep.frontiers[level])
+
+    def next_frontier(self) -> List[Tuple[str, str]]:
+        return self._decode(self.sweep.next_frontier)
+
+    def edges(self, level: int) -> Iterator[Tuple[str, Relation, str, Optional[str]]]:
+        sweep = self.sweep
+        start = sweep.level_ends[level - 1] if level else 0
+        for i in range(start, sweep.level_ends[level]):
+            entity1, entity2 = self.qids[sweep.src[i]], self.qids[sweep.dst[i]]
+            new = sweep.new[i]
+            new_qid = entity1 if new == NEW_ENTITY1 else entity2 if new == NEW_ENTITY2 else None
+            yield entity1, Relation(sweep.rel[i]), entity2, new_qid
+
+    def label_map(self) -> Dict[str, str]:
+        return {self.qids[i]: label for i, label in self.labels.items()}
+
+    def get_details(self, qid: str) -> Optional[dict]:
+        position = self.index.get(qid)
+        if position is None or position not in self.details:
+            return None
+        return dict(zip(DETAIL_FIELDS, self.details[position]))
+
+    def nbytes(self) -> int:
+        """Approximate memory footprint, used for eviction."""
+        strings = sum(sys.getsizeof(q) for q in self.qids) + sum(sys.getsizeof(l) for l in self.labels.values())
+        details = sum(sum(sys.getsizeof(v) for v in entry if v) + 64 for entry in self.details.values())
+        containers = sys.getsizeof(self.qids) + sys.getsizeof(self.index) + sys.getsizeof(self.labels) + sys.getsizeof(self.details)
+        return strings + details + containers + self.sweep.nbytes()
+
+
+class TreeCache:
+    """LRU of CachedTree by root QID, bounded by total memory footprint and age."""
+
+    def __init__(self, max_bytes: int, ttl: int):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._trees: "OrderedDict[str, Tuple[CachedTree, int]]" = OrderedDict()
+        self.total_bytes = 0
+
+    def get(self, root: str) -> Optional[CachedTree]:
+        entry = self._trees.get(root)
+        if entry is None:
+            return None
+        tree, _ = entry
+        if time.time() - tree.created_at > self.ttl:
+            self._remove(root)
+            return None
+        self._trees.move_to_end(root)
+        return tree
+
+    def put(self, tree: CachedTree):
+        if self.max_bytes <= 0:
+            return
+        self._remove(tree.root)
+        size = tree.nbytes()
+        if size > self.max_bytes:
+            return
+        self._trees[tree.root] = (tree, size)
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            oldest = next(iter(self._trees))
+            self._remove(oldest)
+
+    def _remove(self, root: str):
+        entry = self._trees.pop(root, None)
+        if entry is not None:
+            self.total_bytes -= entry[1]
+
+    def clear(self):
+        self._trees.clear()
+        self.total_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._trees)
+
+
+tree_cache = TreeCache(settings.TREE_CACHE_MAX_BYTES, settings.TREE_CACHE_TTL)
@@ -3007,18 +3007,28 @@
 #         pass
 #     return False
 
-from typing import List, Dict, Optional
-import requests
+from typing import Awaitable, Callable, List, Dict, Optional, Tuple
 import asyncio
-import aiohttp
 import json
+from urllib.parse import quote
+from app.core.config import settings
+from app.core import metrics
+from app.core.http_client import get_json
+from app.services.entity_cache import EntityRecord, entity_cache
+from app.services import template_tree_extractor
+from app.services.kinship_index import get_kinship_index
 from app.core.websocket_manager import WebSocketManager
 from app.services.llm_relationship_extractor import LLMRelationshipExtractor
+from app.services.traversal_sharing import run_shared
+from app.services.kinship_graph import KinshipGraph, Relation
+from app.services.name_index import NameIndex
+from app.services.traversal_state import TraversalBudget, TraversalResult, TraversalState, paused_traversals
+from app.services.tree_cache import CachedTree, tree_cache
 
 
-WIKIPEDIA_API = "https://en.wikipedia.org/w/api.php"
-WIKIDATA_API = "https://www.wikidata.org/wiki/Special:EntityData/{}.json"
-SPARQL_API='https://query.wikidata.org/sparql'
+WIKIPEDIA_API = settings.WIKIPEDIA_API
+WIKIDATA_API = settings.WIKIDATA_QUERY_API
+SPARQL_API = settings.SPARQL_API
 
 # Add a new parameter to control LLM usage
 async def fetch_relationships_by_qid(
@@ -3037,7 +3047,27 @@ async def fetch_relationships_by_qid(
         websocket_manager: WebSocket for real-time updates
         entity_name: Display name for the entity
         use_llm_enrichment: If True, supplement Wikidata with LLM extraction
+
+    Streaming requests for the same (qid, depth, entity_name, use_llm_enrichment)
+    that overlap in time share one traversal: later clients replay the frames
+    sent so far and then follow along.
     """
+    if websocket_manager is None:
+        return await _fetch_relationships_by_qid(qid, depth, None, entity_name, use_llm_enrichment)
+
+    async def produce(channel):
+        return await _fetch_relationships_by_qid(qid, depth, channel, entity_name, use_llm_enrichment)
+
+    relationships = await run_shared((qid, depth, entity_name, use_llm_enrichment), produce, websocket_manager)
+    return relationships.copy()  # each subscriber gets its own list (a TraversalResult keeps its pause state)
+
+async def _fetch_relationships_by_qid(
+    qid: str,
+    depth: int,
+    websocket_manager: Optional[WebSocketManager] = None,
+    entity_name: Optional[str] = None,
+    use_llm_enrichment: bool = False
+) -> List[Dict[str, str]]:
     try:
         # Validate QID format
         if not qid or not qid.startswith('Q') or not qid[1:].isdigit():
@@ -3067,34 +3097,45 @@ async def fetch_relationships_by_qid(
             }))
         
         # Phase 1: ALWAYS get Wikidata relationships
-        wikidata_relationships = await collect_bidirectional_relationships(qid, depth, websocket_manager)
+        wikidata_relationships = await collect_family_relationships(qid, depth, websocket_manager)
+        paused = getattr(wikidata_relationships, "paused", None)
+
+        async def send_finished(message: str):
+            # A traversal stopped on its budget already said so; don't follow it with "Complete!"
+            if paused:
+                message = f"Partial tree: {len(wikidata_relationships)} relationships so far, {wikidata_relationships.remaining} people left to expand"
+            await websocket_manager.send_message(json.dumps({
+                "type": "status",
+                "data": {"message": message, "progress": wikidata_relationships.progress if paused else 100}
+            }))
         
         # Phase 2: ONLY use LLM if explicitly requested (expand node case)
         if use_llm_enrichment:
             if websocket_manager:
+                websocket_manager.check_cancelled()
                 await websocket_manager.send_message(json.dumps({
                     "type": "status",
                     "data": {
-                        "message": f"Wikidata complete ({len(wikidata_relationships)} relationships). Now enriching with AI analysis of Wikipedia text...",
+                        "message": f"Wikidata {'paused' if paused else 'complete'} ({len(wikidata_relationships)} relationships). Now enriching with AI analysis of Wikipedia text...",
                         "progress": 50
                     }
                 }))
             
             # Get Wikipedia page title from entity name
             # Get Wikipedia page title from entity name
-            page_title = entity_name or get_label_from_qid(qid)
+            page_title = entity_name or await get_label_from_qid(qid)
 
             if page_title:
                 try:
                     # CRITICAL: Collect all existing entity names from Wikidata relationships
-                    existing_entities = set()
+                    existing_entities = NameIndex()
                     for rel in wikidata_relationships:
                         existing_entities.add(rel['entity1'])
                         existing_entities.add(rel['entity2'])
         
                     print(f"📋 Passing {len(existing_entities)} existing entities to LLM for deduplication")
         
-                    extractor = LLMRelationshipExtractor()
+                    extractor = LLMRelationshipExtractor(websocket_manager)
                     llm_rels = await extractor.extract_relationships_for_person(
                         page_title, 
                         qid,
@@ -3157,13 +3198,10 @@ async def fetch_relationships_by_qid(
         
                             # Send LLM-extracted relationships via websocket
                             if websocket_manager:
-                                await websocket_manager.send_message(json.dumps({
-                                    "type": "relationship",
-                                        "data": {
-                                        **llm_rel,
-                                        "source": "llm"
-                                    }
-                                }))
+                                await websocket_manager.send_event("relationship", {
+                                    **llm_rel,
+                                    "source": "llm"
+                                })
             
                                 # Send personal details for NEW entities only (not for existing children)
                                 for entity in [llm_rel['entity1'], llm_rel['entity2']]:
@@ -3172,48 +3210,28 @@ async def fetch_relationships_by_qid(
                                         entity_is_new = entity not in existing_entities
                     
                                         if entity_is_new:
-                                            await websocket_manager.send_message(json.dumps({
-                                                "type": "personal_details",
-                                                    "data": {
-                                                    "entity": entity,
-                                                    "qid": "temp",
-                                                    "birth_year": None,
-                                                    "death_year": None,
-                                                    "image_url": None
-                                                }
-                                            }))
+                                            await websocket_manager.send_event("personal_details", {
+                                                "entity": entity,
+                                                "qid": "temp",
+                                                "birth_year": None,
+                                                "death_year": None,
+                                                "image_url": None
+                                            })
+                                            existing_entities.add(entity)
                     
                     if websocket_manager:
-                        await websocket_manager.send_message(json.dumps({
-                            "type": "status",
-                            "data": {
-                                "message": f"✓ Complete! {len(wikidata_relationships)} total relationships ({new_llm_count} enriched from Wikipedia text)",
-                                "progress": 100
-                            }
-                        }))
+                        await send_finished(f"✓ Complete! {len(wikidata_relationships)} total relationships ({new_llm_count} enriched from Wikipedia text)")
                     
                     print(f"LLM enrichment added {new_llm_count} new relationships")
                     
                 except Exception as llm_error:
                     print(f"LLM enrichment failed: {llm_error}")
                     if websocket_manager:
-                        await websocket_manager.send_message(json.dumps({
-                            "type": "status",
-                            "data": {
-                                "message": f"Complete! Found {len(wikidata_relationships)} relationships (LLM enrichment unavailable)",
-                                "progress": 100
-                            }
-                        }))
+                        await send_finished(f"Complete! Found {len(wikidata_relationships)} relationships (LLM enrichment unavailable)")
         else:
             # Wikidata-only mode (initial tree)
             if websocket_manager:
-                await websocket_manager.send_message(json.dumps({
-                    "type": "status",
-                    "data": {
-                        "message": f"Complete! Found {len(wikidata_relationships)} relationships from Wikidata",
-                        "progress": 100
-                    }
-                }))
+                await send_finished(f"Complete! Found {len(wikidata_relationships)} relationships from Wikidata")
         
         return wikidata_relationships
         
@@ -3232,54 +3250,82 @@ async def fetch_relationships_by_qid(
         
         return []
 
-def get_label_from_qid(qid: str) -> Optional[str]:
+async def get_label_from_qid(qid: str) -> Optional[str]:
     """Get the English label for a QID."""
-    labels = get_labels({qid})
+    labels = await get_labels({qid})
     return labels.get(qid)
 
 async def getPersonalDetails(page_title:str):
-    qid = get_qid(page_title)
+    qid = await get_qid(page_title)
     if not qid:
         return None
     return await getPersonalDetailsByQid(qid)
 
 async def getPersonalDetailsByQid(qid: str):
     """Get personal details directly using Wikidata QID."""
+    details = (await getPersonalDetailsByQids([qid])).get(qid)
+    if not details or not any(details.values()):
+        return None
+    return details
+
+# QIDs per VALUES block; keeps the GET URL well under server limits
+PERSONAL_DETAILS_BATCH_SIZE = 100
+
+async def _personal_details_chunk(qids: List[str]) -> Dict[str, dict]:
+    """One SPARQL query for birth date, death date and image of up to PERSONAL_DETAILS_BATCH_SIZE people."""
+    values = " ".join(f"wd:{qid}" for qid in qids)
     query = f"""
-    SELECT ?birthDate ?deathDate ?image WHERE {{
-      wd:{qid} wdt:P569 ?birthDate.
-      OPTIONAL {{ wd:{qid} wdt:P570 ?deathDate. }}
-      OPTIONAL {{ wd:{qid} wdt:P18 ?image. }}
+    SELECT ?person ?birthDate ?deathDate ?image WHERE {{
+      VALUES ?person {{ {values} }}
+      OPTIONAL {{ ?person wdt:P569 ?birthDate. }}
+      OPTIONAL {{ ?person wdt:P570 ?deathDate. }}
+      OPTIONAL {{ ?person wdt:P18 ?image. }}
     }}
     """
 
-    headers = {
-        "Accept": "application/sparql-results+json",
-        "User-Agent": "MyWikipediaTool/1.0 (https://example.com/contact)"
-    }
-
-    async with aiohttp.ClientSession() as session:
-        async with session.get(SPARQL_API, params={"query": query}, headers=headers) as resp:
-            if resp.status != 200:
-                text = await resp.text()
-                raise RuntimeError(f"SPARQL query failed ({resp.status}): {text}")
+    headers = {"Accept": "application/sparql-results+json"}
 
-            data = await resp.json(content_type=None)
-            results = data.get("results", {}).get("bindings", [])
-
-            if not results:
-                return None
+    data = await get_json(SPARQL_API, params={"query": query}, headers=headers)
+    results = data.get("results", {}).get("bindings", [])
 
-            result = results[0]
-            birth_date = result.get("birthDate", {}).get("value")
-            death_date = result.get("deathDate", {}).get("value")
-            image = result.get("image", {}).get("value")
+    # Everybody gets an entry, so people without a birth date are not looked up again
+    details = {qid: {"birth_year": None, "death_year": None, "image_url": None} for qid in qids}
+    for result in results:
+        qid = result.get("person", {}).get("value", "").rsplit("/", 1)[-1]
+        if qid not in details:
+            continue
+        # Several values per property give several rows; keep the first of each
+        entry = details[qid]
+        birth_date = result.get("birthDate", {}).get("value")
+        death_date = result.get("deathDate", {}).get("value")
+        image = result.get("image", {}).get("value")
+        if birth_date and not entry["birth_year"]:
+            entry["birth_year"] = birth_date[:4]
+        if death_date and not entry["death_year"]:
+            entry["death_year"] = death_date[:4]
+        if image and not entry["image_url"]:
+            entry["image_url"] = image
+
+    return details
+
+COMMONS_FILE_PATH = "http://commons.wikimedia.org/wiki/Special:FilePath/"
+
+def personal_details_from_entity(entity: EntityRecord) -> dict:
+    """Birth year, death year and image URL of a person's entity record."""
+    return {
+        "birth_year": entity.birth_year,
+        "death_year": entity.death_year,
+        "image_url": COMMONS_FILE_PATH + quote(entity.image) if entity.image else None,
+    }
 
-            return {
-                "birth_year": birth_date[:4] if birth_date else None,
-                "death_year": death_date[:4] if death_date else None,
-                "image_url": image
-            }
+async def getPersonalDetailsByQids(qids: List[str]) -> Dict[str, dict]:
+    """Get personal details for many QIDs, one SPARQL query per chunk (chunks run concurrently)."""
+    qids = list(dict.fromkeys(qids))
+    chunks = [qids[i:i + PERSONAL_DETAILS_BATCH_SIZE] for i in range(0, len(qids), PERSONAL_DETAILS_BATCH_SIZE)]
+    details = {}
+    for chunk_details in await asyncio.gather(*(_personal_details_chunk(c) for c in chunks)):
+        details.update(chunk_details)
+    return details
 
 async def fetch_relationships(page_title: str, depth: int, websocket_manager: Optional[WebSocketManager] = None) -> List[Dict[str, str]]:
     """
@@ -3287,7 +3333,7 @@ async def fetch_relationships(page_title: str, depth: int, websocket_manager: Op
     Uses ONLY Wikidata (no LLM enrichment).
     """
     try:
-        qid = get_qid(page_title)
+        qid = await get_qid(page_title)
         print(f"Fetched QID for '{page_title}': {qid}")
         
         if not qid:
@@ -3327,7 +3373,7 @@ async def fetch_relationships(page_title: str, depth: int, websocket_manager: Op
         return []
 
 
-def get_qid(page_title: str) -> Optional[str]:
+async def get_qid(page_title: str) -> Optional[str]:
     """Return the Wikidata Q-identifier for a Wikipedia page title, or None if not found."""
     params = {
         "action": "query",
@@ -3337,19 +3383,8 @@ def get_qid(page_title: str) -> Optional[str]:
         "format": "json",
     }
 
-    headers = {
-        "User-Agent": "MyWikipediaTool/1.0 (https://example.com/contact)"
-    }
-
     try:
-        response = requests.get(WIKIPEDIA_API, params=params, headers=headers)
-
-        print(f"Status code: {response.status_code}")
-        if response.status_code != 200:
-            print(f"Failed to fetch data for {page_title}: {response.status_code}")
-            return None
-
-        data = response.json()
+        data = await get_json(WIKIPEDIA_API, params=params)
         print(f"Wikipedia API response for '{page_title}': {data}")
 
         pages = data.get("query", {}).get("pages", {})
@@ -3369,86 +3404,214 @@ def get_qid(page_title: str) -> Optional[str]:
         print(f"Error fetching QID for {page_title}: {e}")
         return None
 
-WIKIDATA_API = "https://www.wikidata.org/w/api.php"
+# wbgetentities accepts at most 50 ids per call
+ENTITY_BATCH_SIZE = 50
 
-def fetch_entity(qid: str) -> dict:
-    """Return the full JSON entity document for a given Wikidata QID."""
+async def _fetch_entity_batch(batch: List[str], props: str) -> dict:
     params = {
         "action": "wbgetentities",
-        "ids": qid,
+        "ids": "|".join(batch),
+        "props": props,
+        "languages": "en",
         "format": "json"
     }
+    data = await get_json(WIKIDATA_API, params=params)
+    return data.get("entities", {})
 
-    headers = {
-        "User-Agent": "MyWikipediaTool/1.0 (https://example.com/contact)"
-    }
+async def _revalidate_entities(stale: Dict[str, EntityRecord]) -> List[str]:
+    """
+    Check stale cache entries against Wikidata's current lastrevid (props=info only).
+
+    Returns the QIDs that are unchanged; those are touched in the cache. If the
+    check itself fails the stale copies are served as they are.
+    """
+    qids = list(stale)
+    batches = [qids[i:i + ENTITY_BATCH_SIZE] for i in range(0, len(qids), ENTITY_BATCH_SIZE)]
+    try:
+        results = await asyncio.gather(*(_fetch_entity_batch(b, "info") for b in batches))
+    except Exception as e:
+        print(f"Entity revalidation failed, serving cached copies: {e}")
+        return qids
+
+    current = {}
+    for entities in results:
+        for key, entity in entities.items():
+            current[key] = entity.get("lastrevid")
+    unchanged = [
+        qid for qid in qids
+        if current.get(qid) is not None and current[qid] == stale[qid].lastrevid
+    ]
+    await asyncio.to_thread(entity_cache.touch_many, unchanged)
+    return unchanged
+
+async def fetch_entities(
+    qids: List[str],
+    entity_store: Optional[Dict[str, Optional[EntityRecord]]] = None,
+) -> Dict[str, Optional[EntityRecord]]:
+    """
+    Batch-fetch entity records for many QIDs.
 
-    response = requests.get(WIKIDATA_API, params=params, headers=headers)
-    if response.status_code != 200:
-        raise RuntimeError(f"Failed to fetch entity {qid}: {response.status_code}")
+    Only claims and the English label are requested, and each document is
+    parsed into an EntityRecord as soon as it arrives.
 
-    data = response.json()
-    entities = data.get("entities", {})
-    if qid not in entities:
+    QIDs already in entity_store are not requested again; everything fetched is
+    added to it. People in the offline kinship index are served from it; the
+    persistent entity cache is consulted next: fresh entries are used directly, expired ones are revalidated in bulk by lastrevid and
+    only changed or unknown entities are downloaded, in concurrent batches of
+    ENTITY_BATCH_SIZE. Returns a dict covering every requested QID (None for
+    missing entities).
+    """
+    if entity_store is None:
+        entity_store = {}
+
+    missing = [qid for qid in dict.fromkeys(qids) if qid not in entity_store]
+    requested = len(missing)
+    index = get_kinship_index()
+    if index is not None and missing:
+        for qid in missing:
+            record = index.get(qid)
+            if record is not None:
+                entity_store[qid] = record
+        missing = [qid for qid in missing if qid not in entity_store]
+    if missing:
+        fresh, stale = await asyncio.to_thread(entity_cache.get_many, missing)
+        if stale:
+            for qid in await _revalidate_entities(stale):
+                fresh[qid] = stale[qid]
+        entity_store.update(fresh)
+        missing = [qid for qid in missing if qid not in fresh]
+    metrics.record_cache("wikidata_entities", requested - len(missing), len(missing))
+
+    batches = [missing[i:i + ENTITY_BATCH_SIZE] for i in range(0, len(missing), ENTITY_BATCH_SIZE)]
+    downloaded = []
+    results = await asyncio.gather(*(_fetch_entity_batch(b, "claims|labels|info") for b in batches))
+    for batch, entities in zip(batches, results):
+        for key, entity in entities.items():
+            if entity.get("missing") is not None:
+                continue
+            record = EntityRecord.from_entity(entity)
+            downloaded.append(record)
+            entity_store[key] = record
+            # Redirected ids come back under their target id
+            if record.qid:
+                entity_store[record.qid] = record
+        for qid in batch:
+            entity_store.setdefault(qid, None)
+
+    if downloaded:
+        await asyncio.to_thread(entity_cache.put_many, downloaded)
+
+    return {qid: entity_store.get(qid) for qid in qids}
+
+async def fetch_entity(qid: str) -> EntityRecord:
+    """Return the entity record for a given Wikidata QID."""
+    entity = (await fetch_entities([qid])).get(qid)
+    if not entity:
         raise ValueError(f"Entity {qid} not found in response")
+    return entity
 
-    return entities[qid]
-
-def get_labels(qids: set) -> Dict[str, str]:
+async def get_labels(qids: set) -> Dict[str, str]:
     """Batch-fetch English labels for a set of Q-ids (returns dict)."""
     if not qids:
         return {}
 
-    params = {
-        "action": "wbgetentities",
-        "ids": "|".join(qids),
-        "props": "labels",
-        "languages": "en",
-        "format": "json",
-    }
+    ordered = list(qids)
+    batches = [ordered[i:i + ENTITY_BATCH_SIZE] for i in range(0, len(ordered), ENTITY_BATCH_SIZE)]
 
-    headers = {
-        "User-Agent": "MyWikipediaTool/1.0 (https://example.com/contact)"
-    }
+    async def fetch_batch(batch: List[str]) -> dict:
+        params = {
+            "action": "wbgetentities",
+            "ids": "|".join(batch),
+            "props": "labels",
+            "languages": "en",
+            "format": "json",
+        }
 
-    response = requests.get(WIKIDATA_API, params=params, headers=headers)
-    if response.status_code != 200:
-        print(f"Failed to fetch labels: {response.status_code}")
-        print(f"Response text: {response.text}")
-        return {}
+        try:
+            data = await get_json(WIKIDATA_API, params=params)
+        except Exception as e:
+            print(f"Failed to fetch labels: {e}")
+            return {}
 
-    data = response.json()
-    
-    if "error" in data:
-        print(f"Wikidata API error: {data['error']}")
-        return {}
-        
-    entities = data.get("entities", {})
+        if "error" in data:
+            print(f"Wikidata API error: {data['error']}")
+            return {}
+
+        return data.get("entities", {})
 
     labels = {}
-    for qid, entity in entities.items():
-        if entity.get("missing"):
-            print(f"Entity {qid} is missing from Wikidata")
-            continue
-            
-        label_info = entity.get("labels", {}).get("en")
-        if label_info and "value" in label_info:
-            labels[qid] = label_info["value"]
-        else:
-            print(f"No English label found for {qid}")
+    for entities in await asyncio.gather(*(fetch_batch(b) for b in batches)):
+        for qid, entity in entities.items():
+            if entity.get("missing") is not None:
+                print(f"Entity {qid} is missing from Wikidata")
+                continue
+
+            label = _entity_label(entity)
+            if label:
+                labels[qid] = label
+            else:
+                print(f"No English label found for {qid}")
 
     return labels
 
-def get_parents(qid: str) -> List[str]:
+def _entity_label(entity: dict) -> Optional[str]:
+    """English label of a wbgetentities document, if it has one."""
+    label_info = entity.get("labels", {}).get("en")
+    if label_info and "value" in label_info:
+        return label_info["value"]
+    return None
+
+class LabelCache:
+    """
+    QID -> English label lookups for one traversal.
+
+    Labels are read straight from entity records already in the traversal's
+    entity store, then from the kinship index and the persistent entity cache;
+    only QIDs unknown to all of them are sent to get_labels, in bulk.
+    """
+
+    def __init__(self, entity_store: Optional[Dict[str, Optional[EntityRecord]]] = None):
+        self.entity_store = entity_store if entity_store is not None else {}
+        self.labels: Dict[str, str] = {}
+        self.unresolved: set = set()  # fetched but no English label; don't ask again
+
+    def get(self, qid: str) -> str:
+        """Label for a QID, falling back to the QID itself."""
+        if qid not in self.labels:
+            record = self.entity_store.get(qid)
+            if record is not None and record.label:
+                self.labels[qid] = record.label
+        return self.labels.get(qid, qid)
+
+    async def resolve(self, qids) -> Dict[str, str]:
+        """Make sure labels for all qids are known, fetching the missing ones in one go."""
+        missing = {
+            qid for qid in qids
+            if self.get(qid) == qid and qid not in self.unresolved and not self.entity_store.get(qid)
+        }
+        requested = len(missing)
+        index = get_kinship_index()
+        if index is not None and missing:
+            for qid in missing:
+                label = index.label(qid)
+                if label:
+                    self.labels[qid] = label
+            missing = {qid for qid in missing if qid not in self.labels}
+        if missing:
+            self.labels.update(await asyncio.to_thread(entity_cache.get_labels, missing))
+            missing = {qid for qid in missing if qid not in self.labels}
+        metrics.record_cache("wikidata_labels", requested - len(missing), len(missing))
+        if missing:
+            fetched = await get_labels(missing)
+            self.labels.update(fetched)
+            await asyncio.to_thread(entity_cache.put_labels, fetched)
+            self.unresolved.update(qid for qid in missing if qid not in self.labels)
+        return {qid: self.get(qid) for qid in qids}
+
+async def get_parents(qid: str) -> List[str]:
     """Return a list of parent QIDs for a given QID."""
-    entity = fetch_entity(qid)
-    claims = entity.get("claims", {})
-    parents = []
-    for snak in claims.get("P22", []):  # Father
-        parents.append(snak["mainsnak"]["datavalue"]["value"]["id"])
-    for snak in claims.get("P25", []):  # Mother
-        parents.append(snak["mainsnak"]["datavalue"]["value"]["id"])
-    return parents
+    entity = await fetch_entity(qid)
+    return list(entity.fathers + entity.mothers)
 
 def safe_extract_qid(snak: dict) -> Optional[str]:
     """Safely extract QID from a snak, return None if unavailable."""
@@ -3459,251 +3622,355 @@ def safe_extract_qid(snak: dict) -> Optional[str]:
     except Exception:
         return None
 
-async def collect_relationships(qid: str, depth: int, direction: str, relationships: List[Dict[str, str]], visited: set, all_qids: set, websocket_manager: Optional[WebSocketManager] = None, sent_entities: Optional[set] = None):
+async def _emit_relationship(
+    entity1_qid: str,
+    relation: Relation,
+    entity2_qid: str,
+    new_qid: Optional[str],
+    graph: KinshipGraph,
+    websocket_manager: Optional[WebSocketManager],
+    label_cache: LabelCache,
+    pending_details: List[str],
+    recorded: Optional[List[tuple]] = None,
+):
+    """Add one QID relationship to the graph and stream it to the client; the new person's details are queued."""
+    if not graph.add_edge(entity1_qid, relation, entity2_qid):
+        return  # already emitted
+    if recorded is not None:
+        recorded.append((entity1_qid, relation, entity2_qid, new_qid))
+
+    if not websocket_manager:
+        return
+
+    await websocket_manager.send_event("relationship", {
+        "entity1": label_cache.get(entity1_qid),
+        "relationship": relation.label,
+        "entity2": label_cache.get(entity2_qid)
+    })
+
+    if new_qid:
+        person = graph.person(new_qid)
+        if not person.details_sent:
+            person.details_sent = True
+            pending_details.append(new_qid)
+
+async def _send_personal_details(
+    qids: List[str],
+    websocket_manager: Optional[WebSocketManager],
+    label_cache: LabelCache,
+    tree: Optional[CachedTree] = None,
+    graph: Optional[KinshipGraph] = None,
+):
     """
-    Recursively collect family relationships in {"entity1": str, "relationship": str, "entity2": str} format.
-    direction: 'up' (ancestors) or 'down' (descendants)
+    Stream details for a generation's new people.
+
+    Details remembered by the cached tree are sent as they are. People whose
+    entity documents are already loaded (or who are in the kinship index) get
+    their details from the records; the rest (spouses) are looked up with
+    SPARQL, streamed as each chunk returns. New details are stored in the tree
+    and on the graph's person records.
     """
-    if depth == 0 or qid in visited:
+    if not websocket_manager and tree is not None:
+        # Nothing to stream, but remember what the loaded documents already say for later replays
+        for qid in qids:
+            if label_cache.entity_store.get(qid) and tree.get_details(qid) is None:
+                tree.set_details(qid, personal_details_from_entity(label_cache.entity_store[qid]))
+    if not websocket_manager or not qids:
         return
-    visited.add(qid)
-    
-    if sent_entities is None:
-        sent_entities = set()
-
-    entity = fetch_entity(qid)
-    claims = entity.get("claims", {})
 
-    if direction == "up":  # Ancestors via P22 (father), P25 (mother)
-        # BIOLOGICAL PARENTS - FATHER
-        for snak in claims.get("P22", []):
-            father_qid = safe_extract_qid(snak)
-            if not father_qid:
+    if tree is not None:
+        known = {}
+        for qid in qids:
+            entry = tree.get_details(qid)
+            if entry is not None:
+                known[qid] = entry
+        qids = [qid for qid in qids if qid not in known]
+        for qid, entry in known.items():
+            if graph is not None:
+                graph.set_details(qid, entry)
+            await websocket_manager.send_event("personal_details", {
+                "entity": label_cache.get(qid),
+                "qid": qid,
+                **entry
+            })
+        if not qids:
+            return
+
+    index = get_kinship_index()
+    if index is not None:
+        for qid in qids:
+            if not label_cache.entity_store.get(qid):
+                record = index.get(qid)
+                if record is not None:
+                    label_cache.entity_store[qid] = record
+
+    async def send(details: Dict[str, dict]):
+        # CRITICAL FIX: Always send personal details, even if empty
+        for qid, entry in details.items():
+            if tree is not None:
+                tree.set_details(qid, entry)
+            if graph is not None:
+                graph.set_details(qid, entry)
+            await websocket_manager.send_event("personal_details", {
+                "entity": label_cache.get(qid),
+                "qid": qid,
+                **entry
+            })
+
+    entity_store = label_cache.entity_store
+    await send({qid: personal_details_from_entity(entity_store[qid]) for qid in qids if entity_store.get(qid)})
+
+    lookup = [qid for qid in qids if not entity_store.get(qid)]
+    chunks = [lookup[i:i + PERSONAL_DETAILS_BATCH_SIZE] for i in range(0, len(lookup), PERSONAL_DETAILS_BATCH_SIZE)]
+    for next_chunk in asyncio.as_completed([_personal_details_chunk(c) for c in chunks]):
+        try:
+            details = await next_chunk
+        except Exception as e:
+            print(f"Personal details lookup failed: {e}")
+            continue
+        await send(details)
+
+# Properties a traversal follows: father, mother, spouse, child
+FAMILY_PROPERTIES = ("P22", "P25", "P26", "P40")
+
+FamilyLinks = Dict[str, Dict[str, List[str]]]
+ExpandGeneration = Callable[[List[Tuple[str, str]]], Awaitable[Tuple[FamilyLinks, Dict[tuple, List[str]]]]]
+
+def _entity_expander(entity_store: Dict[str, Optional[EntityRecord]], label_cache: LabelCache) -> ExpandGeneration:
+    """Expand a generation from entity documents, fetched through batched wbgetentities calls."""
+
+    async def expand(frontier: List[Tuple[str, str]]):
+        entities = await fetch_entities([person_qid for person_qid, _ in frontier], entity_store)
+
+        links: FamilyLinks = {}
+        next_qids = []
+        spouse_qids = []
+        for person_qid, direction in frontier:
+            record = entities.get(person_qid)
+            person_links = links.setdefault(person_qid, {
+                prop: list(record.targets(prop)) if record else [] for prop in FAMILY_PROPERTIES
+            })
+            spouse_qids.extend(person_links["P26"])
+            if direction == "up":
+                next_qids.extend(person_links["P22"] + person_links["P25"])
+            else:
+                next_qids.extend(person_links["P40"])
+
+        # The next generation is needed anyway (expansion, spouse-parent check), so its documents
+        # double as the label source; spouses are never expanded, so only their labels are fetched
+        next_entities = await fetch_entities(next_qids, entity_store)
+        await label_cache.resolve(spouse_qids)
+
+        # Link each child to every spouse of the person who is also one of its parents
+        co_parents: Dict[tuple, List[str]] = {}
+        for person_qid, direction in frontier:
+            if direction != "down":
                 continue
-                
-            relationship = {"entity1": qid, "relationship": "child of", "entity2": father_qid}
-            relationships.append(relationship)
-            all_qids.update([qid, father_qid])
-            
-            if websocket_manager:
-                labels = get_labels({qid, father_qid})
-                named_relationship = {
-                    "entity1": labels.get(qid, qid),
-                    "relationship": "child of",
-                    "entity2": labels.get(father_qid, father_qid)
-                }
-                await websocket_manager.send_message(json.dumps({
-                    "type": "relationship",
-                    "data": named_relationship
-                }))
-                
-                # CRITICAL FIX: Always send personal details, even if empty
-                if father_qid not in sent_entities:
-                    father_details = await getPersonalDetailsByQid(father_qid)
-                    await websocket_manager.send_message(json.dumps({
-                        "type": "personal_details",
-                        "data": {
-                            "entity": labels.get(father_qid, father_qid),
-                            "qid": father_qid,
-                            "birth_year": father_details.get("birth_year") if father_details else None,
-                            "death_year": father_details.get("death_year") if father_details else None,
-                            "image_url": father_details.get("image_url") if father_details else None
-                        }
-                    }))
-                    sent_entities.add(father_qid)
-            
-            await collect_relationships(father_qid, depth - 1, direction, relationships, visited, all_qids, websocket_manager, sent_entities)
+            for child_qid in links[person_qid]["P40"]:
+                child = next_entities.get(child_qid)
+                child_parents = set(child.fathers + child.mothers) if child else set()
+                shared = [spouse_qid for spouse_qid in links[person_qid]["P26"] if spouse_qid in child_parents]
+                if shared:
+                    co_parents[(person_qid, child_qid)] = shared
+        return links, co_parents
+
+    return expand
+
+async def collect_relationships(
+    state: TraversalState,
+    websocket_manager: Optional[WebSocketManager] = None,
+    budget: Optional[TraversalBudget] = None,
+) -> Optional[str]:
+    """
+    Collect ancestors and descendants of state.qid in a single pass, closest generations first.
+
+    The frontier holds (person, direction) pairs: "up" people contribute their
+    parents (P22, P25) and spouses (P26), "down" people their spouses and
+    children (P40). Both halves of a generation are expanded together by one
+    state.expand call, which returns {person: {prop: [qid, ...]}} and
+    {(person, child): [spouse, ...]} for spouses who are also the child's
+    parents, so anybody reached from both sides is looked up once. Everything
+    found goes into state.graph, which emits every edge once.
+
+    With a cached tree, generations it already holds are replayed from it
+    without any upstream calls, and expansion resumes from its stored
+    frontier; when extending, every newly expanded generation is recorded
+    into it.
+
+    With a budget, expansion stops once it runs out, possibly partway through
+    a generation. The reason ("max_nodes" or "deadline") is returned and
+    `state` is left ready to be passed in again; None means the traversal is
+    complete.
+    """
+    label_cache = state.label_cache
+    tree = state.tree
+    graph = state.graph
+
+    async def emit(entity1_qid: str, relation: Relation, entity2_qid: str, new_qid: Optional[str]):
+        await _emit_relationship(
+            entity1_qid, relation, entity2_qid, new_qid, graph,
+            websocket_manager, label_cache, state.pending_details, state.recorded,
+        )
 
-        # BIOLOGICAL PARENTS - MOTHER
-        for snak in claims.get("P25", []):
-            mother_qid = safe_extract_qid(snak)
-            if not mother_qid:
-                continue
-                
-            relationship = {"entity1": qid, "relationship": "child of", "entity2": mother_qid}
-            relationships.append(relationship)
-            all_qids.update([qid, mother_qid])
-            
+    if state.level == 0 and state.generation is None and tree is not None and tree.sweep.levels:
+        start_level = min(state.depth, tree.sweep.levels)
+        for level in range(start_level):
             if websocket_manager:
-                labels = get_labels({qid, mother_qid})
-                named_relationship = {
-                    "entity1": labels.get(qid, qid),
-                    "relationship": "child of",
-                    "entity2": labels.get(mother_qid, mother_qid)
-                }
-                await websocket_manager.send_message(json.dumps({
-                    "type": "relationship",
-                    "data": named_relationship
-                }))
-                
-                # CRITICAL FIX: Always send personal details, even if empty
-                if mother_qid not in sent_entities:
-                    mother_details = await getPersonalDetailsByQid(mother_qid)
-                    await websocket_manager.send_message(json.dumps({
-                        "type": "personal_details",
-                        "data": {
-                            "entity": labels.get(mother_qid, mother_qid),
-                            "qid": mother_qid,
-                            "birth_year": mother_details.get("birth_year") if mother_details else None,
-                            "death_year": mother_details.get("death_year") if mother_details else None,
-                            "image_url": mother_details.get("image_url") if mother_details else None
-                        }
-                    }))
-                    sent_entities.add(mother_qid)
-            
-            await collect_relationships(mother_qid, depth - 1, direction, relationships, visited, all_qids, websocket_manager, sent_entities)
-
-    elif direction == "down":  # Descendants via P40 (child)
-        # SPOUSES
-        spouse_qids = set()
-        for spouse_snak in claims.get("P26", []):
-            spouse_qid = safe_extract_qid(spouse_snak)
-            if not spouse_qid:
-                continue
-                
-            spouse_qids.add(spouse_qid)
-            relationship = {"entity1": qid, "relationship": "spouse of", "entity2": spouse_qid}
-            relationships.append(relationship)
-            all_qids.update([qid, spouse_qid])
-            
-            if websocket_manager:
-                labels = get_labels({qid, spouse_qid})
-                named_relationship = {
-                    "entity1": labels.get(qid, qid),
-                    "relationship": "spouse of",
-                    "entity2": labels.get(spouse_qid, spouse_qid)
-                }
-                await websocket_manager.send_message(json.dumps({
-                    "type": "relationship",
-                    "data": named_relationship
-                }))
-                
-                # CRITICAL FIX: Always send personal details, even if empty
-                if spouse_qid not in sent_entities:
-                    spouse_details = await getPersonalDetailsByQid(spouse_qid)
-                    await websocket_manager.send_message(json.dumps({
-                        "type": "personal_details",
-                        "data": {
-                            "entity": labels.get(spouse_qid, spouse_qid),
-                            "qid": spouse_qid,
-                            "birth_year": spouse_details.get("birth_year") if spouse_details else None,
-                            "death_year": spouse_details.get("death_year") if spouse_details else None,
-                            "image_url": spouse_details.get("image_url") if spouse_details else None
-                        }
-                    }))
-                    sent_entities.add(spouse_qid)
-
-        # BIOLOGICAL CHILDREN
-        for snak in claims.get("P40", []):
-            child_qid = safe_extract_qid(snak)
-            if not child_qid:
-                continue
-                
-            relationship = {"entity1": child_qid, "relationship": "child of", "entity2": qid}
-            relationships.append(relationship)
-            all_qids.update([child_qid, qid])
+                websocket_manager.check_cancelled()
+            state.visited.update(graph.frontier_key(q, d) for q, d in tree.frontier(level))
+            state.pending_details = []
+            for entity1_qid, relation, entity2_qid, new_qid in tree.edges(level):
+                await emit(entity1_qid, relation, entity2_qid, new_qid)
+            await _send_personal_details(state.pending_details, websocket_manager, label_cache, tree, graph)
+        print(f"Replayed {start_level} cached generation(s) for '{state.qid}'")
+        state.level = start_level
+        state.next_frontier = tree.next_frontier()
+
+    while state.level < state.depth:
+        if websocket_manager:
+            websocket_manager.check_cancelled()
+        if state.generation is None:
+            # Keep the first occurrence of every unvisited (person, direction), preserving discovery order
+            generation = []
+            for person_qid, direction in state.next_frontier:
+                key = graph.frontier_key(person_qid, direction)
+                if key not in state.visited:
+                    state.visited.add(key)
+                    generation.append((person_qid, direction))
+            if not generation:
+                break
+            state.generation, state.position, state.next_frontier = generation, 0, []
+            state.recorded = [] if state.extending else None
+            ancestors = sum(direction == "up" for _, direction in generation)
+            print(f"Generation {state.level + 1}/{state.depth}: expanding {ancestors} ancestors and {len(generation) - ancestors} descendants")
+
+        reason = budget.exhausted() if budget else None
+        if reason:
+            return reason
+        end = len(state.generation)
+        room = budget.remaining_nodes() if budget else None
+        if room is not None:
+            end = min(end, state.position + room)
+        batch = state.generation[state.position:end]
+        state.position = end
+        if budget:
+            budget.expanded += len(batch)
+
+        links, co_parents = await state.expand(batch)
+
+        state.pending_details = []
+        for person_qid, direction in batch:
+            person_links = links.get(person_qid, {})
+            if direction == "up":
+                for parent_qid in person_links.get("P22", []) + person_links.get("P25", []):
+                    state.next_frontier.append((parent_qid, "up"))
+                    await emit(person_qid, Relation.CHILD_OF, parent_qid, parent_qid)
+                for spouse_qid in person_links.get("P26", []):
+                    await emit(person_qid, Relation.SPOUSE_OF, spouse_qid, spouse_qid)
+            else:
+                for spouse_qid in person_links.get("P26", []):
+                    await emit(person_qid, Relation.SPOUSE_OF, spouse_qid, spouse_qid)
+                for child_qid in person_links.get("P40", []):
+                    state.next_frontier.append((child_qid, "down"))
+                    await emit(child_qid, Relation.CHILD_OF, person_qid, child_qid)
+                    for spouse_qid in co_parents.get((person_qid, child_qid), []):
+                        await emit(child_qid, Relation.CHILD_OF, spouse_qid, None)
+        await _send_personal_details(state.pending_details, websocket_manager, label_cache, tree, graph)
+
+        if state.position < len(state.generation):
+            continue  # the budget cut this generation short
+        if state.extending:
+            tree.record_level(state.generation, state.recorded, state.next_frontier)
+        state.generation = None
+        state.level += 1
+        if websocket_manager and state.level < state.depth:
+            await websocket_manager.send_message(json.dumps({
+                "type": "status",
+                "data": {"message": f"Generation {state.level} of {state.depth} collected...", "progress": state.level * 100 // state.depth}
+            }))
+    return None
+
+async def _finish_traversal(
+    state: TraversalState,
+    websocket_manager: Optional[WebSocketManager],
+    reason: Optional[str],
+    start: int = 0,
+) -> TraversalResult:
+    """
+    Wrap up one stretch of a traversal and name the relationships found since `start`.
 
-            if websocket_manager:
-                labels = get_labels({child_qid, qid})
-                named_relationship = {
-                    "entity1": labels.get(child_qid, child_qid),
-                    "relationship": "child of",
-                    "entity2": labels.get(qid, qid)
-                }
-                await websocket_manager.send_message(json.dumps({
-                    "type": "relationship",
-                    "data": named_relationship
-                }))
-                
-                # CRITICAL FIX: Always send personal details, even if empty
-                if child_qid not in sent_entities:
-                    child_details = await getPersonalDetailsByQid(child_qid)
-                    await websocket_manager.send_message(json.dumps({
-                        "type": "personal_details",
-                        "data": {
-                            "entity": labels.get(child_qid, child_qid),
-                            "qid": child_qid,
-                            "birth_year": child_details.get("birth_year") if child_details else None,
-                            "death_year": child_details.get("death_year") if child_details else None,
-                            "image_url": child_details.get("image_url") if child_details else None
-                        }
-                    }))
-                    sent_entities.add(child_qid)
-
-            # Check if any of the known spouses is also a parent of this child
-            child_entity = fetch_entity(child_qid)
-            child_claims = child_entity.get("claims", {})
-            child_parents = set()
-            for parent_prop in ["P22", "P25"]:
-                for parent_snak in child_claims.get(parent_prop, []):
-                    parent_qid = safe_extract_qid(parent_snak)
-                    if parent_qid:
-                        child_parents.add(parent_qid)
-
-            # For each spouse that is also a parent of this child, send the child-spouse relationship
-            for spouse_qid in spouse_qids:
-                if spouse_qid in child_parents:
-                    spouse_relationship = {"entity1": child_qid, "relationship": "child of", "entity2": spouse_qid}
-                    relationships.append(spouse_relationship)
-                    all_qids.add(spouse_qid)
-                    
-                    if websocket_manager:
-                        labels = get_labels({child_qid, spouse_qid})
-                        named_relationship = {
-                            "entity1": labels.get(child_qid, child_qid),
-                            "relationship": "child of",
-                            "entity2": labels.get(spouse_qid, spouse_qid)
-                        }
-                        await websocket_manager.send_message(json.dumps({
-                            "type": "relationship",
-                            "data": named_relationship
-                        }))
-
-            await collect_relationships(child_qid, depth - 1, direction, relationships, visited, all_qids, websocket_manager, sent_entities)
-
-    # Collect spouse relationships (P26) only for "up" direction to avoid duplication
-    if direction == "up":
-        for snak in claims.get("P26", []):
-            spouse_qid = safe_extract_qid(snak)
-            if not spouse_qid:
-                continue
-                
-            relationship = {"entity1": qid, "relationship": "spouse of", "entity2": spouse_qid}
-            relationships.append(relationship)
-            all_qids.update([qid, spouse_qid])
-            
-            if websocket_manager:
-                labels = get_labels({qid, spouse_qid})
-                named_relationship = {
-                    "entity1": labels.get(qid, qid),
-                    "relationship": "spouse of",
-                    "entity2": labels.get(spouse_qid, spouse_qid)
-                }
-                await websocket_manager.send_message(json.dumps({
-                    "type": "relationship",
-                    "data": named_relationship
-                }))
-                
-                # CRITICAL FIX: Always send personal details, even if empty
-                if spouse_qid not in sent_entities:
-                    spouse_details = await getPersonalDetailsByQid(spouse_qid)
-                    await websocket_manager.send_message(json.dumps({
-                        "type": "personal_details",
-                        "data": {
-                            "entity": labels.get(spouse_qid, spouse_qid),
-                            "qid": spouse_qid,
-                            "birth_year": spouse_details.get("birth_year") if spouse_details else None,
-                            "death_year": spouse_details.get("death_year") if spouse_details else None,
-                            "image_url": spouse_details.get("image_url") if spouse_details else None
-                        }
-                    }))
-                    sent_entities.add(spouse_qid)
-
-async def collect_bidirectional_relationships(qid: str, depth: int, websocket_manager: Optional[WebSocketManager] = None) -> List[Dict[str, str]]:
-    """Collect relationships in both directions and return formatted list."""
-    relationships = []
-    all_qids = set([qid])
-    sent_entities = set()
+    A traversal stopped by its budget is parked under a continuation token,
+    announced to the client in a frontier_remaining event, and the result
+    says it paused.
+    """
+    # Every label is already known from the traversal; this only fills gaps
+    labels = await state.label_cache.resolve(state.graph.qids())
+    for person_qid, label in labels.items():
+        state.graph.set_label(person_qid, label)
+    if state.extending:
+        for person_qid, label in labels.items():
+            state.tree.set_label(person_qid, label)
+        # A paused traversal keeps growing its own tree; the cache gets what is finished so far
+        tree_cache.put(state.tree.copy() if reason else state.tree)
+
+    if websocket_manager:
+        if reason:
+            token = paused_traversals.put(state)
+            remaining = state.remaining()
+            print(f"Traversal of '{state.qid}' paused ({reason}) with {remaining} frontier entries left")
+            await websocket_manager.send_event("frontier_remaining", {
+                "token": token,
+                "reason": reason,
+                "remaining": remaining,
+                "generation": state.level + 1,
+                "depth": state.depth,
+            })
+            await websocket_manager.send_message(json.dumps({
+                "type": "status",
+                "data": {"message": f"Partial tree: {remaining} people left to expand", "progress": state.level * 100 // state.depth}
+            }))
+        else:
+            await websocket_manager.send_message(json.dumps({
+                "type": "status",
+                "data": {"message": "Collection complete!", "progress": 100}
+            }))
+
+    # Names replace QIDs only here, at the wire boundary
+    relationships = state.graph.to_dicts(start)
+    if not reason:
+        return TraversalResult(relationships)
+    return TraversalResult(relationships, reason, state.remaining(), state.level * 100 // state.depth)
+
+async def collect_bidirectional_relationships(
+    qid: str,
+    depth: int,
+    websocket_manager: Optional[WebSocketManager] = None,
+    entity_store: Optional[Dict[str, Optional[EntityRecord]]] = None,
+) -> List[Dict[str, str]]:
+    """
+    Collect relationships in both directions and return formatted list.
+
+    People come from batched wbgetentities calls, one round per generation
+    for ancestors and descendants together.
+
+    Results are kept in the depth-incremental tree cache: a request no deeper
+    than a cached one is answered from it, a deeper one only expands the
+    generations beyond it.
+
+    Streamed requests run under the TRAVERSAL_MAX_NODES / TRAVERSAL_DEADLINE
+    budget and may return a partial tree; see continue_family_relationships.
+    """
+    if entity_store is None:
+        entity_store = {}
+    label_cache = LabelCache(entity_store)
+
+    cached = tree_cache.get(qid)
+    extending = cached is None or cached.needs_extension(depth)
+    metrics.record_cache("tree_cache", int(not extending), int(extending))
+    # Extend a private copy so concurrent readers of the cached tree are not disturbed
+    tree = (cached.copy() if cached else CachedTree(qid)) if extending else cached
+    label_cache.labels.update(tree.label_map())
+    state = TraversalState(qid, depth, _entity_expander(entity_store, label_cache), label_cache, tree, extending)
     
     if websocket_manager:
         await websocket_manager.send_message(json.dumps({
@@ -3711,71 +3978,242 @@ async def collect_bidirectional_relationships(qid: str, depth: int, websocket_ma
             "data": {"message": "Starting relationship collection...", "progress": 0}
         }))
         
-        initial_labels = get_labels({qid})
-        print(f"Fetched labels for '{qid}': {initial_labels}")
-        initial_entity_name = initial_labels.get(qid, qid)
+        if label_cache.get(qid) == qid or tree.get_details(qid) is None:
+            await fetch_entities([qid], entity_store)
+        initial_entity_name = label_cache.get(qid)
         print(f"Initial entity name for '{qid}': {initial_entity_name}")
-        initial_details = await getPersonalDetailsByQid(qid)
-        print(f"Initial personal details for '{qid}': {initial_details}")
-        if initial_details:
-            await websocket_manager.send_message(json.dumps({
-                "type": "personal_details",
-                "data": {
-                    "entity": initial_entity_name,
-                    "qid": qid,
-                    **initial_details
-                }
+        await _send_personal_details([qid], websocket_manager, label_cache, tree, state.graph)
+        state.graph.person(qid).details_sent = True
+
+    # Ancestors and descendants in one pass, with parents, children and spouses
+    budget = TraversalBudget.from_settings() if websocket_manager else None
+    reason = await collect_relationships(state, websocket_manager, budget)
+    return await _finish_traversal(state, websocket_manager, reason)
+
+async def continue_family_relationships(token: str, websocket_manager: Optional[WebSocketManager] = None) -> List[Dict[str, str]]:
+    """
+    Carry on a traversal that stopped at its budget, from the frontier it left.
+
+    Nothing already expanded is fetched or streamed again; only relationships
+    found in this stretch are returned. Overlapping requests for the same
+    token share one continuation.
+    """
+    async def produce(channel):
+        state = paused_traversals.pop(token)
+        if state is None:
+            if channel:
+                await channel.send_message(json.dumps({
+                    "type": "error",
+                    "data": {"message": "Unknown or expired continuation token"}
+                }))
+            return []
+        start = len(state.graph)
+        if channel:
+            await channel.send_message(json.dumps({
+                "type": "status",
+                "data": {"message": f"Continuing with {state.remaining()} people left to expand...", "progress": state.level * 100 // state.depth}
             }))
-            sent_entities.add(qid)
+        budget = TraversalBudget.from_settings() if channel else None
+        reason = await collect_relationships(state, channel, budget)
+        return await _finish_traversal(state, channel, reason, start)
 
-    # Collect ancestors (upward) - includes biological parents and spouses
-    await collect_relationships(qid, depth, "up", relationships, set(), all_qids, websocket_manager, sent_entities)
+    if websocket_manager is None:
+        return await produce(None)
+    relationships = await run_shared(("continue", token), produce, websocket_manager)
+    return relationships.copy()
 
-    if websocket_manager:
-        await websocket_manager.send_message(json.dumps({
-            "type": "status",
-            "data": {"message": "Ancestors collected, now collecting descendants...", "progress": 50}
-        }))
+ENTITY_PREFIX = "http://www.wikidata.org/entity/"
+
+def _generation_union(qid: str, depth: int, step: str) -> str:
+    """
+    UNION binding ?person to everybody 0..depth-1 steps from qid along `step`.
+
+    WDQS has no bounded {n,m} path operator, so each distance is spelled out
+    as a fixed-length sequence path.
+    """
+    branches = [f"{{ BIND(wd:{qid} AS ?person) }}"]
+    for k in range(1, depth):
+        branches.append(f"{{ wd:{qid} {'/'.join([step] * k)} ?person . }}")
+    return "{ " + "\n      UNION\n      ".join(branches) + " }"
+
+def _ancestor_query(qid: str, depth: int) -> str:
+    """Parent (P22/P25) and spouse (P26) edges of every ancestor that gets expanded."""
+    return f"""
+    SELECT DISTINCT ?person ?prop ?other ?via ?personLabel ?otherLabel ?viaLabel WHERE {{
+      {_generation_union(qid, depth, "(wdt:P22|wdt:P25)")}
+      VALUES ?prop {{ wdt:P22 wdt:P25 wdt:P26 }}
+      ?person ?prop ?other .
+      SERVICE wikibase:label {{ bd:serviceParam wikibase:language "en". }}
+    }}
+    """
+
+def _descendant_query(qid: str, depth: int) -> str:
+    """Spouse (P26) and child (P40) edges of every descendant that gets expanded, plus children's other parents among the spouses."""
+    return f"""
+    SELECT DISTINCT ?person ?prop ?other ?via ?personLabel ?otherLabel ?viaLabel WHERE {{
+      {_generation_union(qid, depth, "wdt:P40")}
+      {{
+        VALUES ?prop {{ wdt:P26 wdt:P40 }}
+        ?person ?prop ?other .
+      }}
+      UNION
+      {{
+        ?person wdt:P40 ?other ;
+                wdt:P26 ?via .
+        ?other wdt:P22|wdt:P25 ?via .
+        BIND(wdt:P40 AS ?prop)
+      }}
+      SERVICE wikibase:label {{ bd:serviceParam wikibase:language "en". }}
+    }}
+    """
 
-    # Collect descendants (downward) - includes biological children and spouses
-    await collect_relationships(qid, depth, "down", relationships, set(), all_qids, websocket_manager, sent_entities)
+def _parse_edge_rows(bindings: List[dict], labels: Dict[str, str]):
+    """
+    Turn traversal query rows into an adjacency map.
+
+    Returns ({person: {prop: [qid, ...]}}, {(person, child): [spouse, ...]});
+    labels from the label service are collected into `labels`.
+    """
+    adjacency: Dict[str, Dict[str, List[str]]] = {}
+    spouse_children: Dict[tuple, List[str]] = {}
+
+    def entity(row: dict, var: str) -> Optional[str]:
+        value = row.get(var, {}).get("value", "")
+        if not value.startswith(ENTITY_PREFIX):
+            return None  # unknown value / blank node
+        qid = value[len(ENTITY_PREFIX):]
+        label = row.get(f"{var}Label", {}).get("value")
+        if label and label != qid:
+            labels.setdefault(qid, label)
+        return qid
+
+    for row in bindings:
+        person, other = entity(row, "person"), entity(row, "other")
+        prop = row.get("prop", {}).get("value", "").rsplit("/", 1)[-1]
+        if not person or not other:
+            continue
+        targets = adjacency.setdefault(person, {}).setdefault(prop, [])
+        if other not in targets:
+            targets.append(other)
+        via = entity(row, "via")
+        if via:
+            vias = spouse_children.setdefault((person, other), [])
+            if via not in vias:
+                vias.append(via)
+
+    # Query results are unordered; sort for a stable streaming order
+    for props in adjacency.values():
+        for prop in props:
+            props[prop].sort(key=lambda q: int(q[1:]))
+    return adjacency, spouse_children
+
+async def collect_relationships_sparql(
+    qid: str,
+    depth: int,
+    websocket_manager: Optional[WebSocketManager] = None,
+    entity_store: Optional[Dict[str, Optional[EntityRecord]]] = None,
+) -> List[Dict[str, str]]:
+    """
+    Collect relationships in both directions with two bounded SPARQL queries.
+
+    The ancestor and descendant edge sets up to `depth` arrive in one query
+    each (run concurrently, labels from the label service) and are then
+    walked by the same engine as collect_bidirectional_relationships, so
+    frames come in the same order and shape, and recorded into the tree
+    cache for later requests to replay or extend. Raises if a query fails,
+    before anything is streamed, so the caller can fall back to entity mode.
+    """
+    if entity_store is None:
+        entity_store = {}
+    headers = {"Accept": "application/sparql-results+json"}
+    up_data, down_data = await asyncio.gather(
+        get_json(SPARQL_API, params={"query": _ancestor_query(qid, depth)}, headers=headers),
+        get_json(SPARQL_API, params={"query": _descendant_query(qid, depth)}, headers=headers),
+    )
+
+    label_cache = LabelCache(entity_store)
+    up_adjacency, _ = _parse_edge_rows(up_data.get("results", {}).get("bindings", []), label_cache.labels)
+    down_adjacency, spouse_children = _parse_edge_rows(down_data.get("results", {}).get("bindings", []), label_cache.labels)
+
+    # Both queries describe the same people from different sides; the walk picks per direction
+    adjacency = up_adjacency
+    for person_qid, props in down_adjacency.items():
+        for prop, targets in props.items():
+            merged = adjacency.setdefault(person_qid, {}).setdefault(prop, [])
+            merged.extend(q for q in targets if q not in merged)
+
+    async def expand(frontier: List[Tuple[str, str]]):
+        return adjacency, spouse_children
+
+    metrics.record_cache("tree_cache", 0, 1)
+    tree = CachedTree(qid)
+    state = TraversalState(qid, depth, expand, label_cache, tree, extending=True)
+    state.graph.person(qid).details_sent = True
 
     if websocket_manager:
         await websocket_manager.send_message(json.dumps({
             "type": "status",
-            "data": {"message": "Collection complete!", "progress": 100}
+            "data": {"message": "Starting relationship collection...", "progress": 0}
         }))
+        await _send_personal_details([qid], websocket_manager, label_cache, tree, state.graph)
 
-    # Fetch labels for all entities
-    labels = get_labels(all_qids)
+    budget = TraversalBudget.from_settings() if websocket_manager else None
+    reason = await collect_relationships(state, websocket_manager, budget)
+    return await _finish_traversal(state, websocket_manager, reason)
 
-    # Replace QIDs with names in relationships
-    named_relationships = []
-    for rel in relationships:
-        entity1_name = labels.get(rel["entity1"], rel["entity1"])
-        entity2_name = labels.get(rel["entity2"], rel["entity2"])
-        named_relationships.append({
-            "entity1": entity1_name,
-            "relationship": rel["relationship"],
-            "entity2": entity2_name
-        })
+def estimate_tree_edges(entity: Optional[EntityRecord], depth: int) -> int:
+    """
+    Rough edge count of a depth-`depth` tree around a person, from their own fan-out.
 
-    return named_relationships
+    Ancestors double per generation; descendants are assumed to have as many
+    children (and spouses) as the root does.
+    """
+    spouses = len(entity.spouses) if entity else 0
+    children = max(len(entity.children) if entity else 0, 1)
+    ancestors = sum(2 ** k * (2 + spouses) for k in range(depth))
+    descendants = sum(children ** k * (children * 2 + spouses) for k in range(depth))
+    return ancestors + descendants
+
+def choose_traversal_mode(entity: Optional[EntityRecord], depth: int) -> str:
+    """'sparql' for deep trees of manageable size, 'entity' otherwise (or as configured)."""
+    if settings.TRAVERSAL_MODE in ("entity", "sparql"):
+        return settings.TRAVERSAL_MODE
+    if depth < settings.SPARQL_TRAVERSAL_MIN_DEPTH:
+        return "entity"
+    if estimate_tree_edges(entity, depth) > settings.SPARQL_TRAVERSAL_MAX_EDGES:
+        return "entity"  # large result sets risk hitting the query service timeout
+    return "sparql"
+
+async def collect_family_relationships(qid: str, depth: int, websocket_manager: Optional[WebSocketManager] = None) -> List[Dict[str, str]]:
+    """
+    Collect relationships in both directions, picking the cheaper traversal.
+
+    Shallow or very bushy trees are walked generation by generation with
+    batched entity fetches; deep trees of moderate size are pulled with
+    bounded SPARQL queries, falling back to entity mode if those fail. A
+    root with a cached sweep always goes through entity mode, which replays
+    the cached generations and only expands the ones beyond them.
+    """
+    entity_store = {}
+    root = (await fetch_entities([qid], entity_store)).get(qid)
+    index = get_kinship_index()
+    cached = tree_cache.get(qid)
+    if cached is not None and cached.sweep.levels:
+        mode = "entity"
+    elif index is not None and qid in index:
+        mode = "entity"  # a locally indexed tree costs no network round trips in entity mode
+    else:
+        mode = choose_traversal_mode(root, depth)
+    print(f"Traversal mode for '{qid}' at depth {depth}: {mode}")
+
+    if mode == "sparql":
+        try:
+            return await collect_relationships_sparql(qid, depth, websocket_manager, entity_store)
+        except Exception as e:
+            print(f"SPARQL traversal failed for '{qid}', falling back to entity mode: {e}")
+
+    return await collect_bidirectional_relationships(qid, depth, websocket_manager, entity_store)
 
 async def check_wikipedia_tree(page_title: str) -> bool:
-    """Check if Wikipedia page contains family tree templates."""
-    try:
-        params = {
-            "action": "parse",
-            "page": page_title,
-            "prop": "wikitext",
-            "format": "json",
-        }
-        response = requests.get(WIKIPEDIA_API, params=params).json()
-        if "parse" in response and "wikitext" in response["parse"]:
-            text = response["parse"]["wikitext"]["*"]
-            needles = ["{{Family tree", "{{Tree chart", "{{Ahnentafel", "{{Chart top"]
-            return any(n.lower() in text.lower() for n in needles)
-    except:
-        pass
-    return False
\ No newline at end of file
+    """Check if Wikipedia page contains family tree templates (titles only, no page text)."""
+    return await template_tree_extractor.check_wikipedia_tree(page_title)
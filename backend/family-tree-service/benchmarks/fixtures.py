@@ -0,0 +1,91 @@
+import gzip
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+UPSTREAMS = ("wikidata", "sparql", "wikipedia")
+
+# Parameters that differ between runs without changing the answer
+VOLATILE_PARAMS = {"maxlag"}
+
+
+def request_key(params: Optional[Dict[str, Any]]) -> str:
+    """Stable key for a recorded request."""
+    items = sorted((k, " ".join(str(v).split())) for k, v in (params or {}).items() if k not in VOLATILE_PARAMS)
+    return json.dumps(items)
+
+
+class FixtureStore:
+    """
+    Upstream responses recorded for the benchmark seeds.
+
+    Wikidata wbgetentities answers are stored per entity, so a replay can
+    serve any batching of the same people (and any props subset of what was
+    recorded); every other response is stored under its exact parameters.
+    """
+
+    def __init__(self):
+        self.entities: Dict[str, dict] = {}
+        self.responses: Dict[str, Dict[str, Any]] = {upstream: {} for upstream in UPSTREAMS}
+
+    def record(self, upstream: str, params: Optional[Dict[str, Any]], data: Any):
+        params = params or {}
+        if upstream == "wikidata" and params.get("action") == "wbgetentities":
+            for qid, entity in (data or {}).get("entities", {}).items():
+                self.entities.setdefault(qid, {}).update(entity)
+            return
+        self.responses[upstream][request_key(params)] = data
+
+    def response(self, upstream: str, params: Dict[str, Any]) -> Optional[Any]:
+        """The recorded answer for a request, or None if it was never recorded."""
+        if upstream == "wikidata" and params.get("action") == "wbgetentities":
+            return self._entities_response(params)
+        return self.responses[upstream].get(request_key(params))
+
+    def _entities_response(self, params: Dict[str, Any]) -> Optional[dict]:
+        props = set(params.get("props", "").split("|"))
+        entities = {}
+        for qid in params.get("ids", "").split("|"):
+            doc = self.entities.get(qid)
+            if doc is None or any(prop in props and prop not in doc and "missing" not in doc for prop in ("claims", "labels")):
+                return None
+            if "missing" in doc:
+                entities[qid] = doc
+                continue
+            entry = {key: doc[key] for key in ("id", "type") if key in doc}
+            if "info" in props and "lastrevid" in doc:
+                entry["lastrevid"] = doc["lastrevid"]
+            for prop in ("claims", "labels"):
+                if prop in props:
+                    entry[prop] = doc[prop]
+            entities[qid] = entry
+        return {"entities": entities}
+
+    def merge(self, other: "FixtureStore"):
+        for qid, entity in other.entities.items():
+            self.entities.setdefault(qid, {}).update(entity)
+        for upstream, responses in other.responses.items():
+            self.responses[upstream].update(responses)
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump({"entities": self.entities, "responses": self.responses}, f)
+
+    @classmethod
+    def load(cls, paths: List[str]) -> "FixtureStore":
+        store = cls()
+        for path in paths:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+            part = cls()
+            part.entities = data["entities"]
+            part.responses.update(data["responses"])
+            store.merge(part)
+        return store
+
+
+def fixture_path(seed_name: str, directory: str = FIXTURE_DIR) -> str:
+    return os.path.join(directory, f"{seed_name}.json.gz")
@@ -0,0 +1,137 @@
+import json
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+
+from app.core.config import settings
+from app.core.websocket_manager import dumps
+from app.services import page_cache, template_tree_extractor, traversal_sharing, wikipedia_service
+from app.services.entity_cache import EntityCache
+from app.services.tree_cache import TreeCache
+from benchmarks.seeds import DEPTHS
+
+
+class CountingManager:
+    """Stands in for a client connection; counts the frames and bytes it would receive."""
+
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+
+    async def send_message(self, message: str):
+        self.frames += 1
+        self.bytes += len(message)
+
+    async def send_event(self, event_type: str, data: dict):
+        self.frames += 1
+        self.bytes += len(dumps({"type": event_type, "data": data}))
+
+    async def send_status(self, status: str, progress: int = 0):
+        await self.send_event("status", {"message": status, "progress": progress})
+
+    async def flush(self):
+        pass
+
+    def check_cancelled(self):
+        pass
+
+
+async def _traversal(seed: dict, depth: Optional[int], manager: CountingManager) -> List[Any]:
+    return await wikipedia_service.collect_bidirectional_relationships(seed["qid"], depth, manager)
+
+
+async def _expand_by_qid(seed: dict, depth: Optional[int], manager: CountingManager) -> List[Any]:
+    return await wikipedia_service.fetch_relationships_by_qid(
+        seed["qid"], depth, manager, seed["title"], use_llm_enrichment=False
+    )
+
+
+async def _template(seed: dict, depth: Optional[int], manager: CountingManager) -> List[Any]:
+    return await template_tree_extractor.extract_relationships_from_page_streaming(seed["title"], manager)
+
+
+# name -> (coroutine, depths it runs at); the template extractor has no depth
+SCENARIOS: Dict[str, tuple] = {
+    "collect_bidirectional_relationships": (_traversal, DEPTHS),
+    "fetch_relationships_by_qid": (_expand_by_qid, DEPTHS),
+    "extract_relationships_from_page_streaming": (_template, (None,)),
+}
+
+
+def scenarios_for(seeds: List[dict], names: List[str], depths: Optional[List[int]] = None) -> Iterator[tuple]:
+    """(scenario name, function, seed, depth) for every run a benchmark or recording makes."""
+    for seed in seeds:
+        for name in names or SCENARIOS:
+            function, scenario_depths = SCENARIOS[name]
+            for depth in scenario_depths:
+                if depth is not None and depths and depth not in depths:
+                    continue
+                yield name, function, seed, depth
+
+
+@contextmanager
+def benchmark_settings(keep_rate_limits: bool = False):
+    """Settings for reproducible runs: no offline index, no traversal budgets and, unless asked, no throttling."""
+    overrides = {"KINSHIP_INDEX_PATH": "", "TRAVERSAL_MAX_NODES": 0, "TRAVERSAL_DEADLINE": 0}
+    if not keep_rate_limits:
+        overrides.update({"UPSTREAM_RATE_LIMIT": 1e6, "SPARQL_RATE_LIMIT": 1e6, "UPSTREAM_BURST": 1_000_000})
+    saved = {key: getattr(settings, key) for key in overrides}
+    for key, value in overrides.items():
+        setattr(settings, key, value)
+    try:
+        yield
+    finally:
+        for key, value in saved.items():
+            setattr(settings, key, value)
+
+
+@contextmanager
+def redirected(urls: Dict[str, str]) -> Iterator[None]:
+    """Point the services at the stub server instead of the real upstreams."""
+    targets = [
+        (wikipedia_service, "WIKIDATA_API", urls["wikidata"]),
+        (wikipedia_service, "SPARQL_API", urls["sparql"]),
+        (wikipedia_service, "WIKIPEDIA_API", urls["wikipedia"]),
+        (template_tree_extractor, "WIKIPEDIA_API_URL", urls["wikipedia"]),
+        (page_cache, "WIKIPEDIA_API_URL", urls["wikipedia"]),
+    ]
+    saved = [(module, name, getattr(module, name)) for module, name, _ in targets]
+    for module, name, url in targets:
+        setattr(module, name, url)
+    try:
+        yield
+    finally:
+        for module, name, url in saved:
+            setattr(module, name, url)
+
+
+@contextmanager
+def cold_caches() -> Iterator[None]:
+    """Run with nothing cached, so a run measures the traversal rather than earlier runs; the caches are put back after."""
+    empty = [
+        (wikipedia_service, "entity_cache", EntityCache("", ttl=0, enabled=False)),
+        (wikipedia_service, "tree_cache", TreeCache(max_bytes=0, ttl=0)),
+        (page_cache, "pages", page_cache.PageCache("", max_entries=0, revalidate_after=0, enabled=False)),
+        (template_tree_extractor, "_templates_by_revision", OrderedDict()),
+        (traversal_sharing, "_in_flight", {}),
+    ]
+    saved = [(module, name, getattr(module, name)) for module, name, _ in empty]
+    for module, name, value in empty:
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for module, name, value in saved:
+            setattr(module, name, value)
+
+
+async def run_once(function: Callable[..., Awaitable[List[Any]]], seed: dict, depth: Optional[int]) -> Dict[str, int]:
+    manager = CountingManager()
+    with cold_caches():
+        result = await function(seed, depth, manager)
+    return {"relationships": len(result or []), "frames": manager.frames, "frame_bytes": manager.bytes}
+
+
+def load_results(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
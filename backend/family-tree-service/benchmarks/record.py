@@ -0,0 +1,68 @@
+import argparse
+import asyncio
+from typing import List, Optional
+
+from app.core import http_client
+from app.core.config import settings
+from app.services import page_cache, template_tree_extractor, wikipedia_service
+from benchmarks.fixtures import FIXTURE_DIR, FixtureStore, fixture_path
+from benchmarks.harness import SCENARIOS, benchmark_settings, run_once, scenarios_for
+from benchmarks.seeds import select_seeds
+
+
+def _upstream_for(url: str) -> str:
+    if url == settings.SPARQL_API:
+        return "sparql"
+    if url == settings.WIKIDATA_QUERY_API:
+        return "wikidata"
+    if url == settings.WIKIPEDIA_API:
+        return "wikipedia"
+    raise ValueError(f"Not a recorded upstream: {url}")
+
+
+async def record(seeds: List[dict], scenarios: List[str], depths: Optional[List[int]] = None, fixture_dir: str = FIXTURE_DIR):
+    """Run every scenario against the live APIs and save what they answered, one fixture file per seed."""
+    modules = (wikipedia_service, template_tree_extractor, page_cache)
+    originals = {module: module.get_json for module in modules}
+    try:
+        for seed in seeds:
+            store = FixtureStore()
+
+            def recorder(get_json):
+                async def recording_get_json(url, params=None, headers=None, **kwargs):
+                    data = await get_json(url, params=params, headers=headers, **kwargs)
+                    store.record(_upstream_for(url), params, data)
+                    return data
+                return recording_get_json
+
+            for module, get_json in originals.items():
+                module.get_json = recorder(get_json)
+            # Live APIs: keep the usual rate limits
+            with benchmark_settings(keep_rate_limits=True):
+                for name, function, _, depth in scenarios_for([seed], scenarios, depths):
+                    print(f"recording {name} for {seed['name']} at depth {depth}")
+                    await run_once(function, seed, depth)
+
+            path = fixture_path(seed["name"], fixture_dir)
+            store.save(path)
+            print(f"{path}: {len(store.entities)} entities, "
+                  + ", ".join(f"{len(r)} {upstream} responses" for upstream, r in store.responses.items()))
+    finally:
+        for module, get_json in originals.items():
+            module.get_json = get_json
+        await http_client.close_session()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record live Wikidata, SPARQL and Wikipedia responses for the benchmark seeds.")
+    parser.add_argument("--seeds", nargs="*", default=[], help="seed names (default: all)")
+    parser.add_argument("--scenarios", nargs="*", default=[], choices=list(SCENARIOS), help="default: all")
+    parser.add_argument("--depths", nargs="*", type=int, default=[], help="default: all benchmark depths")
+    parser.add_argument("--fixtures", default=FIXTURE_DIR, help="fixture directory")
+    args = parser.parse_args()
+
+    asyncio.run(record(select_seeds(args.seeds), args.scenarios, args.depths, args.fixtures))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from app.core import http_client
+from benchmarks.fixtures import FIXTURE_DIR, FixtureStore, fixture_path
+from benchmarks.harness import SCENARIOS, benchmark_settings, load_results, redirected, run_once, scenarios_for
+from benchmarks.seeds import select_seeds
+from benchmarks.stub_server import StubServer
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+async def benchmark(
+    seeds: List[dict],
+    scenarios: List[str],
+    depths: Optional[List[int]] = None,
+    latency: float = 0.05,
+    jitter: float = 0.02,
+    repeat: int = 3,
+    keep_rate_limits: bool = False,
+    fixture_dir: str = FIXTURE_DIR,
+) -> dict:
+    """
+    Replay the recorded fixtures through the stub server and measure every scenario.
+
+    Wall time is the median of `repeat` cold runs. Upstream calls and bytes
+    come from the last of them; peak memory from one extra run under
+    tracemalloc, which would otherwise distort the timings.
+    """
+    paths = [fixture_path(seed["name"], fixture_dir) for seed in seeds]
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        raise SystemExit(f"Missing fixtures, record them first with `python -m benchmarks.record`: {', '.join(missing)}")
+
+    server = StubServer(FixtureStore.load(paths), latency, jitter)
+    await server.start()
+    results = []
+    try:
+        with benchmark_settings(keep_rate_limits), redirected(server.urls()):
+            for name, function, seed, depth in scenarios_for(seeds, scenarios, depths):
+                walls = []
+                for _ in range(repeat):
+                    server.reset()
+                    started = time.perf_counter()
+                    outcome = await run_once(function, seed, depth)
+                    walls.append(time.perf_counter() - started)
+                calls, transferred, misses = dict(server.calls), dict(server.bytes), dict(server.misses)
+
+                tracemalloc.start()
+                try:
+                    await run_once(function, seed, depth)
+                    _, peak = tracemalloc.get_traced_memory()
+                finally:
+                    tracemalloc.stop()
+
+                walls.sort()
+                result = {
+                    "scenario": name,
+                    "seed": seed["name"],
+                    "depth": depth,
+                    "wall_seconds": round(walls[len(walls) // 2], 4),
+                    "wall_seconds_min": round(walls[0], 4),
+                    "upstream_calls": calls,
+                    "upstream_bytes": transferred,
+                    "unrecorded_calls": misses,
+                    "peak_memory_bytes": peak,
+                    **outcome,
+                }
+                results.append(result)
+                print(
+                    f"{name:42} {seed['name']:16} depth={depth!s:4} "
+                    f"{result['wall_seconds']:8.3f}s {sum(calls.values()):5} calls "
+                    f"{peak / 1024 / 1024:7.1f} MiB {outcome['relationships']:6} relationships"
+                    + (f"  ({sum(misses.values())} unrecorded)" if misses else "")
+                )
+    finally:
+        await server.stop()
+        await http_client.close_session()
+
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {"latency": latency, "jitter": jitter, "repeat": repeat, "keep_rate_limits": keep_rate_limits},
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict):
+    """Print how each run changed against a baseline results file."""
+    def key(result):
+        return result["scenario"], result["seed"], result["depth"]
+
+    before = {key(result): result for result in baseline["results"]}
+    print(f"\n{'scenario':42} {'seed':16} {'depth':5} {'wall':>9} {'calls':>9} {'peak mem':>9}")
+    for result in current["results"]:
+        old = before.get(key(result))
+        if old is None:
+            continue
+        wall = result["wall_seconds"] / old["wall_seconds"] if old["wall_seconds"] else 0.0
+        calls = sum(result["upstream_calls"].values()) - sum(old["upstream_calls"].values())
+        memory = result["peak_memory_bytes"] / old["peak_memory_bytes"] if old["peak_memory_bytes"] else 0.0
+        print(f"{result['scenario']:42} {result['seed']:16} {result['depth']!s:5} {wall:8.2f}x {calls:+9} {memory:8.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the family traversal engine against recorded upstream responses.")
+    parser.add_argument("--seeds", nargs="*", default=[], help="seed names (default: all)")
+    parser.add_argument("--scenarios", nargs="*", default=[], choices=list(SCENARIOS), help="default: all")
+    parser.add_argument("--depths", nargs="*", type=int, default=[], help="default: all recorded depths")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every upstream response")
+    parser.add_argument("--jitter", type=float, default=0.02, help="uniform +- jitter on the latency, in seconds")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per scenario (median is reported)")
+    parser.add_argument("--keep-rate-limits", action="store_true", help="keep the upstream rate limits while replaying")
+    parser.add_argument("--fixtures", default=FIXTURE_DIR, help="fixture directory")
+    parser.add_argument("--out", help="results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    results = asyncio.run(benchmark(
+        select_seeds(args.seeds), args.scenarios, args.depths, args.latency, args.jitter,
+        args.repeat, args.keep_rate_limits, args.fixtures,
+    ))
+
+    out = args.out or os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {out}")
+
+    if args.baseline:
+        compare(results, load_results(args.baseline))
+
+
+if __name__ == "__main__":
+    main()
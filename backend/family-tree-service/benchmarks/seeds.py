@@ -0,0 +1,23 @@
+from typing import Dict, List
+
+# People the benchmarks are recorded for: wide royal trees, a large family and sparse entries
+SEEDS: List[Dict[str, str]] = [
+    {"name": "queen_victoria", "qid": "Q9439", "title": "Queen Victoria", "kind": "monarch"},
+    {"name": "louis_xiv", "qid": "Q7742", "title": "Louis XIV", "kind": "monarch"},
+    {"name": "elizabeth_ii", "qid": "Q9682", "title": "Elizabeth II", "kind": "monarch"},
+    {"name": "albert_einstein", "qid": "Q937", "title": "Albert Einstein", "kind": "large family"},
+    {"name": "douglas_adams", "qid": "Q42", "title": "Douglas Adams", "kind": "sparse"},
+]
+
+DEPTHS = (1, 2, 3)
+
+
+def select_seeds(names: List[str]) -> List[Dict[str, str]]:
+    """The seeds with the given names, or all of them."""
+    if not names:
+        return SEEDS
+    by_name = {seed["name"]: seed for seed in SEEDS}
+    unknown = [name for name in names if name not in by_name]
+    if unknown:
+        raise SystemExit(f"Unknown seeds: {', '.join(unknown)} (known: {', '.join(by_name)})")
+    return [by_name[name] for name in names]
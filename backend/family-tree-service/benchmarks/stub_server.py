@@ -0,0 +1,89 @@
+import asyncio
+import json
+import random
+from collections import Counter
+from typing import Dict, Optional
+
+from aiohttp import web
+
+from app.core import metrics
+from app.core.config import settings
+from benchmarks.fixtures import FixtureStore
+
+# Where each upstream is served on the stub, and the real URL it stands in for
+UPSTREAM_PATHS = {
+    "wikidata": "/wikidata/w/api.php",
+    "sparql": "/sparql",
+    "wikipedia": "/wikipedia/w/api.php",
+}
+REAL_URLS = {
+    "wikidata": settings.WIKIDATA_QUERY_API,
+    "sparql": settings.SPARQL_API,
+    "wikipedia": settings.WIKIPEDIA_API,
+}
+
+
+class StubServer:
+    """
+    Local HTTP server answering Wikidata, SPARQL and Wikipedia calls from recorded fixtures.
+
+    Every response is delayed by `latency` seconds plus uniform jitter of up
+    to +-`jitter`, drawn from a seeded generator so runs are comparable.
+    Calls, bytes and unrecorded requests (answered with 404) are counted per
+    call kind, named as in app.core.metrics.
+    """
+
+    def __init__(self, fixtures: FixtureStore, latency: float = 0.0, jitter: float = 0.0, seed: int = 0):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.calls: Counter = Counter()
+        self.bytes: Counter = Counter()
+        self.misses: Counter = Counter()
+        self.base_url: Optional[str] = None
+        self._runner: Optional[web.AppRunner] = None
+
+    def urls(self) -> Dict[str, str]:
+        return {upstream: self.base_url + path for upstream, path in UPSTREAM_PATHS.items()}
+
+    def reset(self):
+        self.calls.clear()
+        self.bytes.clear()
+        self.misses.clear()
+
+    async def start(self) -> str:
+        app = web.Application()
+        for upstream, path in UPSTREAM_PATHS.items():
+            app.router.add_get(path, self._handler(upstream))
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+        return self.base_url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _handler(self, upstream: str):
+        async def handle(request: web.Request) -> web.Response:
+            params = dict(request.query)
+            kind = metrics.classify(REAL_URLS[upstream], params)
+            delay = self.latency + self.random.uniform(-self.jitter, self.jitter)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            self.calls[kind] += 1
+            data = self.fixtures.response(upstream, params)
+            if data is None:
+                self.misses[kind] += 1
+                return web.json_response({"error": {"code": "not-recorded", "info": "No fixture for this request"}}, status=404)
+            body = json.dumps(data).encode()
+            self.bytes[kind] += len(body)
+            return web.Response(body=body, content_type="application/json")
+
+        return handle
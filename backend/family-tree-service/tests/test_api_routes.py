@@ -1,4 +1,3 @@
-import asyncio
 from datetime import datetime
 from fastapi.testclient import TestClient
 import pytest
@@ -20,6 +19,13 @@ def test_root_healthcheck(client):
     assert response.json() == {"message": "Backend is Working"}
 
 
+def test_metrics_endpoint_serves_prometheus_text(client):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE family_upstream_calls_total counter" in response.text
+
+
 def test_get_relationships_uses_service(monkeypatch, client):
     sample = [
         {"entity1": "Alice", "relationship": "child of", "entity2": "Bob"},
@@ -65,10 +71,10 @@ def test_classify_relationships_endpoint(monkeypatch, client):
         {"entity1": "Dana", "relationship": "child of", "entity2": "Eli", "classification": "BIOLOGICAL"}
     ]
 
-    async def fake_thread_runner(func, relationships):
+    async def fake_classify(relationships):
         return sample_response
 
-    monkeypatch.setattr(asyncio, "to_thread", fake_thread_runner)
+    monkeypatch.setattr("app.api.routes.classify_relationships", fake_classify)
 
     payload = {"relationships": [{"entity1": "Dana", "relationship": "child of", "entity2": "Eli"}]}
     response = client.post("/classify-relationships", json=payload)
@@ -77,3 +83,25 @@ def test_classify_relationships_endpoint(monkeypatch, client):
     assert body["success"] is True
     assert body["total"] == 1
     assert body["relationships"] == sample_response
+
+
+def test_ws_expand_by_qid_finishes_every_request_it_starts(monkeypatch, client):
+    from app.core import metrics
+
+    started, finished = [], []
+    real_start = metrics.start_request
+    monkeypatch.setattr(metrics, "start_request", lambda name: started.append(name) or real_start(name))
+    monkeypatch.setattr(metrics, "finish_request", lambda request: finished.append(request.name))
+
+    async def failing_fetch(**kwargs):
+        raise RuntimeError("upstream down")
+
+    monkeypatch.setattr("app.api.routes.fetch_relationships_by_qid", failing_fetch)
+
+    with client.websocket_connect("/ws/expand-by-qid") as websocket:
+        websocket.send_text("X1,2")
+        assert "Invalid QID" in websocket.receive_json()["data"]["message"]
+        websocket.send_text("Q1,2")
+        assert websocket.receive_json() == {"type": "error", "data": {"message": "upstream down"}}
+
+    assert started == finished == ["expand_by_qid"]
@@ -0,0 +1,55 @@
+import asyncio
+
+from app.services import page_cache, wikipedia_service
+from benchmarks import record, run
+
+
+def _claims(prop, *values):
+    return {prop: [{"mainsnak": {"snaktype": "value", "datavalue": {"value": v}}} for v in values]}
+
+
+def _human(qid, label, **links):
+    claims = _claims("P31", {"id": "Q5"})
+    for prop, targets in links.items():
+        claims.update(_claims(prop, *({"id": t} for t in targets)))
+    return {"id": qid, "type": "item", "claims": claims, "labels": {"en": {"language": "en", "value": label}}}
+
+
+PEOPLE = [
+    _human("Q1", "Root", P22=["Q2"], P26=["Q3"], P40=["Q4"]),
+    _human("Q2", "Father", P40=["Q1"]),
+    _human("Q3", "Spouse", P26=["Q1"], P40=["Q4"]),
+    _human("Q4", "Child", P22=["Q1"], P25=["Q3"]),
+]
+
+
+def test_recorded_run_replays_without_misses(tmp_path, monkeypatch):
+    people = {p["id"]: p for p in PEOPLE}
+
+    async def fake_get_json(url, params=None, headers=None, **kwargs):
+        if params.get("action") == "wbgetentities":
+            return {"entities": {qid: people[qid] for qid in params["ids"].split("|")}}
+        return {"results": {"bindings": []}}
+
+    seed = {"name": "root", "qid": "Q1", "title": "Root", "kind": "test"}
+    monkeypatch.setattr(wikipedia_service, "get_json", fake_get_json)
+    asyncio.run(record.record([seed], ["collect_bidirectional_relationships"], [1, 2], str(tmp_path)))
+    assert wikipedia_service.get_json is fake_get_json
+    monkeypatch.undo()  # replay goes through the real client to the stub server
+    caches = (wikipedia_service.entity_cache, wikipedia_service.tree_cache, page_cache.pages)
+
+    report = asyncio.run(run.benchmark(
+        [seed], ["collect_bidirectional_relationships"], [1, 2],
+        latency=0, jitter=0, repeat=1, fixture_dir=str(tmp_path),
+    ))
+
+    results = {r["depth"]: r for r in report["results"]}
+    assert set(results) == {1, 2}
+    for result in results.values():
+        assert result["unrecorded_calls"] == {}
+        assert result["upstream_calls"]["wikidata_entities"] > 0
+        assert result["relationships"] > 0 and result["frames"] > 0
+        assert result["peak_memory_bytes"] > 0
+    assert results[2]["relationships"] >= results[1]["relationships"]
+    # Runs start cold, but the service's own caches are back afterwards
+    assert (wikipedia_service.entity_cache, wikipedia_service.tree_cache, page_cache.pages) == caches
@@ -0,0 +1,383 @@
+import asyncio
+import json
+import re
+
+import pytest
+
+from app.services import wikipedia_service
+from app.services.entity_cache import EntityCache, EntityRecord
+from app.services.tree_cache import TreeCache
+
+
+def _claim(*qids):
+    return [
+        {"mainsnak": {"snaktype": "value", "datavalue": {"value": {"id": qid}}}}
+        for qid in qids
+    ]
+
+
+def _person(qid, label, father=None, mother=None, spouses=(), children=(), born=None):
+    claims = {}
+    if born:
+        claims["P569"] = [{"mainsnak": {"snaktype": "value", "datavalue": {"value": {"time": born}}}}]
+    if father:
+        claims["P22"] = _claim(father)
+    if mother:
+        claims["P25"] = _claim(mother)
+    if spouses:
+        claims["P26"] = _claim(*spouses)
+    if children:
+        claims["P40"] = _claim(*children)
+    return {"id": qid, "lastrevid": 100, "labels": {"en": {"language": "en", "value": label}}, "claims": claims}
+
+
+# Root Q1 (married to Q5) with parents Q2/Q3, grandfather Q4, children Q6/Q7, grandchild Q8
+FAMILY = {
+    "Q1": _person("Q1", "Root", father="Q2", mother="Q3", spouses=["Q5"], children=["Q6", "Q7"]),
+    "Q2": _person("Q2", "Father", father="Q4", spouses=["Q3"], children=["Q1"]),
+    "Q3": _person("Q3", "Mother", spouses=["Q2"], children=["Q1"]),
+    "Q4": _person("Q4", "Grandfather", children=["Q2"], born="+1900-01-01T00:00:00Z"),
+    "Q5": _person("Q5", "Spouse", spouses=["Q1"], children=["Q6", "Q7"]),
+    "Q6": _person("Q6", "Child A", father="Q1", mother="Q5", children=["Q8"]),
+    "Q7": _person("Q7", "Child B", father="Q1", mother="Q5"),
+    "Q8": _person("Q8", "Grandchild", father="Q6"),
+}
+
+
+def _entity_binding(qid):
+    return {"value": f"http://www.wikidata.org/entity/{qid}"}
+
+
+def _traversal_bindings(query):
+    """Edge rows for every FAMILY member; the traversal itself enforces the depth."""
+    up = "wdt:P22 wdt:P25 wdt:P26" in query
+    props = ("P22", "P25", "P26") if up else ("P26", "P40")
+    rows = []
+    for qid, person in FAMILY.items():
+        claims = person["claims"]
+        for prop in props:
+            for claim in claims.get(prop, []):
+                other = claim["mainsnak"]["datavalue"]["value"]["id"]
+                rows.append({
+                    "person": _entity_binding(qid),
+                    "prop": {"value": f"http://www.wikidata.org/prop/direct/{prop}"},
+                    "other": _entity_binding(other),
+                    "personLabel": {"value": person["labels"]["en"]["value"]},
+                    "otherLabel": {"value": FAMILY[other]["labels"]["en"]["value"]},
+                })
+                if prop == "P40":
+                    child_parents = {
+                        c["mainsnak"]["datavalue"]["value"]["id"]
+                        for p in ("P22", "P25") for c in FAMILY[other]["claims"].get(p, [])
+                    }
+                    for spouse in claims.get("P26", []):
+                        spouse_qid = spouse["mainsnak"]["datavalue"]["value"]["id"]
+                        if spouse_qid in child_parents:
+                            rows.append({**rows[-1], "via": _entity_binding(spouse_qid)})
+    return rows
+
+
+class RecordingManager:
+    """Stands in for WebSocketManager and keeps every frame sent."""
+
+    def __init__(self):
+        self.messages = []
+
+    async def send_message(self, message: str):
+        self.messages.append(json.loads(message))
+
+    async def send_event(self, event_type: str, data: dict):
+        self.messages.append({"type": event_type, "data": data})
+
+    def check_cancelled(self):
+        pass
+
+
+@pytest.fixture
+def entity_cache(tmp_path, monkeypatch):
+    cache = EntityCache(str(tmp_path / "entities.sqlite3"), ttl=3600)
+    monkeypatch.setattr(wikipedia_service, "entity_cache", cache)
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def tree_cache(monkeypatch):
+    cache = TreeCache(max_bytes=1024 * 1024, ttl=3600)
+    monkeypatch.setattr(wikipedia_service, "tree_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def fake_wikidata(monkeypatch, entity_cache, tree_cache):
+    calls = []
+
+    async def fake_get_json(url, params=None, headers=None, **kwargs):
+        calls.append(dict(params or {}))
+        if params and params.get("action") == "wbgetentities":
+            ids = params["ids"].split("|")
+            return {"entities": {
+                qid: FAMILY.get(qid, {"id": qid, "missing": ""}) for qid in ids
+            }}
+        if "?prop" in params["query"]:
+            return {"results": {"bindings": _traversal_bindings(params["query"])}}
+        # SPARQL personal details: only the spouse has a recorded birth date
+        people = re.findall(r"wd:(Q\d+)", params["query"])
+        bindings = [{"person": {"value": f"http://www.wikidata.org/entity/{qid}"}} for qid in people]
+        for binding in bindings:
+            if binding["person"]["value"].endswith("/Q5"):
+                binding["birthDate"] = {"value": "1950-01-01T00:00:00Z"}
+        return {"results": {"bindings": bindings}}
+
+    monkeypatch.setattr(wikipedia_service, "get_json", fake_get_json)
+    return calls
+
+
+def test_bidirectional_traversal_collects_both_directions(fake_wikidata):
+    relationships = asyncio.run(wikipedia_service.collect_bidirectional_relationships("Q1", 2))
+    triples = {(r["entity1"], r["relationship"], r["entity2"]) for r in relationships}
+
+    assert ("Root", "child of", "Father") in triples
+    assert ("Root", "child of", "Mother") in triples
+    assert ("Father", "child of", "Grandfather") in triples
+    assert ("Root", "spouse of", "Spouse") in triples
+    assert ("Child A", "child of", "Root") in triples
+    assert ("Child A", "child of", "Spouse") in triples
+    assert ("Grandchild", "child of", "Child A") in triples
+    # depth 2 stops before the grandfather's own parents
+    assert all(r["entity1"] != "Grandfather" for r in relationships)
+
+
+def test_traversal_fetches_each_generation_in_one_batch(fake_wikidata):
+    asyncio.run(wikipedia_service.collect_bidirectional_relationships("Q1", 2))
+    entity_calls = [c for c in fake_wikidata if "claims" in c.get("props", "")]
+    requested = [qid for c in entity_calls for qid in c["ids"].split("|")]
+
+    # Every person is downloaded at most once
+    assert len(requested) == len(set(requested))
+    # One round per generation, plus one label batch for spouses
+    assert len([c for c in fake_wikidata if c.get("action") == "wbgetentities"]) <= 6
+
+
+def test_streamed_labels_come_from_downloaded_entities(fake_wikidata):
+    manager = RecordingManager()
+    asyncio.run(wikipedia_service.collect_bidirectional_relationships("Q1", 2, manager))
+
+    label_calls = [c for c in fake_wikidata if c.get("props") == "labels"]
+    downloaded = {qid for c in fake_wikidata if "claims" in c.get("props", "") for qid in c["ids"].split("|")}
+    for call in label_calls:
+        assert not set(call["ids"].split("|")) & downloaded
+
+    streamed = [m["data"] for m in manager.messages if m["type"] == "relationship"]
+    assert {"entity1": "Child B", "relationship": "child of", "entity2": "Spouse"} in streamed
+
+
+def test_personal_details_are_batched_per_generation(fake_wikidata):
+    manager = RecordingManager()
+    asyncio.run(wikipedia_service.collect_bidirectional_relationships("Q1", 2, manager))
+
+    sparql_calls = [c for c in fake_wikidata if "query" in c]
+    details = [m["data"] for m in manager.messages if m["type"] == "personal_details"]
+
+    # Root, then one query per generation that introduced new people (2 up, 2 down)
+    assert len(sparql_calls) <= 5
+    assert sorted(d["qid"] for d in details) == sorted(FAMILY)
+    grandfather = next(d for d in details if d["qid"] == "Q4")
+    assert grandfather["birth_year"] == "1900"
+    # Spouses are never downloaded, so their details come from SPARQL
+    assert next(d for d in details if d["qid"] == "Q5")["birth_year"] == "1950"
+    # People without a birth date still get an entry instead of nothing
+    assert next(d for d in details if d["qid"] == "Q7")["birth_year"] is None
+
+
+def test_single_pass_emits_every_edge_once(fake_wikidata):
+    manager = RecordingManager()
+    relationships = asyncio.run(wikipedia_service.collect_bidirectional_relationships("Q1", 2, manager))
+    triples = [(r["entity1"], r["relationship"], r["entity2"]) for r in relationships]
+
+    # The root's marriage is seen from both directions, the parents' from both spouses
+    assert triples.count(("Root", "spouse of", "Spouse")) == 1
+    assert len([t for t in triples if set(t) == {"Father", "spouse of", "Mother"}]) == 1
+    assert len(triples) == len(set(triples))
+    streamed = [m["data"] for m in manager.messages if m["type"] == "relationship"]
+    assert streamed == relationships
+    # Ancestors and descendants share each round of entity downloads
+    assert len([c for c in fake_wikidata if "claims" in c.get("props", "")]) <= 3
+
+
+def test_budgeted_traversal_pauses_and_continues_without_redoing_work(fake_wikidata, tree_cache, monkeypatch):
+    complete = asyncio.run(wikipedia_service.collect_bidirectional_relationships("Q1", 2))
+    tree_cache.clear()
+    fake_wikidata.clear()
+    monkeypatch.setattr(wikipedia_service.settings, "TRAVERSAL_MAX_NODES", 3)
+
+    first = RecordingManager()
+    partial = asyncio.run(wikipedia_service.collect_bidirectional_relationships("Q1", 2, first))
+    marker = next(m["data"] for m in first.messages if m["type"] == "frontier_remaining")
+    assert marker["reason"] == "max_nodes" and marker["remaining"] > 0
+    assert len(partial) < len(complete)
+
+    second = RecordingManager()
+    rest = asyncio.run(wikipedia_service.continue_family_relationships(marker["token"], second))
+
+    # The two stretches add up to the full tree, closest generation first, nothing sent twice
+    assert partial + rest == complete
+    assert not [m for m in second.messages if m["type"] == "frontier_remaining"]
+    requested = [qid for c in fake_wikidata if "claims" in c.get("props", "") for qid in c["ids"].split("|")]
+    assert len(requested) == len(set(requested))
+
+
+def test_paused_expansion_is_not_reported_complete(fake_wikidata, tree_cache, monkeypatch):
+    monkeypatch.setattr(wikipedia_service.settings, "TRAVERSAL_MAX_NODES", 3)
+    monkeypatch.setattr(wikipedia_service.settings, "TRAVERSAL_MODE", "entity")
+
+    manager = RecordingManager()
+    relationships = asyncio.run(wikipedia_service.fetch_relationships_by_qid("Q1", 2, manager))
+
+    assert relationships.paused == "max_nodes"
+    statuses = [m["data"]["message"] for m in manager.messages if m["type"] == "status"]
+    assert statuses[-1].startswith("Partial tree")
+    assert not [message for message in statuses if "Complete" in message]
+
+
+def test_unknown_continuation_token_reports_an_error(fake_wikidata):
+    manager = RecordingManager()
+    assert asyncio.run(wikipedia_service.continue_family_relationships("nope", manager)) == []
+    assert manager.messages[-1]["type"] == "error"
+
+
+def test_warm_entity_cache_avoids_refetching(fake_wikidata, entity_cache, tree_cache):
+    first = asyncio.run(wikipedia_service.collect_bidirectional_relationships("Q1", 2))
+    fake_wikidata.clear()
+    tree_cache.clear()
+
+    second = asyncio.run(wikipedia_service.collect_bidirectional_relationships("Q1", 2))
+
+    assert second == first
+    assert not [c for c in fake_wikidata if c.get("action") == "wbgetentities"]
+
+
+def test_entities_are_fetched_as_slim_english_records(fake_wikidata, entity_cache):
+    root = dict(FAMILY["Q1"], aliases={"fr": [{"value": "Racine"}]}, sitelinks={"enwiki": {"title": "Root"}})
+    root["claims"] = dict(root["claims"], P1038=_claim("Q9"), P1412=_claim("Q1860"))
+    record = EntityRecord.from_entity(root)
+
+    assert (record.qid, record.label, record.lastrevid) == ("Q1", "Root", 100)
+    assert record.targets("P40") == ("Q6", "Q7") and record.targets("P1038") == ("Q9",)
+    assert not hasattr(record, "__dict__")
+    entity_cache.put_many([record])
+    cached = entity_cache.get_many(["Q1"])[0]["Q1"]
+    assert [getattr(cached, s) for s in record.__slots__] == [getattr(record, s) for s in record.__slots__]
+
+    asyncio.run(wikipedia_service.fetch_entities(["Q2", "Q3"]))
+    fetches = [c for c in fake_wikidata if c.get("action") == "wbgetentities"]
+    assert fetches and all(c["languages"] == "en" and "claims" in c["props"] for c in fetches)
+
+
+def test_stale_entries_are_revalidated_by_revision(fake_wikidata, entity_cache, tree_cache):
+    asyncio.run(wikipedia_service.collect_bidirectional_relationships("Q1", 1))
+    fake_wikidata.clear()
+    tree_cache.clear()
+    entity_cache.ttl = -1  # everything is now stale
+
+    asyncio.run(wikipedia_service.collect_bidirectional_relationships("Q1", 1))
+
+    # Unchanged revisions only cost a props=info check, never a full download
+    assert [c for c in fake_wikidata if c.get("props") == "info"]
+    assert not [c for c in fake_wikidata if "claims" in c.get("props", "")]
+
+
+def test_sparql_traversal_matches_entity_traversal(fake_wikidata):
+    manager = RecordingManager()
+    by_entity = asyncio.run(wikipedia_service.collect_bidirectional_relationships("Q1", 2))
+    by_sparql = asyncio.run(wikipedia_service.collect_relationships_sparql("Q1", 2, manager))
+
+    assert by_sparql == by_entity
+    streamed = [m["data"] for m in manager.messages if m["type"] == "relationship"]
+    assert streamed == by_sparql
+    assert sorted(m["data"]["qid"] for m in manager.messages if m["type"] == "personal_details") == sorted(FAMILY)
+
+
+def test_traversal_mode_follows_depth_and_fan_out():
+    small = EntityRecord.from_entity(FAMILY["Q1"])
+    bushy = EntityRecord.from_entity(_person("Q99", "Bushy", children=[f"Q{n}" for n in range(100, 130)]))
+
+    assert wikipedia_service.choose_traversal_mode(small, 1) == "entity"
+    assert wikipedia_service.choose_traversal_mode(small, 4) == "sparql"
+    assert wikipedia_service.choose_traversal_mode(bushy, 4) == "entity"
+
+
+def test_auto_mode_deepens_a_cached_sparql_tree(fake_wikidata, tree_cache, monkeypatch):
+    monkeypatch.setattr(wikipedia_service.settings, "TRAVERSAL_MODE", "auto")
+    monkeypatch.setattr(wikipedia_service.settings, "SPARQL_TRAVERSAL_MIN_DEPTH", 3)
+
+    shallow = asyncio.run(wikipedia_service.collect_family_relationships("Q1", 3))
+    assert [c for c in fake_wikidata if "?prop" in c.get("query", "")]  # depth 3 went through SPARQL
+    assert tree_cache.get("Q1").sweep.levels == 3
+    fake_wikidata.clear()
+
+    deeper = asyncio.run(wikipedia_service.collect_family_relationships("Q1", 4))
+
+    # Only the generation beyond the cached three is expanded, with entity fetches
+    assert not [c for c in fake_wikidata if "?prop" in c.get("query", "")]
+    requested = {qid for c in fake_wikidata if "claims" in c.get("props", "") for qid in c["ids"].split("|")}
+    assert "Q1" not in requested and "Q2" not in requested
+    assert deeper[:len(shallow)] == shallow
+    tree_cache.clear()
+    assert deeper == asyncio.run(wikipedia_service.collect_bidirectional_relationships("Q1", 4))
+
+
+def test_failed_sparql_traversal_falls_back_to_entities(fake_wikidata, monkeypatch):
+    async def broken(*args, **kwargs):
+        raise RuntimeError("query timeout")
+
+    monkeypatch.setattr(wikipedia_service.settings, "TRAVERSAL_MODE", "sparql")
+    monkeypatch.setattr(wikipedia_service, "collect_relationships_sparql", broken)
+    relationships = asyncio.run(wikipedia_service.collect_family_relationships("Q1", 2))
+
+    assert {"entity1": "Grandchild", "relationship": "child of", "entity2": "Child A"} in relationships
+
+
+class DisconnectingManager(RecordingManager):
+    """Client that goes away after the first few relationships arrive."""
+
+    def check_cancelled(self):
+        if sum(m["type"] == "relationship" for m in self.messages) >= 2:
+            raise asyncio.CancelledError()
+
+
+def test_traversal_stops_once_the_client_is_gone(fake_wikidata):
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(wikipedia_service.collect_bidirectional_relationships("Q1", 3, DisconnectingManager()))
+
+    # Only the root generation was expanded before the checkpoint fired
+    requested = {qid for c in fake_wikidata if "claims" in c.get("props", "") for qid in c["ids"].split("|")}
+    assert "Q4" not in requested
+
+
+def test_cached_tree_answers_shallower_requests_without_upstream_calls(fake_wikidata, tree_cache):
+    fresh = asyncio.run(wikipedia_service.collect_bidirectional_relationships("Q1", 1))
+    tree_cache.clear()
+    asyncio.run(wikipedia_service.collect_bidirectional_relationships("Q1", 2, RecordingManager()))
+    fake_wikidata.clear()
+
+    manager = RecordingManager()
+    shallow = asyncio.run(wikipedia_service.collect_bidirectional_relationships("Q1", 1, manager))
+
+    assert not fake_wikidata
+    assert shallow == fresh
+    # Replayed frames match a fresh traversal, personal details included
+    assert {m["data"]["qid"] for m in manager.messages if m["type"] == "personal_details"} == {"Q1", "Q2", "Q3", "Q5", "Q6", "Q7"}
+
+
+def test_deeper_request_resumes_from_cached_frontier(fake_wikidata):
+    asyncio.run(wikipedia_service.collect_bidirectional_relationships("Q1", 1))
+    fake_wikidata.clear()
+
+    deeper = asyncio.run(wikipedia_service.collect_bidirectional_relationships("Q1", 2))
+
+    requested = {qid for c in fake_wikidata if "claims" in c.get("props", "") for qid in c["ids"].split("|")}
+    # The root generation is not downloaded again
+    assert "Q1" not in requested
+    fresh = asyncio.run(wikipedia_service.collect_bidirectional_relationships("Q1", 2))
+    assert deeper == fresh
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from app.core import http_client
+
+
+def run(coro):
+    async def wrapper():
+        try:
+            return await coro
+        finally:
+            await http_client.close_session()
+    return asyncio.run(wrapper())
+
+
+async def _serve(handler):
+    app = web.Application()
+    app.router.add_get("/api", handler)
+    server = TestServer(app)
+    await server.start_server()
+    return server
+
+
+def test_get_json_retries_transient_errors(monkeypatch):
+    monkeypatch.setattr(http_client.settings, "HTTP_BACKOFF_BASE", 0.01)
+    calls = {"n": 0}
+
+    async def handler(request):
+        calls["n"] += 1
+        if calls["n"] < 3:
+            return web.Response(status=503, headers={"Retry-After": "0"})
+        return web.json_response({"ok": True, "q": request.query["q"]})
+
+    async def scenario():
+        server = await _serve(handler)
+        try:
+            return await http_client.get_json(str(server.make_url("/api")), params={"q": "x"})
+        finally:
+            await server.close()
+
+    assert run(scenario()) == {"ok": True, "q": "x"}
+    assert calls["n"] == 3
+
+
+def test_get_json_does_not_retry_client_errors(monkeypatch):
+    monkeypatch.setattr(http_client.settings, "HTTP_BACKOFF_BASE", 0.01)
+    calls = {"n": 0}
+
+    async def handler(request):
+        calls["n"] += 1
+        return web.Response(status=404, text="missing")
+
+    async def scenario():
+        server = await _serve(handler)
+        try:
+            await http_client.get_json(str(server.make_url("/api")))
+        finally:
+            await server.close()
+
+    with pytest.raises(http_client.UpstreamError) as excinfo:
+        run(scenario())
+    assert excinfo.value.status == 404
+    assert calls["n"] == 1
@@ -0,0 +1,34 @@
+from app.services.kinship_graph import KinshipGraph, Relation
+
+
+def test_edges_are_interned_and_deduplicated():
+    graph = KinshipGraph()
+
+    assert graph.add_edge("Q2", Relation.CHILD_OF, "Q1")
+    assert graph.add_edge("Q1", Relation.SPOUSE_OF, "Q3")
+    assert not graph.add_edge("Q2", Relation.CHILD_OF, "Q1")
+    # A marriage is one edge whichever spouse it is seen from
+    assert not graph.add_edge("Q3", Relation.SPOUSE_OF, "Q1")
+    # Parenthood is directed
+    assert graph.add_edge("Q1", Relation.CHILD_OF, "Q2")
+
+    assert len(graph) == 3
+    assert graph.qids() == ["Q2", "Q1", "Q3"]
+    assert list(graph.edges(2)) == [("Q1", Relation.CHILD_OF, "Q2")]
+
+
+def test_names_are_only_substituted_at_the_wire():
+    graph = KinshipGraph()
+    graph.add_edge("Q2", Relation.CHILD_OF, "Q1")
+    graph.add_edge("Q1", Relation.SPOUSE_OF, "Q3")
+    graph.set_label("Q1", "Root")
+    graph.set_label("Q2", "Q2")  # a label that is just the QID is no label
+    graph.set_details("Q1", {"birth_year": "1950", "death_year": None, "image_url": None})
+
+    assert graph.to_dicts() == [
+        {"entity1": "Q2", "relationship": "child of", "entity2": "Root"},
+        {"entity1": "Root", "relationship": "spouse of", "entity2": "Q3"},
+    ]
+    assert graph.to_dicts(1) == graph.to_dicts()[1:]
+    assert graph.person("Q1").birth_year == "1950"
+    assert graph.person("Q2").label is None
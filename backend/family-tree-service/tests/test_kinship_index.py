@@ -0,0 +1,92 @@
+import asyncio
+import bz2
+import json
+
+import pytest
+
+from app.services import kinship_index, wikipedia_service
+from app.services.entity_cache import EntityCache
+from app.services.tree_cache import TreeCache
+
+
+def _claims(prop, *values):
+    return {prop: [{"mainsnak": {"snaktype": "value", "datavalue": {"value": v}}} for v in values]}
+
+
+def _human(qid, label, **props):
+    claims = _claims("P31", {"id": "Q5"})
+    for prop, targets in props.items():
+        if prop in ("P569", "P570"):
+            claims.update(_claims(prop, {"time": targets}))
+        elif prop == "P18":
+            claims.update(_claims(prop, targets))
+        else:
+            claims.update(_claims(prop, *({"id": t} for t in targets)))
+    entity = {"id": qid, "type": "item", "claims": claims, "labels": {}}
+    if label:
+        entity["labels"]["en"] = {"language": "en", "value": label}
+    return entity
+
+
+DUMP = [
+    _human("Q1", "Root", P22=["Q2"], P26=["Q50"], P40=["Q3"], P569="+1950-05-01T00:00:00Z", P18="Root portrait.jpg"),
+    _human("Q2", "Father", P40=["Q1"]),
+    _human("Q3", "Child", P22=["Q1"]),
+    _human("Q4", None, P22=["Q2"]),  # no English label
+    {"id": "Q60", "type": "item", "claims": _claims("P31", {"id": "Q515"}), "labels": {"en": {"value": "A city"}}},
+    {"id": "P22", "type": "property", "claims": {}, "labels": {"en": {"value": "father"}}},
+]
+
+
+@pytest.fixture
+def index_dir(tmp_path):
+    dump = tmp_path / "latest-all.json.bz2"
+    # Same layout as the official dump: a JSON array with one entity per line
+    lines = ["["] + [json.dumps(e) + "," for e in DUMP[:-1]] + [json.dumps(DUMP[-1]), "]"]
+    with bz2.open(dump, "wt", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+    out = tmp_path / "index"
+    kinship_index.build_index(str(dump), str(out), progress_every=0)
+    return out
+
+
+def test_index_keeps_labelled_humans_and_their_links(index_dir):
+    index = kinship_index.KinshipIndex(str(index_dir))
+
+    assert len(index) == 3
+    assert "Q4" not in index and "Q60" not in index and "Q99" not in index
+    assert index.label("Q2") == "Father"
+
+    root = index.get("Q1")
+    assert root.targets("P22") == ("Q2",)
+    assert root.targets("P26") == ("Q50",)
+    assert wikipedia_service.personal_details_from_entity(root) == {
+        "birth_year": "1950",
+        "death_year": None,
+        "image_url": "http://commons.wikimedia.org/wiki/Special:FilePath/Root%20portrait.jpg",
+    }
+
+
+def test_traversal_is_served_from_index(index_dir, tmp_path, monkeypatch):
+    calls = []
+
+    async def fake_get_json(url, params=None, headers=None, **kwargs):
+        calls.append(dict(params or {}))
+        if params.get("action") == "wbgetentities":
+            # Only the spouse is outside the index
+            return {"entities": {"Q50": {"id": "Q50", "labels": {"en": {"value": "Spouse"}}}}}
+        return {"results": {"bindings": []}}
+
+    monkeypatch.setattr(wikipedia_service.settings, "KINSHIP_INDEX_PATH", str(index_dir))
+    monkeypatch.setattr(wikipedia_service, "get_json", fake_get_json)
+    monkeypatch.setattr(wikipedia_service, "entity_cache", EntityCache(str(tmp_path / "cache.sqlite3"), ttl=3600))
+    monkeypatch.setattr(wikipedia_service, "tree_cache", TreeCache(max_bytes=1024 * 1024, ttl=3600))
+
+    relationships = asyncio.run(wikipedia_service.collect_family_relationships("Q1", 2))
+
+    assert {"entity1": "Root", "relationship": "child of", "entity2": "Father"} in relationships
+    assert {"entity1": "Root", "relationship": "spouse of", "entity2": "Spouse"} in relationships
+    assert {"entity1": "Child", "relationship": "child of", "entity2": "Root"} in relationships
+    # Live Wikidata is only asked about the person missing from the index
+    requested = {qid for c in calls if "ids" in c for qid in c["ids"].split("|")}
+    assert requested == {"Q50"}
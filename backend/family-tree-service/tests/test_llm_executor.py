@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.core import metrics
+from app.core.llm_executor import LLMExecutor, LLMQueueTimeoutError, LLMTimeoutError
+from app.services import relationship_classifier
+from app.services.model_router import ModelRouter
+
+
+def test_calls_run_off_the_loop_within_the_cap():
+    executor = LLMExecutor(max_concurrency=2, timeout=5)
+    active, peak = 0, 0
+    lock = threading.Lock()
+
+    def slow_call(n):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.05)
+        with lock:
+            active -= 1
+        return n
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(ticker())
+        results = await asyncio.gather(*(executor.run("test_llm", slow_call, n) for n in range(6)))
+        task.cancel()
+        return results, ticks
+
+    results, ticks = asyncio.run(scenario())
+    executor.shutdown()
+
+    assert results == list(range(6))
+    assert peak == 2
+    assert ticks >= 10  # the loop kept running while the calls blocked their threads
+    assert metrics.registry.queue_wait["test_llm"].count >= 6
+
+
+def test_timed_out_call_keeps_its_slot_until_it_finishes():
+    executor = LLMExecutor(max_concurrency=1, timeout=0.05)
+    release = threading.Event()
+
+    async def scenario():
+        with pytest.raises(LLMTimeoutError):
+            await executor.run("test_llm", release.wait)
+        assert executor.running == 1
+        # The abandoned call still holds the only slot, so this one times out queueing
+        with pytest.raises(LLMQueueTimeoutError):
+            await executor.run("test_llm", lambda: "late")
+        release.set()
+        await asyncio.sleep(0.05)
+        assert executor.running == 0
+        return await executor.run("test_llm", lambda: "ok")
+
+    assert asyncio.run(scenario()) == "ok"
+    executor.shutdown()
+
+
+def test_fallback_moves_on_without_blocking(monkeypatch):
+    attempts = []
+
+    class FakeModel:
+        def __init__(self, name, generation_config=None):
+            self.name = name
+
+        def generate_content(self, prompt):
+            attempts.append(self.name)
+            if len(attempts) == 1:
+                raise RuntimeError("429 quota exceeded")
+            return type("Response", (), {"text": ' [{"id": 1, "class": "BIOLOGICAL"}] '})()
+
+    monkeypatch.setattr(relationship_classifier.genai, "GenerativeModel", FakeModel)
+    monkeypatch.setattr(relationship_classifier, "llm", LLMExecutor(max_concurrency=1, timeout=5))
+    monkeypatch.setattr(relationship_classifier, "model_router", ModelRouter(relationship_classifier.FALLBACK_MODELS))
+
+    text = asyncio.run(relationship_classifier.generate_with_fallback("prompt"))
+
+    assert text == '[{"id": 1, "class": "BIOLOGICAL"}]'
+    assert attempts == relationship_classifier.FALLBACK_MODELS[:2]
+
+
+def test_queue_timeouts_do_not_count_against_the_model(monkeypatch):
+    attempts = []
+    release = threading.Event()
+
+    class FakeModel:
+        def __init__(self, name, generation_config=None):
+            self.name = name
+
+        def generate_content(self, prompt):
+            attempts.append(self.name)
+            return type("Response", (), {"text": "[]"})()
+
+    executor = LLMExecutor(max_concurrency=1, timeout=5)
+    router = ModelRouter(relationship_classifier.FALLBACK_MODELS, failure_threshold=1)
+    monkeypatch.setattr(relationship_classifier.genai, "GenerativeModel", FakeModel)
+    monkeypatch.setattr(relationship_classifier, "llm", executor)
+    monkeypatch.setattr(relationship_classifier, "model_router", router)
+
+    async def scenario():
+        busy = asyncio.create_task(executor.run("gemini", release.wait))
+        await asyncio.sleep(0.01)
+        with pytest.raises(Exception, match="free slot"):
+            await relationship_classifier.generate_with_fallback("prompt", max_time=0.05)
+        release.set()
+        await busy
+
+    asyncio.run(scenario())
+    executor.shutdown()
+
+    assert attempts == []
+    assert all(h["state"] == "closed" and h["consecutive_failures"] == 0 for h in router.snapshot().values())
@@ -0,0 +1,72 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.services import llm_relationship_extractor as extractor_module
+from app.services.embedding_store import EmbeddingStore
+
+
+def _vector(text):
+    # Family-heavy text points along the query's axis
+    family = sum(text.lower().count(word) for word in ("married", "son", "daughter", "family"))
+    return [float(family), 1.0, 0.0]
+
+
+@pytest.fixture
+def fake_embeddings(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_embed_content(model, content):
+        calls.append(list(content))
+        return {"embedding": [_vector(text) for text in content]}
+
+    store = EmbeddingStore(str(tmp_path / "embeddings.sqlite3"))
+    monkeypatch.setattr(extractor_module.genai, "embed_content", fake_embed_content)
+    monkeypatch.setattr(extractor_module, "embedding_store", store)
+    monkeypatch.setattr(extractor_module, "_query_vector", None)
+    monkeypatch.setattr(extractor_module.settings, "EMBEDDING_BATCH_SIZE", 2)
+    monkeypatch.setattr(extractor_module.settings, "EMBEDDING_BATCH_INTERVAL", 0)
+    monkeypatch.setattr(extractor_module.settings, "LEXICAL_RANK_MARGIN", 0.15)
+    yield calls
+    store.close()
+
+
+def test_chunks_are_embedded_in_batches_once(fake_embeddings, monkeypatch):
+    monkeypatch.setattr(extractor_module.settings, "LEXICAL_RANK_MARGIN", 10)  # never confident
+    chunks = ["He was a painter.", "He married Ann; their son and daughter.", "Family life.", "Career."]
+    extractor = extractor_module.LLMRelationshipExtractor()
+
+    best = asyncio.run(extractor._find_relevant_chunks(chunks, top_k=2))
+    assert best == ["He married Ann; their son and daughter.", "Family life."]
+    # The query once, then the four chunks in batches of two
+    assert [len(batch) for batch in fake_embeddings] == [1, 2, 2]
+
+    fake_embeddings.clear()
+    assert asyncio.run(extractor._find_relevant_chunks(chunks, top_k=2)) == best
+    assert fake_embeddings == []
+
+
+def test_repeated_texts_share_one_embedding(fake_embeddings):
+    matrix = asyncio.run(extractor_module.embed_texts(["same", "same", "other"]))
+
+    assert matrix.shape == (3, 3) and matrix.dtype == np.float32
+    assert fake_embeddings == [["same", "other"]]
+
+
+def test_clear_lexical_ranking_skips_embeddings(fake_embeddings):
+    chunks = [
+        "He studied law in Paris and later taught at the university.",
+        "He married Ann in 1901; their son John and daughter Mary were born in Rome.",
+        "His wife Ann and their children moved to London with her father.",
+        "His paintings are held in several museums.",
+    ]
+    extractor = extractor_module.LLMRelationshipExtractor()
+
+    assert asyncio.run(extractor._find_relevant_chunks(chunks, top_k=2)) == [chunks[2], chunks[1]]
+    assert fake_embeddings == []
+
+    # Two chunks tied for the second place: the embeddings decide
+    ambiguous = chunks[:2] + ["Their son John married.", "Their son Paul married."]
+    asyncio.run(extractor._find_relevant_chunks(ambiguous, top_k=2))
+    assert fake_embeddings
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from app.core import metrics
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    fresh = metrics.MetricsRegistry()
+    monkeypatch.setattr(metrics, "registry", fresh)
+    return fresh
+
+
+def test_calls_are_classified_by_upstream():
+    api = "https://www.wikidata.org/w/api.php"
+    assert metrics.classify(api, {"action": "wbgetentities", "props": "claims|labels|info"}) == "wikidata_entities"
+    assert metrics.classify(api, {"action": "wbgetentities", "props": "labels"}) == "wikidata_labels"
+    assert metrics.classify("https://query.wikidata.org/sparql", {"query": "..."}) == "sparql"
+    assert metrics.classify("https://en.wikipedia.org/w/api.php", {"action": "parse"}) == "wikipedia"
+
+
+def test_calls_are_accounted_to_the_request_that_made_them(registry):
+    async def request_a():
+        request = metrics.start_request("a")
+        metrics.record_call("sparql", 0.2, nbytes=1000)
+        metrics.record_cache("wikidata_entities", hits=3, misses=1)
+        with pytest.raises(RuntimeError):
+            with metrics.track("gemini"):
+                raise RuntimeError("quota")
+        return request
+
+    async def request_b():
+        request = metrics.start_request("b")
+        with metrics.track("gemini") as call:
+            call.nbytes = 42
+        return request
+
+    async def both():
+        return await asyncio.gather(request_a(), request_b())
+
+    a, b = asyncio.run(both())
+
+    summary = a.summary()["upstream"]
+    assert summary["sparql"]["calls"] == 1 and summary["sparql"]["bytes"] == 1000
+    assert summary["wikidata_entities"]["cache_hits"] == 3
+    assert summary["gemini"]["errors"] == 1
+    gemini = b.summary()["upstream"]["gemini"]
+    assert (gemini["calls"], gemini["errors"], gemini["bytes"]) == (1, 0, 42)
+    assert registry.totals["gemini"].calls == 2
+
+
+def test_prometheus_rendering(registry):
+    metrics.record_call("sparql", 0.2, nbytes=1000)
+    metrics.record_call("sparql", 3.0, error=True)
+    metrics.record_cache("tree_cache", hits=1, misses=0)
+
+    text = metrics.render_prometheus()
+
+    assert '# TYPE family_upstream_latency_seconds histogram' in text
+    assert 'family_upstream_calls_total{upstream="sparql"} 2' in text
+    assert 'family_upstream_errors_total{upstream="sparql"} 1' in text
+    assert 'family_upstream_latency_seconds_bucket{upstream="sparql",le="0.25"} 1' in text
+    assert 'family_upstream_latency_seconds_bucket{upstream="sparql",le="+Inf"} 2' in text
+    assert 'family_cache_hits_total{upstream="tree_cache"} 1' in text
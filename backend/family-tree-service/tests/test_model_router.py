@@ -0,0 +1,110 @@
+import asyncio
+
+from app.core.llm_executor import LLMExecutor
+from app.services import relationship_classifier
+from app.services.model_router import CLOSED, HALF_OPEN, OPEN, ModelRouter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_measured_models_go_cheapest_first():
+    router = ModelRouter(["a", "b", "c", "d"], clock=Clock())
+    router.record_success("b", 2.0)
+    router.record_success("c", 0.5)
+
+    # Unmeasured models keep their preference order after the measured ones
+    assert router.order() == ["c", "b", "a", "d"]
+
+
+def test_repeated_failures_open_the_circuit_then_one_probe_closes_it():
+    clock = Clock()
+    router = ModelRouter(["a", "b"], failure_threshold=2, open_seconds=60, clock=clock)
+    router.record_failure("a")
+    assert router.order() == ["a", "b"]
+    router.record_failure("a")
+    assert router.health["a"].state == OPEN
+    assert router.order() == ["b"]
+
+    clock.now += 61
+    assert router.order() == ["a", "b"] and router.is_probe("a")
+    assert router.order() == ["b"]  # the probe is already out
+
+    router.record_success("a", 0.2)
+    assert router.health["a"].state == CLOSED
+    assert router.order()[0] == "a"
+
+
+def test_failed_probe_reopens_for_longer():
+    clock = Clock()
+    router = ModelRouter(["a", "b"], open_seconds=60, max_open_seconds=100, clock=clock)
+    router.record_failure("a", fatal=True)
+
+    clock.now += 60
+    assert router.order()[0] == "a"
+    router.record_failure("a")
+    assert router.health["a"].state == OPEN and router.health["a"].open_for == 100
+
+    clock.now += 99
+    assert router.order() == ["b"]
+    clock.now += 1
+    assert router.order()[0] == "a" and router.health["a"].state == HALF_OPEN
+
+
+def test_fallback_skips_models_with_an_open_circuit(monkeypatch):
+    models = relationship_classifier.FALLBACK_MODELS
+    attempts = []
+
+    class FakeModel:
+        def __init__(self, name, generation_config=None):
+            self.name = name
+
+        def generate_content(self, prompt):
+            attempts.append(self.name)
+            if self.name == models[0]:
+                raise RuntimeError("404 model not found")
+            return type("Response", (), {"text": "[]"})()
+
+    monkeypatch.setattr(relationship_classifier.genai, "GenerativeModel", FakeModel)
+    monkeypatch.setattr(relationship_classifier, "llm", LLMExecutor(max_concurrency=1, timeout=5))
+    monkeypatch.setattr(relationship_classifier, "model_router", ModelRouter(models, clock=Clock()))
+
+    async def scenario():
+        for _ in range(3):
+            assert await relationship_classifier.generate_with_fallback("prompt") == "[]"
+
+    asyncio.run(scenario())
+
+    # The unknown model fails once, then every request goes straight to the working one
+    assert attempts == [models[0], models[1], models[1], models[1]]
+
+
+def test_only_unknown_models_are_fatal():
+    assert relationship_classifier.is_fatal_model_error(relationship_classifier.google_exceptions.NotFound("models/x"))
+    assert relationship_classifier.is_fatal_model_error(RuntimeError("404 models/x is not found for API version v1beta"))
+    assert not relationship_classifier.is_fatal_model_error(relationship_classifier.google_exceptions.ResourceExhausted("quota"))
+    assert not relationship_classifier.is_fatal_model_error(RuntimeError("429 Resource has been exhausted (e.g. check quota)."))
+    assert not relationship_classifier.is_fatal_model_error(RuntimeError("Wikipedia page not found"))
+
+
+def test_all_open_still_probes_the_model_due_soonest():
+    clock = Clock()
+    router = ModelRouter(["a", "b"], open_seconds=60, clock=clock)
+    router.record_failure("b", fatal=True)
+    clock.now += 10
+    router.record_failure("a", fatal=True)
+
+    assert router.order() == ["b"] and router.is_probe("b")
+    router.record_failure("b")
+    assert router.health["b"].open_for == 120
+    # b now waits longer than a, so a is probed next
+    assert router.order() == ["a"]
+
+    router.record_success("a", 0.3)
+    assert router.order() == ["a"]
+    assert router.health["b"].state == OPEN
@@ -0,0 +1,58 @@
+import random
+from difflib import SequenceMatcher
+
+from app.services.name_index import NameIndex, normalize_name
+
+
+def _brute_force_is_duplicate(name, existing_names, threshold=0.85):
+    """The pairwise check NameIndex replaces."""
+    n1 = normalize_name(name)
+    for existing in existing_names:
+        n2 = normalize_name(existing)
+        similarity = SequenceMatcher(None, n1, n2).ratio()
+        if n1 == n2 or ((n1 in n2 or n2 in n1) and similarity >= 0.70) or similarity >= threshold:
+            return True
+    return False
+
+
+FIRST = ["Albert", "Hans", "Eduard", "Mileva", "Elsa", "Ilse", "Margot", "Fanny", "Pauline", "Hermann", "Maja", "Rudolf"]
+LAST = ["Einstein", "Marić", "Koch", "Löwenthal", "Winteler", "Kayser", "Marianoff", "Schweitzer"]
+
+
+def test_matches_the_pairwise_check():
+    rng = random.Random(7)
+    existing = {f"{rng.choice(FIRST)} {rng.choice(LAST)}" for _ in range(60)}
+    index = NameIndex(existing)
+    queries = [f"{rng.choice(FIRST)} {rng.choice(LAST)}" for _ in range(200)]
+    queries += ["ALBERT  einstein", "Hans Albert Einstein", "Doris Aude Ascher Schweitzer", "Bertrand Russell", "Al"]
+
+    for query in queries:
+        assert (index.find_duplicate(query) is not None) == _brute_force_is_duplicate(query, existing), query
+
+
+def test_reports_the_kind_of_duplicate_and_grows():
+    index = NameIndex(["Albert Einstein", "Doris Aude Ascher Schweitzer"])
+
+    assert index.find_duplicate("albert   EINSTEIN") == ("Albert Einstein", "exact", 1.0)
+    assert index.find_duplicate("Albert Einstien")[1] == "fuzzy"
+    assert index.find_duplicate("Bertrand Russell") is None
+
+    index.add("Bertrand Russell")
+    assert "bertrand russell" in index and len(index) == 3
+    assert sorted(index) == ["Albert Einstein", "Bertrand Russell", "Doris Aude Ascher Schweitzer"]
+
+
+def test_lookups_skip_common_grams():
+    index = NameIndex((f"Person {i} Surname{i}" for i in range(5000)), max_postings=64)
+    # " pe", "son", "nam", ... are in every name; only the rarest (digit) grams' postings are read
+    assert len(index._candidates(normalize_name("Person 42 Surname42"), 0.7)) < 300
+    assert index.find_duplicate("person 42 surname42")[0] == "Person 42 Surname42"
+
+
+def test_finds_a_duplicate_that_shares_fewer_grams_than_many_non_duplicates():
+    # Each decoy shares 8 of the query's trigrams, the real duplicate only 7
+    decoys = [f"John Smitz {a}{b}" for a in "abcdefg" for b in "abcdefg"]
+    index = NameIndex(decoys + ["Jon Smith"])
+
+    assert index.find_duplicate("John Smith") == ("Jon Smith", "fuzzy", SequenceMatcher(None, "jon smith", "john smith").ratio())
+    assert _brute_force_is_duplicate("John Smith", decoys + ["Jon Smith"])
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from app.services import page_cache
+
+WIKITEXT = "'''Root''' was a person.\n== Early life ==\nBorn.\n== Family ==\n{{ahnentafel\n|1= 1. Root\n}}\n"
+EXTRACT = "Root was a person.\n\n== Early life ==\nBorn.\n\n=== Childhood ===\nPlayed.\n\n== Family ==\nMarried twice."
+
+
+@pytest.fixture
+def wikipedia(monkeypatch):
+    page = {"revision": 3}
+    calls = []
+
+    async def fake_get_json(url, params=None, headers=None, **kwargs):
+        calls.append(params["prop"])
+        if params["titles"] == "Nobody":
+            return {"query": {"pages": [{"title": "Nobody", "missing": True}]}}
+        entry = {"title": "Root", "lastrevid": page["revision"]}
+        if params["prop"] == "revisions|extracts":
+            entry["revisions"] = [{"revid": page["revision"], "slots": {"main": {"content": WIKITEXT}}}]
+            entry["extract"] = EXTRACT
+        return {"query": {"redirects": [{"from": params["titles"], "to": "Root"}], "pages": [entry]}}
+
+    monkeypatch.setattr(page_cache, "get_json", fake_get_json)
+    return page, calls
+
+
+def test_page_is_split_into_summary_and_sections(wikipedia, tmp_path):
+    cache = page_cache.PageCache(str(tmp_path / "pages.sqlite3"), max_entries=4, revalidate_after=60)
+    page = asyncio.run(cache.get("root"))
+
+    assert (page.title, page.revid, page.wikitext) == ("Root", 3, WIKITEXT)
+    assert page.summary == "Root was a person."
+    assert [(s.level, s.title, s.text) for s in page.sections] == [
+        (2, "Early life", "Born."), (3, "Childhood", "Played."), (2, "Family", "Married twice."),
+    ]
+    assert asyncio.run(cache.get("Nobody")) is None
+
+
+def test_revisions_are_served_from_memory_then_disk(wikipedia, tmp_path):
+    page, calls = wikipedia
+    path = str(tmp_path / "pages.sqlite3")
+    cache = page_cache.PageCache(path, max_entries=4, revalidate_after=60)
+
+    asyncio.run(cache.get("Root"))
+    assert calls == ["info", "revisions|extracts"]
+
+    # Within the revalidation window nothing goes out
+    calls.clear()
+    asyncio.run(cache.get("Root"))
+    assert calls == []
+
+    # A fresh process finds the revision on disk after one info check
+    cache.close()
+    cold = page_cache.PageCache(path, max_entries=4, revalidate_after=60)
+    assert asyncio.run(cold.get("Root")).sections[0].title == "Early life"
+    assert calls == ["info"]
+
+    # A new revision is downloaded again
+    calls.clear()
+    cold.revalidate_after = 0
+    page["revision"] = 4
+    assert asyncio.run(cold.get("Root")).revid == 4
+    assert calls == ["info", "revisions|extracts"]
+    cold.close()
+
+
+def test_revision_checks_are_bounded_like_the_pages(wikipedia, tmp_path):
+    cache = page_cache.PageCache(str(tmp_path / "pages.sqlite3"), max_entries=2, revalidate_after=60)
+
+    for title in ("Root", "root", "ROOT", "Root (person)"):
+        asyncio.run(cache.get(title))
+
+    assert list(cache._latest) == ["ROOT", "Root (person)"]
+    cache.close()
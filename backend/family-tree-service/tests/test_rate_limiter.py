@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from app.core import http_client, rate_limiter
+from app.core.rate_limiter import FairRateLimiter
+
+
+def test_sessions_share_tokens_round_robin():
+    limiter = FairRateLimiter(rate=200, burst=1)
+    granted = []
+
+    async def request(session, n):
+        await limiter.acquire(session)
+        granted.append((session, n))
+
+    async def scenario():
+        crawl = [asyncio.create_task(request("crawl", n)) for n in range(10)]
+        await asyncio.sleep(0)
+        small = asyncio.create_task(request("small", 0))
+        await asyncio.gather(*crawl, small)
+
+    asyncio.run(scenario())
+
+    # The small session is served right after the crawl's next request, not after all ten
+    assert granted.index(("small", 0)) <= 2
+    stats = limiter.snapshot()["sessions"]
+    assert stats["crawl"]["granted"] == 10 and stats["crawl"]["queued"] == 0
+    assert stats["small"]["granted"] == 1
+
+
+def test_pause_holds_every_session():
+    limiter = FairRateLimiter(rate=1000, burst=5)
+
+    async def scenario():
+        limiter.pause(0.1)
+        started = time.monotonic()
+        await limiter.acquire("a")
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) >= 0.09
+
+
+def test_get_json_backs_off_on_maxlag(monkeypatch):
+    monkeypatch.setattr(http_client.settings, "HTTP_BACKOFF_BASE", 0.01)
+    seen = []
+
+    async def handler(request):
+        seen.append(request.query.get("maxlag"))
+        if len(seen) == 1:
+            return web.json_response(
+                {"error": {"code": "maxlag", "info": "Waiting for a database server"}},
+                headers={"Retry-After": "0"},
+            )
+        return web.json_response({"entities": {}})
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_get("/w/api.php", handler)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            return await http_client.get_json(str(server.make_url("/w/api.php")), params={"action": "wbgetentities"})
+        finally:
+            await server.close()
+            await http_client.close_session()
+
+    assert asyncio.run(scenario()) == {"entities": {}}
+    assert seen == [str(http_client.settings.UPSTREAM_MAXLAG)] * 2
+    assert any(host.startswith("127.0.0.1") for host in rate_limiter.snapshot())
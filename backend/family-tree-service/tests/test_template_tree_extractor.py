@@ -0,0 +1,92 @@
+import asyncio
+from collections import OrderedDict
+
+import pytest
+
+from app.services import template_tree_extractor
+
+AHNENTAFEL = """{{ahnentafel
+|1= 1. '''Root'''
+|2= 2. [[Father]]
+|3= 3. [[Mother]]
+}}"""
+
+SECTION = "== Ancestry ==\n" + AHNENTAFEL + "\n"
+
+
+@pytest.fixture
+def wikipedia(monkeypatch):
+    """Fake MediaWiki API for one page with an ahnentafel in its Ancestry section."""
+    page = {"revision": 7, "templates": ["Template:Ahnentafel"]}
+    calls = []
+
+    async def fake_get_json(url, params=None, headers=None, **kwargs):
+        calls.append(dict(params))
+        if params["action"] == "query":
+            if params["titles"] == "Nobody":
+                return {"query": {"pages": [{"title": "Nobody", "missing": True}]}}
+            wanted = params["tltemplates"].split("|")
+            return {"query": {"pages": [{
+                "title": "Root",
+                "lastrevid": page["revision"],
+                "templates": [{"ns": 10, "title": t} for t in page["templates"] if t in wanted],
+            }]}}
+        assert params["oldid"] == page["revision"]
+        if params["prop"] == "sections":
+            return {"parse": {"sections": [
+                {"index": "1", "line": "Early life"},
+                {"index": "2", "line": "Ancestry"},
+            ]}}
+        if params.get("section") == 2:
+            return {"parse": {"wikitext": page.get("section", SECTION), "templates": [
+                {"ns": 10, "title": t} for t in page["templates"]
+            ]}}
+        raise AssertionError(f"unexpected request {params}")
+
+    monkeypatch.setattr(template_tree_extractor, "get_json", fake_get_json)
+    monkeypatch.setattr(template_tree_extractor, "_templates_by_revision", OrderedDict())
+    return page, calls
+
+
+def test_template_is_read_from_its_section_and_cached_per_revision(wikipedia):
+    page, calls = wikipedia
+
+    first = asyncio.run(template_tree_extractor.extract_relationships_from_page("Root"))
+    assert first == [["Root", "child of", "Father"], ["Root", "child of", "Mother"]]
+    assert [c.get("section") for c in calls if c["action"] == "parse" and c["prop"] != "sections"] == [2]
+
+    # Same revision: one small templates query, no page text
+    calls.clear()
+    assert asyncio.run(template_tree_extractor.extract_relationships_from_page("Root")) == first
+    assert [c["action"] for c in calls] == ["query"]
+
+    # A new revision is read again
+    page["revision"] = 8
+    calls.clear()
+    assert asyncio.run(template_tree_extractor.extract_relationships_from_page("Root")) == first
+    assert [c["action"] for c in calls] == ["query", "parse", "parse"]
+
+
+def test_tree_check_needs_only_template_titles(wikipedia):
+    page, calls = wikipedia
+
+    assert asyncio.run(template_tree_extractor.check_wikipedia_tree("Root"))
+    page["templates"] = ["Template:Infobox royalty"]
+    assert not asyncio.run(template_tree_extractor.check_wikipedia_tree("Root"))
+    assert not asyncio.run(template_tree_extractor.check_wikipedia_tree("Nobody"))
+    assert not asyncio.run(template_tree_extractor.get_family_tree_template("Root"))
+    assert {c["action"] for c in calls} == {"query"}
+
+
+def test_indirect_ahnentafel_does_not_download_the_page(wikipedia):
+    page, calls = wikipedia
+    # Transcluded through a wrapper template: no literal ahnentafel anywhere in the page text
+    page["section"] = "== Ancestry ==\n{{Ancestors of Root}}\n"
+    page["templates"] = ["Template:Ancestors of Root", "Template:Ahnentafel"]
+
+    assert asyncio.run(template_tree_extractor.get_family_tree_template("Root")) is None
+    assert [(c["action"], c["prop"], c.get("section")) for c in calls] == [
+        ("query", "info|templates", None),
+        ("parse", "sections", None),
+        ("parse", "wikitext|templates", 2),
+    ]
@@ -0,0 +1,128 @@
+import asyncio
+import json
+
+import pytest
+
+from app.core import metrics, rate_limiter
+from app.services import traversal_sharing
+
+
+class RecordingManager:
+    def __init__(self):
+        self.frames = []
+
+    async def send_message(self, message: str):
+        self.frames.append(json.loads(message))
+
+    async def send_event(self, event_type: str, data: dict):
+        self.frames.append({"type": event_type, "data": data})
+
+    def check_cancelled(self):
+        pass
+
+
+def test_concurrent_requests_share_one_producer():
+    runs = []
+
+    async def produce(channel):
+        runs.append(1)
+        for n in range(4):
+            await channel.send_event("relationship", {"n": n})
+            await asyncio.sleep(0.01)
+        await channel.send_message(json.dumps({"type": "status", "data": {"progress": 100}}))
+        return [{"n": n} for n in range(4)]
+
+    async def scenario():
+        first, second = RecordingManager(), RecordingManager()
+        a = asyncio.create_task(traversal_sharing.run_shared(("Q1", 2, False), produce, first))
+        await asyncio.sleep(0.025)  # join halfway through
+        b = asyncio.create_task(traversal_sharing.run_shared(("Q1", 2, False), produce, second))
+        return await a, await b, first.frames, second.frames
+
+    result_a, result_b, frames_a, frames_b = asyncio.run(scenario())
+
+    assert len(runs) == 1
+    assert result_a == result_b == [{"n": n} for n in range(4)]
+    assert frames_a == frames_b
+    assert [f["type"] for f in frames_a] == ["relationship"] * 4 + ["status"]
+    assert not traversal_sharing._in_flight
+
+
+def test_producer_is_cancelled_when_everyone_leaves():
+    state = {}
+
+    async def produce(channel):
+        try:
+            while True:
+                channel.check_cancelled()
+                await channel.send_event("relationship", {})
+                await asyncio.sleep(0.01)
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+
+    async def scenario():
+        watcher = asyncio.create_task(traversal_sharing.run_shared(("Q2", 3, False), produce, RecordingManager()))
+        await asyncio.sleep(0.03)
+        watcher.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await watcher
+        await asyncio.sleep(0.02)
+
+    asyncio.run(scenario())
+
+    assert state.get("cancelled")
+    assert not traversal_sharing._in_flight
+
+
+def test_producer_work_is_accounted_to_every_subscriber():
+    sessions = []
+
+    async def produce(channel):
+        for _ in range(3):
+            sessions.append(rate_limiter.current_session.get())
+            metrics.record_call("sparql", 0.01, 100)
+            await asyncio.sleep(0.01)
+        return []
+
+    async def subscribe(name, delay):
+        await asyncio.sleep(delay)
+        rate_limiter.current_session.set(name)
+        request = metrics.start_request(name)
+        await traversal_sharing.run_shared(("Q3", 2, False), produce, RecordingManager())
+        return request.summary()["upstream"]
+
+    async def scenario():
+        return await asyncio.gather(subscribe("first", 0), subscribe("second", 0.015))
+
+    first, second = asyncio.run(scenario())
+
+    assert set(sessions) == {"shared:('Q3', 2, False)"}
+    assert first["sparql"]["calls"] == second["sparql"]["calls"] == 3
+    assert second["sparql"]["bytes"] == 300
+
+
+def test_requests_under_different_names_do_not_share(monkeypatch):
+    from app.services import wikipedia_service
+
+    names = []
+
+    async def fake_fetch(qid, depth, channel, entity_name, use_llm_enrichment):
+        names.append(entity_name)
+        await asyncio.sleep(0.02)
+        await channel.send_event("status", {"message": f"Fetching {entity_name}"})
+        return [{"entity1": entity_name}]
+
+    monkeypatch.setattr(wikipedia_service, "_fetch_relationships_by_qid", fake_fetch)
+
+    async def scenario():
+        return await asyncio.gather(
+            wikipedia_service.fetch_relationships_by_qid("Q4", 2, RecordingManager(), "Ann", True),
+            wikipedia_service.fetch_relationships_by_qid("Q4", 2, RecordingManager(), "Anne", True),
+            wikipedia_service.fetch_relationships_by_qid("Q4", 2, RecordingManager(), "Ann", True),
+        )
+
+    first, second, third = asyncio.run(scenario())
+
+    assert sorted(names) == ["Ann", "Anne"]
+    assert first == third == [{"entity1": "Ann"}] and second == [{"entity1": "Anne"}]
@@ -0,0 +1,118 @@
+import asyncio
+import json
+
+import pytest
+
+from app.core.websocket_manager import WebSocketManager
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def send_text(self, message: str):
+        self.frames.append(json.loads(message))
+
+
+def _manager():
+    manager = WebSocketManager()
+    socket = FakeWebSocket()
+    manager.active_connections.append(socket)
+    return manager, socket
+
+
+def _relationship(n):
+    return {"entity1": f"Child {n}", "relationship": "child of", "entity2": "Parent"}
+
+
+def test_events_are_coalesced_and_stay_ahead_of_later_messages():
+    async def scenario():
+        manager, socket = _manager()
+        for n in range(3):
+            await manager.send_event("relationship", _relationship(n))
+        await manager.send_status("done", 100)
+        return socket.frames
+
+    frames = asyncio.run(scenario())
+
+    assert [f["type"] for f in frames] == ["relationships_batch", "status"]
+    assert frames[0]["data"]["events"] == [{"type": "relationship", "data": _relationship(n)} for n in range(3)]
+
+
+def test_batches_flush_on_size_and_interval(monkeypatch):
+    monkeypatch.setattr("app.core.websocket_manager.settings.WS_BATCH_MAX_EVENTS", 2)
+    monkeypatch.setattr("app.core.websocket_manager.settings.WS_BATCH_INTERVAL", 0.01)
+
+    async def scenario():
+        manager, socket = _manager()
+        for n in range(3):
+            await manager.send_event("relationship", _relationship(n))
+        sent_before_interval = len(socket.frames)
+        await asyncio.sleep(0.05)
+        return sent_before_interval, socket.frames
+
+    sent_before_interval, frames = asyncio.run(scenario())
+
+    assert sent_before_interval == 1
+    # The leftover single event goes out as a plain frame once the interval passes
+    assert frames[1] == {"type": "relationship", "data": _relationship(2)}
+
+
+class AcceptingWebSocket(FakeWebSocket):
+    async def accept(self):
+        pass
+
+
+def test_disconnect_cancels_the_connection_task():
+    async def scenario():
+        manager = WebSocketManager()
+        websocket = AcceptingWebSocket()
+        connection_id = await manager.connect(websocket)
+        task = asyncio.create_task(asyncio.sleep(10))
+        manager.set_active_task(connection_id, task)
+
+        manager.disconnect(websocket)
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        with pytest.raises(asyncio.CancelledError):
+            manager.check_cancelled()
+        return manager.is_connection_active(connection_id)
+
+    assert asyncio.run(scenario()) is False
+
+
+def test_new_request_replaces_the_running_one():
+    async def scenario():
+        manager = WebSocketManager()
+        connection_id = await manager.connect(AcceptingWebSocket())
+        first = asyncio.create_task(asyncio.sleep(10))
+        manager.set_active_task(connection_id, first)
+        second = asyncio.create_task(asyncio.sleep(0))
+        manager.set_active_task(connection_id, second)
+        await second
+        await asyncio.sleep(0)
+        manager.check_cancelled()  # the connection itself is still live
+        return first.cancelled()
+
+    assert asyncio.run(scenario())
+
+
+def test_independent_tasks_survive_a_new_traversal():
+    async def scenario():
+        manager = WebSocketManager()
+        websocket = AcceptingWebSocket()
+        connection_id = await manager.connect(websocket)
+        traversal = asyncio.create_task(asyncio.sleep(10))
+        manager.set_active_task(connection_id, traversal)
+        classification = asyncio.create_task(asyncio.sleep(10))
+        manager.set_active_task(connection_id, classification, kind=None)
+        replacement = asyncio.create_task(asyncio.sleep(10))
+        manager.set_active_task(connection_id, replacement)
+        await asyncio.sleep(0)
+        states = (traversal.cancelled(), classification.cancelled())
+
+        manager.disconnect(websocket)
+        await asyncio.sleep(0)
+        return states, classification.cancelled() and replacement.cancelled()
+
+    assert asyncio.run(scenario()) == ((True, False), True)
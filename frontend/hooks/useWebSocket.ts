@@ -49,7 +49,11 @@ export function useWebSocket(url: string, options?: { token?: string | null }):
         try {
           const message = JSON.parse(event.data);
           console.log('Received message:', message);
-          setMessages(prev => [...prev, message]);
+          // Batched frames carry several events in order; unpack them into individual messages
+          const received: WebSocketMessage[] = message.type === 'relationships_batch'
+            ? message.data.events
+            : [message];
+          setMessages(prev => [...prev, ...received]);
         } catch (error) {
           console.error('Error parsing WebSocket message:', error);
         }